@@ -4,20 +4,51 @@ Emergency Response App - Comprehensive API Endpoints
 Provides RESTful API for all application functionality
 """
 
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, has_app_context
 from flask_login import login_required, current_user
 from functools import wraps
 import json
 import datetime
+import threading
 from database import (
-    get_emergency_reports, create_emergency_report, update_report_status,
-    get_fire_departments, get_messages, create_message, delete_message,
-    get_user_by_id, create_user, authenticate_user, get_user_by_username
+    get_emergency_reports, get_emergency_report, get_emergency_reports_page, create_emergency_report,
+    update_report_status, get_fire_departments, get_messages, get_messages_page, create_message, delete_message,
+    get_user_by_id, create_user, authenticate_user, get_user_by_username, get_facility
 )
+from stats_service import get_system_statistics
+from nearest import nearest_facilities
+from routing import get_road_graph
+from first_aid_search import FirstAidIndex
+from health import health
+from auth_crypto import CryptoBusy
 
 # Create API Blueprint
 api = Blueprint('api', __name__, url_prefix='/api/v1')
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_SEARCH_RESULTS = 50
+
+_fallback_index = None
+_fallback_index_lock = threading.Lock()
+
+def get_first_aid_index():
+    """Get the first aid index built by create_app, or one over the fallback practices, built once"""
+    global _fallback_index
+    if has_app_context():
+        index = current_app.config.get('FIRST_AID_INDEX')
+        if index is None:
+            with _fallback_index_lock:
+                index = current_app.config.get('FIRST_AID_INDEX')
+                if index is None:
+                    index = current_app.config['FIRST_AID_INDEX'] = FirstAidIndex(get_first_aid_practices())
+        return index
+    if _fallback_index is None:
+        with _fallback_index_lock:
+            if _fallback_index is None:
+                _fallback_index = FirstAidIndex(get_first_aid_practices())
+    return _fallback_index
+
 def get_first_aid_practices():
     """Get first aid practices from current app"""
     try:
@@ -40,12 +71,16 @@ def get_first_aid_practices():
             }
         ]
 
+def has_valid_api_key():
+    """Whether the request carries the API key in X-API-Key or ?api_key="""
+    api_key = request.headers.get('X-API-Key') or request.args.get('api_key')
+    return bool(api_key) and api_key == current_app.config.get('API_KEY', 'emergency-api-key-2024')
+
 def api_key_required(f):
     """Decorator to require API key for certain endpoints"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        api_key = request.headers.get('X-API-Key') or request.args.get('api_key')
-        if not api_key or api_key != current_app.config.get('API_KEY', 'emergency-api-key-2024'):
+        if not has_valid_api_key():
             return jsonify({'error': 'Invalid or missing API key'}), 401
         return f(*args, **kwargs)
     return decorated_function
@@ -89,6 +124,8 @@ def api_login():
         else:
             return json_response({'error': 'Invalid credentials'}, 401)
             
+    except CryptoBusy:
+        raise
     except Exception as e:
         return json_response({'error': str(e)}, 500)
 
@@ -121,6 +158,8 @@ def api_register():
         
     except ValueError as e:
         return json_response({'error': str(e)}, 400)
+    except CryptoBusy:
+        raise
     except Exception as e:
         return json_response({'error': str(e)}, 500)
 
@@ -134,25 +173,30 @@ def api_get_emergencies():
     """Get all emergency reports with optional filtering"""
     try:
         # Query parameters
-        status = request.args.get('status')
-        severity = request.args.get('severity')
-        limit = request.args.get('limit', type=int)
-        
-        reports = get_emergency_reports()
-        
-        # Apply filters
-        if status:
-            reports = [r for r in reports if r['status'] == status]
-        if severity:
-            reports = [r for r in reports if r['severity'] == severity]
-        if limit:
-            reports = reports[:limit]
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            return json_response({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'}, 400)
+
+        page = get_emergency_reports_page(
+            cursor=request.args.get('cursor'),
+            limit=limit,
+            status=request.args.get('status'),
+            severity=request.args.get('severity'),
+            department_id=request.args.get('department_id', type=int),
+            since=request.args.get('since'),
+            until=request.args.get('until'),
+            descending=request.args.get('order', 'desc') != 'asc'
+        )
         
         return json_response({
-            'emergencies': reports,
-            'total_count': len(reports)
+            'emergencies': page['items'],
+            'total_count': len(page['items']),
+            'next_cursor': page['next_cursor'],
+            'prev_cursor': page['prev_cursor']
         })
         
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
     except Exception as e:
         return json_response({'error': str(e)}, 500)
 
@@ -194,8 +238,7 @@ def api_create_emergency():
 def api_get_emergency(report_id):
     """Get specific emergency report"""
     try:
-        reports = get_emergency_reports()
-        report = next((r for r in reports if r['id'] == report_id), None)
+        report = get_emergency_report(report_id)
         
         if not report:
             return json_response({'error': 'Emergency report not found'}, 404)
@@ -249,6 +292,78 @@ def api_get_fire_departments():
     except Exception as e:
         return json_response({'error': str(e)}, 500)
 
+# ============================================================================
+# NEAREST FACILITIES ENDPOINTS
+# ============================================================================
+
+@api.route('/nearest', methods=['GET'])
+def api_nearest_facilities():
+    """Get the k hospitals or fire stations nearest to ?lat=&lng="""
+    try:
+        kind = request.args.get('type') or None
+        emergency = request.args.get('emergency')
+        min_vehicles = request.args.get('min_vehicles')
+        facilities = nearest_facilities(
+            float(request.args['lat']), float(request.args['lng']), kind,
+            k=int(request.args.get('k', 5)),
+            emergency=None if emergency is None else emergency.lower() in ('1', 'true', 'yes'),
+            min_vehicles=None if min_vehicles is None else int(min_vehicles),
+        )
+        return json_response({
+            'facilities': facilities,
+            'total_count': len(facilities)
+        })
+
+    except KeyError:
+        return json_response({'error': 'lat and lng are required'}, 400)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+# ============================================================================
+# ROUTING ENDPOINTS
+# ============================================================================
+
+def _route_point(point, record_id, lookup, name):
+    """Coordinates from ?from=lat,lng style values or from a facility/report id"""
+    if record_id is not None:
+        record = lookup(int(record_id))
+        if not record or record.get('latitude') is None:
+            raise LookupError(f'{name} not found or has no location')
+        return record['latitude'], record['longitude']
+    if point is None:
+        raise ValueError(f'{name} is required')
+    latitude, longitude = (float(part) for part in point.split(','))
+    return latitude, longitude
+
+@api.route('/route', methods=['GET'])
+def api_get_route():
+    """Get a driving route and ETA, e.g. from a fire station to an incident.
+
+    Routes between points and from facilities are public (the map page draws
+    them); ending at a report reveals its location, so ?report_id= needs the API key.
+    """
+    if request.args.get('report_id') is not None and not has_valid_api_key():
+        return jsonify({'error': 'Invalid or missing API key'}), 401
+    try:
+        graph = get_road_graph()
+        if graph is None:
+            return json_response({'error': 'Road routing is not configured'}, 503)
+        start = _route_point(request.args.get('from'), request.args.get('facility_id'), get_facility, 'from')
+        end = _route_point(request.args.get('to'), request.args.get('report_id'), get_emergency_report, 'to')
+        route = graph.route(*start, *end)
+        if route is None:
+            return json_response({'error': 'No route found'}, 404)
+        return json_response({'route': route})
+
+    except LookupError as e:
+        return json_response({'error': str(e)}, 404)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
 # ============================================================================
 # MESSAGES ENDPOINTS
 # ============================================================================
@@ -258,14 +373,21 @@ def api_get_fire_departments():
 def api_get_messages():
     """Get community messages"""
     try:
-        limit = request.args.get('limit', 50, type=int)
-        messages = get_messages(limit=limit)
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            return json_response({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'}, 400)
+
+        page = get_messages_page(cursor=request.args.get('cursor'), limit=limit)
         
         return json_response({
-            'messages': messages,
-            'total_count': len(messages)
+            'messages': page['items'],
+            'total_count': len(page['items']),
+            'next_cursor': page['next_cursor'],
+            'prev_cursor': page['prev_cursor']
         })
         
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
     except Exception as e:
         return json_response({'error': str(e)}, 500)
 
@@ -324,13 +446,7 @@ def api_get_first_aid_practices():
         category = request.args.get('category')
         difficulty = request.args.get('difficulty')
         
-        practices = get_first_aid_practices()
-        
-        # Apply filters
-        if category:
-            practices = [p for p in practices if p['emergency_type'] == category]
-        if difficulty:
-            practices = [p for p in practices if p.get('difficulty') == difficulty]
+        practices = get_first_aid_index().filter(category, difficulty)
         
         return json_response({
             'first_aid_practices': practices,
@@ -344,8 +460,7 @@ def api_get_first_aid_practices():
 def api_get_first_aid_practice(practice_id):
     """Get specific first aid practice"""
     try:
-        practices = get_first_aid_practices()
-        practice = next((p for p in practices if p['id'] == practice_id), None)
+        practice = get_first_aid_index().get(practice_id)
         
         if not practice:
             return json_response({'error': 'First aid practice not found'}, 404)
@@ -355,6 +470,29 @@ def api_get_first_aid_practice(practice_id):
     except Exception as e:
         return json_response({'error': str(e)}, 500)
 
+@api.route('/first-aid/search', methods=['GET'])
+def api_search_first_aid_practices():
+    """Search first aid practices for ?q=, best match first"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return json_response({'error': 'q is required'}, 400)
+        limit = int(request.args.get('limit', 10))
+        if not 1 <= limit <= MAX_SEARCH_RESULTS:
+            raise ValueError(f'limit must be between 1 and {MAX_SEARCH_RESULTS}')
+
+        results = [dict(practice, score=round(score, 3))
+                   for score, practice in get_first_aid_index().search(query, limit)]
+        return json_response({
+            'first_aid_practices': results,
+            'total_count': len(results)
+        })
+
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
 # ============================================================================
 # HEALTH CHECK ENDPOINTS
 # ============================================================================
@@ -373,20 +511,16 @@ def api_health_check():
 def api_system_status():
     """System status endpoint with detailed information"""
     try:
-        # Get system statistics
-        reports = get_emergency_reports()
-        messages = get_messages(limit=1000)
-        departments = get_fire_departments()
+        # Get system statistics (maintained counters, cached briefly)
+        statistics = dict(get_system_statistics())
+        statistics['total_first_aid_practices'] = len(get_first_aid_practices())
         
+        snapshot = health.snapshot()
         return json_response({
             'system_status': 'operational',
-            'statistics': {
-                'total_emergency_reports': len(reports),
-                'pending_emergencies': len([r for r in reports if r['status'] == 'pending']),
-                'total_messages': len(messages),
-                'total_fire_departments': len(departments),
-                'total_first_aid_practices': len(get_first_aid_practices())
-            },
+            'system_health': snapshot['system_health_score'],
+            'active_users': snapshot['active_users'],
+            'statistics': statistics,
             'uptime': 'Available',
             'last_updated': datetime.datetime.utcnow().isoformat()
         })
@@ -406,6 +540,12 @@ def api_not_found(error):
 def api_method_not_allowed(error):
     return json_response({'error': 'Method not allowed'}, 405)
 
+@api.errorhandler(CryptoBusy)
+def api_crypto_busy(error):
+    response, status_code = json_response({'error': str(error)}, 503)
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, status_code
+
 @api.errorhandler(500)
 def api_internal_error(error):
     return json_response({'error': 'Internal server error'}, 500)
@@ -1,95 +1,85 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
+from flask import (Flask, Blueprint, Response, render_template, request, jsonify, redirect, url_for, flash, session,
+                   stream_with_context, current_app)
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 import json
 import os
+import threading
 import time
+import zlib
 from datetime import datetime
-from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import CollectorRegistry, Counter, Histogram
 from prometheus_flask_exporter import PrometheusMetrics
-from database import (init_database, create_user, create_emergency_report, get_emergency_reports,
-                     update_report_status, get_fire_departments, create_message, get_messages,
+from database import (init_database, ensure_database, set_database_path, create_user, create_emergency_report, get_emergency_reports, count_emergency_reports,
+                     update_report_status, get_fire_departments, create_message, get_messages, get_messages_page,
                      delete_message, like_message, update_user_profile, change_user_password,
-                     delete_user_account, verify_password, get_user_by_id, get_user_by_email)
+                     delete_user_account, verify_password, get_user_by_id, get_user_by_email,
+                     get_report_changes, get_stat_counters)
 from auth import User, load_user, login_user_by_credentials
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-
-# Email configuration (you can move these to environment variables)
-EMAIL_HOST = 'smtp.gmail.com'
-EMAIL_PORT = 587
-EMAIL_USER = 'your-email@gmail.com'  # Replace with your email
-EMAIL_PASSWORD = 'your-app-password'  # Replace with your app password
-EMAIL_FROM = 'Emergency Response App <your-email@gmail.com>'
+from auth_crypto import CryptoBusy
+from stats_service import get_system_statistics
+from events import broker, stream_events
+from mailer import mailer, queue_email, start_mailer
+from sessions import sessions
+from health import health
+from map_service import parse_viewport, map_etag, get_map_features
+from chatbot import get_medical_emergency_response, match_intent
+from first_aid_search import FirstAidIndex
+from api_endpoints import api
 
 def send_email_notification(to_email, subject, message, html_message=None):
-    """Send email notification"""
+    """Queue an email notification for background delivery (see mailer.py)"""
     try:
-        # Create message
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = EMAIL_FROM
-        msg['To'] = to_email
-
-        # Add text part
-        text_part = MIMEText(message, 'plain')
-        msg.attach(text_part)
-
-        # Add HTML part if provided
-        if html_message:
-            html_part = MIMEText(html_message, 'html')
-            msg.attach(html_part)
-
-        # Send email
-        server = smtplib.SMTP(EMAIL_HOST, EMAIL_PORT)
-        server.starttls()
-        server.login(EMAIL_USER, EMAIL_PASSWORD)
-        server.send_message(msg)
-        server.quit()
-
+        queue_email(to_email, subject, message, html_message)
         return True
     except Exception as e:
-        print(f"Failed to send email: {e}")
+        print(f"Failed to queue email: {e}")
         return False
 
-app = Flask(__name__)
-app.secret_key = 'your-secret-key-here'
-app.config['API_KEY'] = 'emergency-api-key-2024'
+# Routes live on a blueprint so every app built by create_app() gets them
+web = Blueprint('web', __name__)
 
-# Initialize Flask-Login
+# Initialize Flask-Login (bound to each app in create_app)
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+login_manager.login_view = 'web.login'
 login_manager.login_message = 'Please log in to access this page.'
 login_manager.login_message_category = 'info'
 
-# Register API Blueprint
-from api_endpoints import api
-app.register_blueprint(api)
-
 @login_manager.user_loader
 def load_user_callback(user_id):
-    return load_user(user_id)
-
-# Initialize database
-init_database()
-
-# Initialize Prometheus metrics
-metrics = PrometheusMetrics(app)
+    user = load_user(user_id)
+    if user is None:
+        return None
+    token = session.get('sid')
+    if token is None:
+        # Signed in before server-side sessions, or restored from a remember-me cookie
+        session['sid'] = sessions.create(user_id)
+    elif not sessions.validate(token, user_id):
+        return None
+    return user
+
+# Request metrics exporter, created with the first app (see _init_metrics)
+metrics = None
+_metrics_lock = threading.Lock()
+_default_app_lock = threading.Lock()
 
 # Custom metrics for emergency app
 emergency_reports_total = Counter('emergency_reports_total', 'Total number of emergency reports', ['severity', 'type'])
 first_aid_views_total = Counter('first_aid_views_total', 'Total first aid guide views', ['practice_id', 'practice_name'])
 page_views_total = Counter('page_views_total', 'Total page views', ['page'])
 response_time_histogram = Histogram('response_time_seconds', 'Response time in seconds', ['endpoint'])
-active_users_gauge = Gauge('active_users', 'Number of active users')
-system_health_gauge = Gauge('system_health_score', 'System health score (0-100)')
 
-# Track active users (simplified)
-active_users = set()
+# Reports shown on (and kept in sync by) the fire department dashboard
+DASHBOARD_REPORT_LIMIT = 20
+
+# First aid guides linked under each chatbot answer; without a recognised
+# emergency only guides scoring at least CHATBOT_GUIDE_MIN_SCORE are linked
+CHATBOT_GUIDE_LIMIT = 3
+CHATBOT_GUIDE_MIN_SCORE = 3.0
 
-# Add metrics info endpoint
-metrics.info('emergency_app_info', 'Emergency Response App Information', version='1.0.0')
+# Server-Sent Events
+MESSAGE_EVENT_TOPICS = ('message.created', 'message.deleted', 'message.liked')
+REPORT_EVENT_TOPICS = ('report.created', 'report.updated')
+SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
 
 # Sample data for first aid practices
 FIRST_AID_PRACTICES = [
@@ -215,23 +205,20 @@ FIRST_AID_PRACTICES = [
     }
 ]
 
-# Store first aid practices in app config for API access
-app.config['FIRST_AID_PRACTICES'] = FIRST_AID_PRACTICES
-
-@app.route('/')
+@web.route('/')
 def welcome():
     page_views_total.labels(page='welcome').inc()
     if current_user.is_authenticated:
         if current_user.is_fire_department():
-            return redirect(url_for('fire_department_dashboard'))
+            return redirect(url_for('web.fire_department_dashboard'))
         else:
-            return redirect(url_for('landing'))
-    return redirect(url_for('login'))
+            return redirect(url_for('web.landing'))
+    return redirect(url_for('web.login'))
 
-@app.route('/register', methods=['GET', 'POST'])
+@web.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
-        return redirect(url_for('welcome'))
+        return redirect(url_for('web.welcome'))
 
     if request.method == 'POST':
         try:
@@ -267,19 +254,21 @@ def register():
                 department_location=department_location
             )
 
-            return redirect(url_for('login', success='Registration successful! Please log in.'))
+            return redirect(url_for('web.login', success='Registration successful! Please log in.'))
 
         except ValueError as e:
             return render_template('register.html', error=str(e))
+        except CryptoBusy:
+            raise
         except Exception as e:
             return render_template('register.html', error='Registration failed. Please try again.')
 
     return render_template('register.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@web.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('welcome'))
+        return redirect(url_for('web.welcome'))
 
     success_message = request.args.get('success')
 
@@ -291,30 +280,43 @@ def login():
         user = login_user_by_credentials(username_or_email, password)
         if user:
             login_user(user, remember=remember_me)
-            user_id = request.remote_addr
-            active_users.add(user_id)
-            active_users_gauge.set(len(active_users))
+            session['sid'] = sessions.create(user.id)
 
             next_page = request.args.get('next')
             if next_page:
                 return redirect(next_page)
 
             if user.is_fire_department():
-                return redirect(url_for('fire_department_dashboard'))
+                return redirect(url_for('web.fire_department_dashboard'))
             else:
-                return redirect(url_for('landing'))
+                return redirect(url_for('web.landing'))
         else:
             return render_template('login.html', error='Invalid username/email or password')
 
     return render_template('login.html', success=success_message)
 
-@app.route('/logout')
+# Pages that collect a password, so a saturated hashing pool can re-render them with an error
+CRYPTO_BUSY_TEMPLATES = {'web.login': 'login.html', 'web.register': 'register.html', 'web.profile': 'profile.html'}
+
+@web.app_errorhandler(CryptoBusy)
+def crypto_busy(error):
+    """Password hashing is saturated: answer 503 and ask the client to retry shortly"""
+    headers = {'Retry-After': str(error.retry_after)}
+    template = CRYPTO_BUSY_TEMPLATES.get(request.endpoint)
+    if template:
+        return render_template(template, error=str(error)), 503, headers
+    return jsonify({'success': False, 'message': str(error)}), 503, headers
+
+@web.route('/logout')
 @login_required
 def logout():
+    token = session.pop('sid', None)
+    if token:
+        sessions.revoke(token)
     logout_user()
-    return redirect(url_for('login'))
+    return redirect(url_for('web.login'))
 
-@app.route('/profile', methods=['GET', 'POST'])
+@web.route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
     if request.method == 'POST':
@@ -361,78 +363,176 @@ def profile():
                 change_user_password(current_user.id, new_password)
                 return render_template('profile.html', success='Password changed successfully!')
 
+            except CryptoBusy:
+                raise
             except Exception as e:
                 return render_template('profile.html', error='Failed to change password.')
 
         elif action == 'delete_account':
             try:
                 delete_user_account(current_user.id)
+                sessions.revoke_user(current_user.id)
+                session.pop('sid', None)
                 logout_user()
-                return redirect(url_for('login', success='Account deleted successfully.'))
+                return redirect(url_for('web.login', success='Account deleted successfully.'))
             except Exception as e:
                 return render_template('profile.html', error='Failed to delete account.')
 
     return render_template('profile.html')
 
-@app.route('/landing')
+@web.route('/landing')
 @login_required
 def landing():
     if current_user.is_fire_department():
-        return redirect(url_for('fire_department_dashboard'))
+        return redirect(url_for('web.fire_department_dashboard'))
 
     page_views_total.labels(page='landing').inc()
-    user_id = request.remote_addr
-    active_users.add(user_id)
-    active_users_gauge.set(len(active_users))
     return render_template('landing.html')
 
-@app.route('/fire-department-dashboard')
+@web.route('/fire-department-dashboard')
 @login_required
 def fire_department_dashboard():
     if not current_user.is_fire_department():
-        return redirect(url_for('landing'))
+        return redirect(url_for('web.landing'))
 
     page_views_total.labels(page='fire_department_dashboard').inc()
 
-    # Get emergency reports
-    emergency_reports = get_emergency_reports(limit=20)
-    active_reports = [r for r in emergency_reports if r['status'] == 'reported']
-    responding_reports = [r for r in emergency_reports if r['status'] == 'responding']
+    # Read the revision before the reports so the poller never skips a change
+    reports_revision = get_stat_counters().get('reports.revision', 0)
+    # Each department sees the reports dispatched to it plus those nobody has yet
+    emergency_reports = get_emergency_reports(limit=DASHBOARD_REPORT_LIMIT, department_id=int(current_user.id),
+                                              include_unassigned=True)
+    statistics = get_system_statistics()
 
-    # Count resolved reports today
+    # Count resolved reports today (across all reports, not just the 20 shown)
     from datetime import date
-    today = date.today().isoformat()
-    resolved_today = len([r for r in emergency_reports if r['status'] == 'resolved' and r['updated_at'].startswith(today)])
+    today = datetime.combine(date.today(), datetime.min.time())
+    resolved_today = count_emergency_reports(status='resolved', since=today, order_by='updated_at')
 
     return render_template('fire_department_landing.html',
                          emergency_reports=emergency_reports,
-                         active_reports=active_reports,
-                         responding_reports=responding_reports,
-                         resolved_today=resolved_today)
+                         active_count=statistics['reports_by_status']['reported'],
+                         responding_count=statistics['reports_by_status']['responding'],
+                         resolved_today=resolved_today,
+                         reports_revision=reports_revision,
+                         report_limit=DASHBOARD_REPORT_LIMIT)
 
-@app.route('/map')
+@web.route('/fire-department/reports/changes')
+@login_required
+def fire_department_report_changes():
+    """Reports created or updated after ?cursor=<revision>, for the dashboard poller.
+
+    ?department_id=<id> (or 'me') keeps that department's and unassigned
+    reports. Answers 304 Not Modified while nothing has changed since the
+    client's ETag.
+    """
+    if not current_user.is_fire_department():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    try:
+        department_id = department_id_arg()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid department_id'}), 400
+
+    counters = get_stat_counters()
+    etag = f"reports-{counters.get('reports.revision', 0)}-{zlib.crc32(request.query_string):x}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        try:
+            limit = min(max(request.args.get('limit', DASHBOARD_REPORT_LIMIT, type=int), 1), 100)
+            changes = get_report_changes(after_revision=request.args.get('cursor', 0, type=int),
+                                         limit=limit,
+                                         status=request.args.get('status'),
+                                         severity=request.args.get('severity'),
+                                         department_id=department_id,
+                                         include_unassigned=True,
+                                         updated_since=request.args.get('since'))
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid since timestamp'}), 400
+
+        for report in changes['reports']:
+            report['html'] = render_template('report_row.html', report=report)
+        response = jsonify({
+            'success': True,
+            'reports': changes['reports'],
+            'cursor': changes['revision'],
+            'has_more': changes['has_more'],
+            'active_count': counters.get('reports.status.reported', 0),
+            'responding_count': counters.get('reports.status.responding', 0)
+        })
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def department_id_arg():
+    """The ?department_id=<id> (or 'me') argument as an int, or None; ValueError if malformed"""
+    department_id = request.args.get('department_id')
+    if department_id == 'me':
+        return int(current_user.id)
+    if department_id and not department_id.isdigit():
+        raise ValueError(f"Invalid department_id: {department_id}")
+    return int(department_id) if department_id else None
+
+def report_event_filter(severities=None, department_id=None):
+    """Build a subscription predicate matching report events by severity and assigned department.
+
+    Department filtering keeps unassigned reports so new emergencies still reach every department.
+    """
+    def predicate(event):
+        report = event.data
+        if severities and report.get('severity') not in severities:
+            return False
+        if department_id and report.get('assigned_department_id') not in (None, department_id):
+            return False
+        return True
+    return predicate
+
+@web.route('/fire-department/stream')
+@login_required
+def fire_department_stream():
+    """Server-Sent Events stream of created and updated emergency reports.
+
+    ?severity=high,critical and ?department_id=<id> (or 'me') narrow the stream.
+    """
+    if not current_user.is_fire_department():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+
+    severities = {s for s in request.args.get('severity', '').split(',') if s} or None
+    try:
+        department_id = department_id_arg()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid department_id'}), 400
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    subscription = broker.subscribe(REPORT_EVENT_TOPICS, last_event_id=last_event_id,
+                                    predicate=report_event_filter(severities, department_id))
+    return Response(stream_with_context(stream_events(subscription, heartbeat=SSE_HEARTBEAT_SECONDS)),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@web.route('/map')
 @login_required
 def map_page():
     page_views_total.labels(page='map').inc()
     return render_template('map.html')
 
-@app.route('/test-map')
+@web.route('/test-map')
 def test_map():
     with open('test_map.html', 'r') as f:
         return f.read()
 
-@app.route('/test-location')
+@web.route('/test-location')
 def test_location():
     return render_template('location_test.html')
 
-@app.route('/messages')
+@web.route('/messages')
 @login_required
 def messages():
     page_views_total.labels(page='messages').inc()
     messages_list = get_messages(limit=50)
     return render_template('messages.html', messages=messages_list, online_users=1)
 
-@app.route('/send-message', methods=['POST'])
+@web.route('/send-message', methods=['POST'])
 @login_required
 def send_message():
     try:
@@ -452,16 +552,30 @@ def send_message():
     except Exception as e:
         return jsonify({'success': False, 'message': 'Failed to send message'}), 500
 
-@app.route('/get-messages')
+@web.route('/get-messages')
 @login_required
 def get_messages_api():
     try:
-        messages_list = get_messages(limit=50)
-        return jsonify({'success': True, 'messages': messages_list})
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+        page = get_messages_page(cursor=request.args.get('cursor'), limit=limit)
+        return jsonify({'success': True, 'messages': page['items'],
+                        'next_cursor': page['next_cursor'], 'prev_cursor': page['prev_cursor']})
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid cursor'}), 400
     except Exception as e:
         return jsonify({'success': False, 'message': 'Failed to load messages'}), 500
 
-@app.route('/delete-message', methods=['POST'])
+@web.route('/messages/stream')
+@login_required
+def messages_stream():
+    """Server-Sent Events stream of new, deleted and liked messages"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    subscription = broker.subscribe(MESSAGE_EVENT_TOPICS, last_event_id=last_event_id)
+    return Response(stream_with_context(stream_events(subscription, heartbeat=SSE_HEARTBEAT_SECONDS)),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@web.route('/delete-message', methods=['POST'])
 @login_required
 def delete_message_api():
     try:
@@ -477,7 +591,7 @@ def delete_message_api():
     except Exception as e:
         return jsonify({'success': False, 'message': 'Failed to delete message'}), 500
 
-@app.route('/like-message', methods=['POST'])
+@web.route('/like-message', methods=['POST'])
 @login_required
 def like_message_api():
     try:
@@ -490,37 +604,37 @@ def like_message_api():
     except Exception as e:
         return jsonify({'success': False, 'message': 'Failed to like message'}), 500
 
-@app.route('/help')
+@web.route('/help')
 @login_required
 def help_page():
     page_views_total.labels(page='help').inc()
     return render_template('help.html')
 
-@app.route('/settings')
+@web.route('/settings')
 @login_required
 def settings():
     page_views_total.labels(page='settings').inc()
     return render_template('settings.html')
 
-@app.route('/first-aid')
+@web.route('/first-aid')
 @login_required
 def first_aid():
     page_views_total.labels(page='first_aid').inc()
     first_aid_views_total.labels(practice_id='overview', practice_name='overview').inc()
     return render_template('first_aid.html', practices=FIRST_AID_PRACTICES)
 
-@app.route('/first-aid/<int:practice_id>')
+@web.route('/first-aid/<int:practice_id>')
 @login_required
 def first_aid_detail(practice_id):
-    practice = next((p for p in FIRST_AID_PRACTICES if p['id'] == practice_id), None)
+    practice = current_app.config['FIRST_AID_INDEX'].get(practice_id)
     if not practice:
-        return redirect(url_for('first_aid'))
+        return redirect(url_for('web.first_aid'))
 
     page_views_total.labels(page='first_aid_detail').inc()
     first_aid_views_total.labels(practice_id=str(practice_id), practice_name=practice['title']).inc()
     return render_template('first_aid_detail.html', practice=practice)
 
-@app.route('/medical-chatbot', methods=['GET', 'POST'])
+@web.route('/medical-chatbot', methods=['GET', 'POST'])
 @login_required
 def medical_chatbot():
     if request.method == 'POST':
@@ -529,110 +643,26 @@ def medical_chatbot():
 
         # Simple AI-like responses for medical emergencies
         response = get_medical_emergency_response(user_message)
-        return jsonify({'response': response})
+        min_score = 0 if match_intent(user_message) else CHATBOT_GUIDE_MIN_SCORE
+        guides = [{'id': practice['id'], 'title': practice['title'],
+                   'url': url_for('web.first_aid_detail', practice_id=practice['id'])}
+                  for score, practice in current_app.config['FIRST_AID_INDEX'].search(user_message, CHATBOT_GUIDE_LIMIT)
+                  if score >= min_score]
+        return jsonify({'response': response, 'guides': guides})
 
     return render_template('medical_chatbot.html')
 
-def get_medical_emergency_response(message):
-    """Simple rule-based medical emergency chatbot responses"""
-
-    # Emergency keywords and responses
-    emergency_responses = {
-        'heart attack': {
-            'response': "🚨 **HEART ATTACK EMERGENCY** 🚨\n\n**IMMEDIATE ACTIONS:**\n1. Call 119 (ambulance) immediately\n2. Have the person sit down and rest\n3. Give aspirin if available and not allergic\n4. Loosen tight clothing\n5. Be ready to perform CPR if they become unconscious\n\n**SIGNS:** Chest pain, shortness of breath, nausea, sweating\n\n**DO NOT:** Give food or water",
-            'urgency': 'critical'
-        },
-        'choking': {
-            'response': "🚨 **CHOKING EMERGENCY** 🚨\n\n**IMMEDIATE ACTIONS:**\n1. Ask 'Are you choking?'\n2. If they can't speak/cough: Stand behind them\n3. Give 5 back blows between shoulder blades\n4. Give 5 abdominal thrusts (Heimlich maneuver)\n5. Alternate back blows and abdominal thrusts\n6. Call 118 if object doesn't dislodge\n\n**FOR INFANTS:** Use gentle back blows and chest thrusts",
-            'urgency': 'critical'
-        },
-        'bleeding': {
-            'response': "🩸 **BLEEDING CONTROL** 🩸\n\n**IMMEDIATE ACTIONS:**\n1. Apply direct pressure with clean cloth\n2. Elevate the injured area above heart level\n3. Don't remove embedded objects\n4. Apply pressure bandage\n5. Call 119 for severe bleeding\n\n**SEVERE BLEEDING SIGNS:** Spurting blood, won't stop after 10 minutes of pressure\n\n**SHOCK PREVENTION:** Keep person warm and lying down",
-            'urgency': 'high'
-        },
-        'burn': {
-            'response': "🔥 **BURN TREATMENT** 🔥\n\n**IMMEDIATE ACTIONS:**\n1. Remove from heat source safely\n2. Cool with running water for 10-20 minutes\n3. Remove jewelry/tight clothing before swelling\n4. Cover with clean, dry cloth\n5. Call 119 for severe burns\n\n**DO NOT:** Use ice, butter, or ointments\n**SEVERE BURNS:** Larger than palm, on face/hands/genitals, or deep",
-            'urgency': 'high'
-        },
-        'fracture': {
-            'response': "🦴 **FRACTURE MANAGEMENT** 🦴\n\n**IMMEDIATE ACTIONS:**\n1. Don't move the person unless in danger\n2. Support the injured area\n3. Apply splint if trained (don't move bone)\n4. Apply ice wrapped in cloth\n5. Call 119 for severe fractures\n\n**SIGNS:** Deformity, severe pain, inability to move, numbness\n**OPEN FRACTURE:** Don't push bone back in, cover with sterile dressing",
-            'urgency': 'medium'
-        },
-        'seizure': {
-            'response': "🧠 **SEIZURE RESPONSE** 🧠\n\n**IMMEDIATE ACTIONS:**\n1. Stay calm and time the seizure\n2. Clear area of dangerous objects\n3. Turn person on their side\n4. Put something soft under their head\n5. Call 119 if seizure lasts >5 minutes\n\n**DO NOT:** Put anything in their mouth, restrain them\n**AFTER SEIZURE:** Stay with them, they may be confused",
-            'urgency': 'medium'
-        },
-        'poisoning': {
-            'response': "☠️ **POISONING EMERGENCY** ☠️\n\n**IMMEDIATE ACTIONS:**\n1. Call Poison Control: 119\n2. Identify the poison if possible\n3. If conscious: rinse mouth with water\n4. Don't induce vomiting unless told to\n5. Save poison container/vomit sample\n\n**INHALED POISON:** Get to fresh air immediately\n**SKIN CONTACT:** Remove contaminated clothing, rinse with water",
-            'urgency': 'critical'
-        },
-        'allergic reaction': {
-            'response': "🤧 **ALLERGIC REACTION** 🤧\n\n**MILD REACTION:**\n- Antihistamine (Benadryl)\n- Cool compress for itching\n- Avoid allergen\n\n**SEVERE (ANAPHYLAXIS):**\n1. Call 119 immediately\n2. Use EpiPen if available\n3. Have person lie down, elevate legs\n4. Be ready for CPR\n\n**SIGNS OF ANAPHYLAXIS:** Difficulty breathing, swelling of face/throat, rapid pulse",
-            'urgency': 'critical'
-        },
-        'unconscious': {
-            'response': "😵 **UNCONSCIOUS PERSON** 😵\n\n**IMMEDIATE ACTIONS:**\n1. Check responsiveness: tap shoulders, shout\n2. Call 119 immediately\n3. Check breathing and pulse\n4. If breathing: recovery position\n5. If not breathing: start CPR\n\n**RECOVERY POSITION:** On side, head tilted back, top leg bent\n**CPR:** 30 chest compressions, 2 rescue breaths, repeat",
-            'urgency': 'critical'
-        },
-        'cpr': {
-            'response': "❤️ **CPR INSTRUCTIONS** ❤️\n\n**STEPS:**\n1. Check responsiveness and breathing\n2. Call 119\n3. Place heel of hand on center of chest\n4. Push hard and fast 2 inches deep\n5. 100-120 compressions per minute\n6. After 30 compressions: 2 rescue breaths\n7. Continue until help arrives\n\n**HAND POSITION:** Between nipples, fingers interlocked\n**DEPTH:** At least 2 inches for adults",
-            'urgency': 'critical'
-        }
-    }
-
-    # Check for emergency keywords
-    for keyword, data in emergency_responses.items():
-        if keyword in message or any(word in message for word in keyword.split()):
-            return data['response']
-
-    # General medical questions
-    if any(word in message for word in ['pain', 'hurt', 'ache']):
-        return "🩺 **PAIN MANAGEMENT** 🩺\n\nFor general pain:\n- Rest the affected area\n- Apply ice for injuries (20 min on/off)\n- Over-the-counter pain relievers if appropriate\n- Seek medical attention if severe or persistent\n\n**WHEN TO CALL 119:** Severe pain, chest pain, abdominal pain with fever, head injury pain"
-
-    if any(word in message for word in ['fever', 'temperature', 'hot']):
-        return "🌡️ **FEVER MANAGEMENT** 🌡️\n\n- Rest and stay hydrated\n- Light clothing\n- Cool compress on forehead\n- Fever reducers if appropriate\n\n**CALL 119 IF:** Fever >104°F (40°C), difficulty breathing, severe headache, stiff neck, confusion"
-
-    if any(word in message for word in ['cut', 'wound', 'injury']):
-        return "🩹 **WOUND CARE** 🩹\n\n**MINOR CUTS:**\n1. Clean hands first\n2. Stop bleeding with pressure\n3. Clean wound with water\n4. Apply antibiotic ointment\n5. Cover with bandage\n\n**SEEK MEDICAL CARE:** Deep cuts, won't stop bleeding, signs of infection, tetanus concerns"
-
-    # Default response
-    return """🤖 **MEDICAL EMERGENCY AI ASSISTANT** 🤖
-
-I can help with emergency medical situations. Try asking about:
-
-🚨 **EMERGENCIES:**
-- Heart attack
-- Choking
-- Severe bleeding
-- Burns
-- Fractures
-- Seizures
-- Poisoning
-- Allergic reactions
-- Unconscious person
-- CPR instructions
-
-🩺 **GENERAL:**
-- Pain management
-- Fever treatment
-- Wound care
-- Basic first aid
-
-**REMEMBER:** For life-threatening emergencies, call 119 immediately!
-
-What medical emergency can I help you with?"""
-
-@app.route('/privacy')
+@web.route('/privacy')
 def privacy():
     page_views_total.labels(page='privacy').inc()
     return render_template('privacy.html')
 
-@app.route('/guidelines')
+@web.route('/guidelines')
 def guidelines():
     page_views_total.labels(page='guidelines').inc()
     return render_template('guidelines.html')
 
-@app.route('/report-emergency', methods=['POST'])
+@web.route('/report-emergency', methods=['POST'])
 @login_required
 def report_emergency():
     data = request.get_json()
@@ -644,14 +674,6 @@ def report_emergency():
     # Increment emergency reports counter
     emergency_reports_total.labels(severity=severity, type=emergency_type).inc()
 
-    # Update system health (simulate decreasing health with more emergencies)
-    try:
-        total_reports = sum(emergency_reports_total._value.values())
-        current_health = max(50, 100 - (total_reports * 2))
-        system_health_gauge.set(current_health)
-    except:
-        system_health_gauge.set(95)  # Default health if calculation fails
-
     # Save to database
     try:
         report_id = create_emergency_report(
@@ -794,7 +816,7 @@ Fire: 118 | Police: 117 | Medical: 119
     # Send the email
     return send_email_notification(user.email, subject, text_message, html_message)
 
-@app.route('/update-report-status', methods=['POST'])
+@web.route('/update-report-status', methods=['POST'])
 @login_required
 def update_report_status_route():
     if not current_user.is_fire_department():
@@ -811,137 +833,113 @@ def update_report_status_route():
     except Exception as e:
         return jsonify({'success': False, 'message': 'Failed to update report status'}), 500
 
-@app.route('/health')
+@web.route('/health')
 def health_check():
     """Health check endpoint for monitoring"""
     health_status = {
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
         'version': '1.0.0',
-        'active_users': len(active_users),
-        'total_emergency_reports': sum(emergency_reports_total._value.values()) if hasattr(emergency_reports_total, '_value') else 0,
-        'system_health_score': system_health_gauge._value._value if hasattr(system_health_gauge, '_value') else 100
+        **health.snapshot()
     }
     return jsonify(health_status)
 
-@app.route('/metrics')
+@web.route('/metrics')
+@PrometheusMetrics.do_not_track()
 def metrics_endpoint():
-    """Prometheus metrics endpoint"""
-    return generate_latest(), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+    """Prometheus metrics endpoint (aggregated over all workers when PROMETHEUS_MULTIPROC_DIR is set)"""
+    health.start()
+    body, content_type = metrics.generate_metrics(request.headers.get('Accept'))
+    return body, 200, {'Content-Type': content_type}
 
-@app.route('/api/map-data')
+@web.route('/api/map-data')
+@login_required
 def get_map_data():
-    """API endpoint to get map data for emergencies, hospitals, and fire stations"""
-    map_data = {
-        'emergencies': [
-            {
-                'id': 1,
-                'type': 'fire',
-                'title': 'House Fire',
-                'location': 'Bastos, Yaoundé',
-                'coordinates': [3.8691, 11.5174],
-                'severity': 'high',
-                'time': '15 minutes ago',
-                'description': 'Residential fire in Bastos neighborhood',
-                'status': 'active'
-            },
-            {
-                'id': 2,
-                'type': 'fire',
-                'title': 'Vehicle Fire',
-                'location': 'Douala Port',
-                'coordinates': [4.0511, 9.7679],
-                'severity': 'medium',
-                'time': '32 minutes ago',
-                'description': 'Vehicle fire near port area',
-                'status': 'responding'
-            },
-            {
-                'id': 3,
-                'type': 'fire',
-                'title': 'Brush Fire',
-                'location': 'Bamenda Hills',
-                'coordinates': [5.9631, 10.1591],
-                'severity': 'low',
-                'time': '1 hour ago',
-                'description': 'Small brush fire on hillside',
-                'status': 'contained'
-            }
-        ],
-        'hospitals': [
-            {
-                'name': 'Yaoundé Central Hospital',
-                'coordinates': [3.8634, 11.5167],
-                'type': 'General Hospital',
-                'emergency': True,
-                'phone': '119'
-            },
-            {
-                'name': 'Douala General Hospital',
-                'coordinates': [4.0435, 9.7043],
-                'type': 'General Hospital',
-                'emergency': True,
-                'phone': '119'
-            },
-            {
-                'name': 'Bamenda Regional Hospital',
-                'coordinates': [5.9597, 10.1463],
-                'type': 'Regional Hospital',
-                'emergency': True,
-                'phone': '119'
-            },
-            {
-                'name': 'Garoua Regional Hospital',
-                'coordinates': [9.3265, 13.3981],
-                'type': 'Regional Hospital',
-                'emergency': True,
-                'phone': '119'
-            }
-        ],
-        'fire_stations': [
-            {
-                'name': 'Yaoundé Fire Station',
-                'coordinates': [3.8480, 11.5021],
-                'type': 'Main Station',
-                'phone': '118',
-                'vehicles': 5
-            },
-            {
-                'name': 'Douala Fire Station',
-                'coordinates': [4.0511, 9.7679],
-                'type': 'Port Station',
-                'phone': '118',
-                'vehicles': 8
-            },
-            {
-                'name': 'Bamenda Fire Station',
-                'coordinates': [5.9631, 10.1591],
-                'type': 'Regional Station',
-                'phone': '118',
-                'vehicles': 3
-            }
-        ]
-    }
-    return jsonify(map_data)
+    """Reports, hospitals and fire stations in ?bbox=south,west,north,east at ?zoom.
 
-# Background task to simulate system health updates
-@app.before_request
-def before_request():
-    # Update system health score based on various factors
+    Reports are clustered server-side below MAP_CLUSTER_MAX_ZOOM. Answers 304
+    Not Modified while nothing on the map has changed since the client's ETag.
+    """
     try:
-        base_health = 95
-        total_reports = sum(emergency_reports_total._value.values()) if hasattr(emergency_reports_total, '_value') else 0
-        emergency_impact = min(30, total_reports * 2)
-        user_load_impact = min(10, len(active_users) * 0.5)
-
-        current_health = max(0, base_health - emergency_impact - user_load_impact)
-        system_health_gauge.set(current_health)
-    except Exception as e:
-        # Fallback to default health if calculation fails
-        system_health_gauge.set(95)
+        bbox, zoom = parse_viewport(request.args.get('bbox'), request.args.get('zoom'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    counters = get_stat_counters()
+    etag = map_etag(counters, bbox, zoom)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(get_map_features(bbox, zoom, counters))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def create_app(config=None):
+    """Build the application; ``config`` overrides the defaults below.
+
+    ``DATABASE`` selects the database file (``':memory:'`` for a private
+    in-memory one) for this process. Nothing touches the database here: it
+    is created and migrated on the first request, and background threads
+    start per process on first use, so this is safe to call before forking.
+    """
+    app = Flask(__name__)
+    app.secret_key = 'your-secret-key-here'
+    app.config['API_KEY'] = 'emergency-api-key-2024'
+    # First aid practices in app config for API access
+    app.config['FIRST_AID_PRACTICES'] = FIRST_AID_PRACTICES
+    app.config.from_mapping(config or {})
+    # Built once per app: first aid pages, the API and the chatbot all look practices up here
+    app.config['FIRST_AID_INDEX'] = FirstAidIndex(app.config['FIRST_AID_PRACTICES'])
+    if app.config.get('DATABASE'):
+        set_database_path(app.config['DATABASE'])
+
+    login_manager.init_app(app)
+    app.register_blueprint(web)
+    app.register_blueprint(api)
+    app.before_request(ensure_database)
+    _init_metrics(app)
+    return app
+
+def _init_metrics(app):
+    """Attach request metrics; /metrics is served by metrics_endpoint.
+
+    The default registry holds one set of request metrics per process, so
+    only the first app records into it; later apps (tests) get a private one.
+    """
+    global metrics
+    with _metrics_lock:
+        if metrics is None:
+            metrics = PrometheusMetrics(app, path=None)
+            metrics.info('emergency_app_info', 'Emergency Response App Information', version='1.0.0')
+        else:
+            PrometheusMetrics(app, path=None, registry=CollectorRegistry())
+
+def __getattr__(name):
+    """Build the default app on first use of ``app.app`` (``from app import app``)"""
+    if name != 'app':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _default_app_lock:
+        if 'app' not in globals():
+            globals()['app'] = create_app()
+    return globals()['app']
+
+def shutdown(timeout=10.0):
+    """Drain background work before the process exits.
+
+    Ends open event streams (clients reconnect to another worker and resume
+    from Last-Event-ID), lets the mailer finish its current batch and
+    flushes batched session activity.
+    """
+    broker.close()
+    mailer.stop(timeout)
+    sessions.stop(timeout)
+    health.stop()
 
 if __name__ == '__main__':
-    # Set initial system health
-    system_health_gauge.set(100)
-    app.run(debug=True, host='0.0.0.0', port=3000)
+    # Development server only; production runs gunicorn -c gunicorn.conf.py
+    health.start()
+    start_mailer()
+    create_app().run(debug=os.environ.get('FLASK_DEBUG') == '1', host='0.0.0.0', port=int(os.environ.get('PORT', 3000)),
+            threaded=True)
 
@@ -1,5 +1,6 @@
+from flask import g, has_app_context
 from flask_login import UserMixin
-from database import get_user_by_id, get_user_by_username, authenticate_user
+from database import get_user_by_id, get_user_by_username, get_session_user, authenticate_user
 
 class User(UserMixin):
     """User class for Flask-Login"""
@@ -30,11 +31,12 @@ class User(UserMixin):
         return self.user_type == 'user'
 
 def load_user(user_id):
-    """Load user by ID for Flask-Login"""
-    user_data = get_user_by_id(int(user_id))
-    if user_data:
-        return User(user_data)
-    return None
+    """Load user by ID for Flask-Login (memoized per request, cached across requests)"""
+    loaded = g.setdefault('loaded_users', {}) if has_app_context() else {}
+    if user_id not in loaded:
+        user_data = get_session_user(user_id)
+        loaded[user_id] = User(user_data) if user_data else None
+    return loaded[user_id]
 
 def login_user_by_credentials(username_or_email, password):
     """Authenticate and return User object"""
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Emergency Response App - Password Hashing Executor
+bcrypt runs on a small, bounded thread pool (bcrypt releases the GIL while
+key stretching) so a login or registration burst cannot occupy every
+request thread. When the pool and its queue are full, CryptoBusy is raised
+and the app answers 503 with Retry-After instead of queueing without bound.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from prometheus_client import Counter, Gauge, Histogram
+
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+AUTH_CRYPTO_WORKERS = int(os.environ.get('AUTH_CRYPTO_WORKERS', os.cpu_count() or 2))
+# Operations allowed to wait for a worker before new ones are rejected
+AUTH_CRYPTO_QUEUE_SIZE = int(os.environ.get('AUTH_CRYPTO_QUEUE_SIZE', AUTH_CRYPTO_WORKERS * 4))
+AUTH_CRYPTO_RETRY_AFTER = int(os.environ.get('AUTH_CRYPTO_RETRY_AFTER', 2))
+
+auth_crypto_seconds = Histogram('auth_crypto_seconds', 'bcrypt operation time (excluding queueing)', ['operation'],
+                                buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+auth_crypto_wait_seconds = Histogram('auth_crypto_wait_seconds', 'Time bcrypt operations waited for a worker',
+                                     ['operation'])
+auth_crypto_in_flight = Gauge('auth_crypto_in_flight', 'bcrypt operations running or queued',
+                              multiprocess_mode='livesum')
+auth_crypto_rejected_total = Counter('auth_crypto_rejected_total', 'bcrypt operations rejected as saturated',
+                                     ['operation'])
+
+
+class CryptoBusy(Exception):
+    """The hashing pool is saturated; retry after ``retry_after`` seconds"""
+
+    def __init__(self, retry_after=AUTH_CRYPTO_RETRY_AFTER):
+        super().__init__('Authentication is busy, please retry shortly')
+        self.retry_after = retry_after
+
+
+class CryptoExecutor:
+    """Thread pool with a hard cap on running plus queued operations"""
+
+    def __init__(self, workers=AUTH_CRYPTO_WORKERS, queue_size=AUTH_CRYPTO_QUEUE_SIZE):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Threads do not survive a fork; give each worker process its own pool
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='auth-crypto')
+                    self._pid = os.getpid()
+        return self._executor
+
+    def run(self, operation, func, *args):
+        """Run func(*args) on the pool and wait for the result; raises CryptoBusy when saturated"""
+        if not self._slots.acquire(blocking=False):
+            auth_crypto_rejected_total.labels(operation=operation).inc()
+            raise CryptoBusy()
+        auth_crypto_in_flight.inc()
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            auth_crypto_wait_seconds.labels(operation=operation).observe(started - submitted)
+            try:
+                return func(*args)
+            finally:
+                auth_crypto_seconds.labels(operation=operation).observe(time.perf_counter() - started)
+
+        try:
+            return self._get_executor().submit(timed).result()
+        finally:
+            auth_crypto_in_flight.dec()
+            self._slots.release()
+
+
+executor = CryptoExecutor()
+
+
+def hash_password(password, rounds=None):
+    """Hash a password with bcrypt at BCRYPT_ROUNDS (or rounds)"""
+    salt = bcrypt.gensalt(rounds or BCRYPT_ROUNDS)
+    return executor.run('hash', bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+
+def verify_password(password, password_hash):
+    """Verify a password against a bcrypt hash"""
+    return executor.run('verify', bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def needs_rehash(password_hash):
+    """True if the hash was made with a different cost factor than BCRYPT_ROUNDS"""
+    try:
+        return int(password_hash.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
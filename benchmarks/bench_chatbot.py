@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark: medical chatbot intent matching
+Times chatbot.get_medical_emergency_response (one compiled regex pass)
+against the previous implementation, which rebuilt its response table and
+rescanned the message once per keyword, over a corpus of realistic messages.
+
+Usage: python benchmarks/bench_chatbot.py [--messages 20000] [--repeat 5]
+"""
+
+import os
+import sys
+import random
+import argparse
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot import INTENTS, DEFAULT_RESPONSE, get_medical_emergency_response
+
+CORPUS = [
+    "help my father collapsed and he is not breathing, what do i do",
+    "my husband has chest pain spreading to his left arm and he is sweating a lot",
+    "is this a heart attack or just indigestion",
+    "my baby is choking on a small toy",
+    "a piece of meat is stuck in his throat and he cannot speak",
+    "there is a lot of bleeding from my leg after a motorbike accident",
+    "my son cut his finger with a kitchen knife, it will not stop bleeding",
+    "i spilled boiling water on my hand and it burns",
+    "how do i treat a sunburn",
+    "i think my arm is broken, it looks bent and swollen",
+    "she fell from the stairs and may have a fracture in her ankle",
+    "my brother is having a seizure on the floor",
+    "the child drank some kerosene, is it poisoning",
+    "my face is swelling after eating peanuts, allergic reaction?",
+    "my friend is unconscious but breathing",
+    "how many compressions per minute for cpr",
+    "i have a terrible headache since this morning",
+    "my back hurts when i bend down",
+    "my daughter has a high fever and is shivering",
+    "what temperature is too high for an adult",
+    "small wound on my knee from football, how do i clean it",
+    "i was cutting onions and sliced my finger",
+    "burnt my hand on the cooking pot",
+    "he choked on a grape and is coughing",
+    "she bled a lot after the fall",
+    "hello",
+    "what can you do",
+    "thank you for the help",
+    "where is the nearest hospital in douala",
+    "my grandmother fainted in the market and is very weak, we are waiting for the ambulance to arrive",
+]
+
+def legacy_response(message):
+    """The previous implementation: rebuilds the table and scans the message once per keyword"""
+    emergency_responses = {' '.join(intent['name'].split('_')): {'response': intent['response'],
+                                                                  'urgency': intent['urgency']}
+                           for intent in INTENTS[:10]}
+
+    for keyword, data in emergency_responses.items():
+        if keyword in message or any(word in message for word in keyword.split()):
+            return data['response']
+
+    if any(word in message for word in ['pain', 'hurt', 'ache']):
+        return INTENTS[10]['response']
+
+    if any(word in message for word in ['fever', 'temperature', 'hot']):
+        return INTENTS[11]['response']
+
+    if any(word in message for word in ['cut', 'wound', 'injury']):
+        return INTENTS[12]['response']
+
+    return DEFAULT_RESPONSE
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    messages = [rng.choice(CORPUS) for _ in range(args.messages)]
+    differing = [m for m in CORPUS if legacy_response(m) != get_medical_emergency_response(m)]
+
+    print(f"{'implementation':>14}  {'us/message':>10}")
+    timings = {}
+    for name, respond in (('legacy', legacy_response), ('compiled', get_medical_emergency_response)):
+        best = min(timeit.repeat(lambda: [respond(m) for m in messages], number=1, repeat=args.repeat))
+        timings[name] = best / len(messages)
+        print(f"{name:>14}  {timings[name] * 1e6:>10.2f}")
+    print(f"speedup: {timings['legacy'] / timings['compiled']:.1f}x")
+    print(f"{len(differing)} of {len(CORPUS)} corpus messages get a different answer "
+          "(urgency ranking, word-aware matching):")
+    for message in differing:
+        print(f"  {message}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark: import and startup cost of the application modules
+Measures ``python -X importtime`` for database, api_endpoints and app, then
+the time to build an app with create_app() and to serve its first request
+(where the database is created and migrated).
+
+Usage: python benchmarks/bench_import.py [--runs 7] [--top 10]
+"""
+
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ['database', 'api_endpoints', 'app']
+
+STARTUP = '''
+import sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app({{'TESTING': True}})
+created = time.perf_counter()
+assert app.test_client().get('/api/v1/health').status_code == 200
+served = time.perf_counter()
+print(imported - started, created - imported, served - created)
+'''
+
+def run_python(args, db_path):
+    env = dict(os.environ, DATABASE_PATH=db_path, MAILER_ENABLED='0')
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    result = subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr)
+    return result
+
+def parse_importtime(stderr):
+    """{module: (self_us, cumulative_us)} from -X importtime output"""
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+def measure_import(module, runs, tmp_dir):
+    """Median cumulative import time (ms) and median self time per imported module"""
+    totals, self_times = [], {}
+    for i in range(runs):
+        db_path = os.path.join(tmp_dir, f'{module}-{i}.db')
+        timings = parse_importtime(run_python(['-X', 'importtime', '-c', f'import {module}'], db_path).stderr)
+        totals.append(timings[module][1] / 1000)
+        for name, (self_us, _) in timings.items():
+            self_times.setdefault(name, []).append(self_us / 1000)
+    return statistics.median(totals), {name: statistics.median(times) for name, times in self_times.items()}
+
+def measure_startup(runs, tmp_dir):
+    """Median (import, create_app, first request) times in ms"""
+    samples = []
+    for i in range(runs):
+        db_path = os.path.join(tmp_dir, f'startup-{i}.db')
+        output = run_python(['-c', STARTUP.format(root=ROOT)], db_path).stdout
+        samples.append([float(value) * 1000 for value in output.split()[-3:]])
+    return [statistics.median(column) for column in zip(*samples)]
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time benchmark')
+    parser.add_argument('--runs', type=int, default=7, help='Fresh interpreters per measurement')
+    parser.add_argument('--top', type=int, default=10, help='Slowest modules to list (by self time)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"Import time (median of {args.runs}, -X importtime cumulative):")
+        for module in MODULES:
+            total, self_times = measure_import(module, args.runs, tmp_dir)
+            print(f"  {module:<14} {total:8.1f} ms")
+        print(f"Slowest modules imported by app (self time):")
+        for name, ms in sorted(self_times.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {name:<40} {ms:7.1f} ms")
+
+        imported, created, served = measure_startup(args.runs, tmp_dir)
+        print(f"Startup (median of {args.runs}):")
+        print(f"  import app     {imported:8.1f} ms")
+        print(f"  create_app()   {created:8.1f} ms")
+        print(f"  first request  {served:8.1f} ms   (creates and migrates the database)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Benchmark: nearest facility search
+Times k-nearest queries against the k-d tree in nearest.py and against a
+linear haversine scan over the same random facilities, and checks that
+both return the same facilities.
+
+Usage: python benchmarks/bench_nearest.py [--facilities 100 1000 10000] [--queries 2000] [--k 5]
+"""
+
+import os
+import sys
+import random
+import argparse
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nearest import KDTree, haversine_km, to_unit_vector
+
+# Roughly Cameroon
+SOUTH, WEST, NORTH, EAST = 1.6, 8.5, 13.1, 16.2
+
+def random_point(rng):
+    return rng.uniform(SOUTH, NORTH), rng.uniform(WEST, EAST)
+
+def linear_nearest(facilities, lat, lng, k):
+    return sorted(facilities, key=lambda f: (haversine_km(lat, lng, f[0], f[1]), f[2]))[:k]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--facilities', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--k', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'facilities':>10}  {'build ms':>9}  {'k-d tree us':>11}  {'linear us':>10}  {'speedup':>7}")
+    for count in args.facilities:
+        facilities = [(*random_point(rng), i) for i in range(count)]
+        queries = [random_point(rng) for _ in range(args.queries)]
+
+        build = min(timeit.repeat(lambda: KDTree([to_unit_vector(lat, lng) for lat, lng, _ in facilities],
+                                                 facilities), number=1, repeat=3))
+        tree = KDTree([to_unit_vector(lat, lng) for lat, lng, _ in facilities], facilities)
+
+        for lat, lng in queries[:50]:
+            expected = linear_nearest(facilities, lat, lng, args.k)
+            assert [f for _, f in tree.nearest(to_unit_vector(lat, lng), args.k)] == expected
+
+        tree_time = timeit.timeit(lambda: [tree.nearest(to_unit_vector(lat, lng), args.k)
+                                           for lat, lng in queries], number=1) / len(queries)
+        linear_queries = queries[:max(1, len(queries) * 100 // count)]
+        linear_time = timeit.timeit(lambda: [linear_nearest(facilities, lat, lng, args.k)
+                                             for lat, lng in linear_queries], number=1) / len(linear_queries)
+        print(f"{count:>10}  {build * 1000:>9.1f}  {tree_time * 1e6:>11.1f}  {linear_time * 1e6:>10.1f}  "
+              f"{linear_time / tree_time:>6.0f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: road routing queries per second
+Builds a synthetic regional road network (a jittered street grid with fast
+arterial roads, one-way streets and missing links; no download needed) or
+loads a converted graph, selects ALT landmarks, then times random
+point-to-point queries with Dijkstra, bidirectional Dijkstra and
+bidirectional ALT A*. Every answer is checked against Dijkstra.
+
+Usage: python benchmarks/bench_routing.py [--grid 150] [--queries 200] [--landmarks 16] [--graph roads.graph]
+"""
+
+import os
+import sys
+import random
+import argparse
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nearest import haversine_km
+from routing import RoadGraph
+
+# South-west corner of the grid (Yaoundé) and street spacing in degrees
+ORIGIN = (3.70, 11.35)
+SPACING = 0.0025
+
+def synthetic_road_graph(size, seed=1):
+    """size x size street grid; every 10th street is a 60 km/h arterial, others 30 km/h.
+
+    Only the largest strongly connected part is kept, as graph_from_osm does.
+    """
+    rng = random.Random(seed)
+    lats, lngs = [], []
+    for row in range(size):
+        for col in range(size):
+            lats.append(ORIGIN[0] + (row + rng.uniform(-0.3, 0.3)) * SPACING)
+            lngs.append(ORIGIN[1] + (col + rng.uniform(-0.3, 0.3)) * SPACING)
+
+    edges = []
+    for row in range(size):
+        for col in range(size):
+            u = row * size + col
+            for v, arterial in ((u + 1, row % 10 == 0) if col + 1 < size else (None, False),
+                                (u + size, col % 10 == 0) if row + 1 < size else (None, False)):
+                if v is None or (not arterial and rng.random() < 0.08):
+                    continue
+                metres = haversine_km(lats[u], lngs[u], lats[v], lngs[v]) * 1000
+                seconds = metres / ((60 if arterial else 30) / 3.6)
+                direction = 0 if arterial else rng.choices((0, 1, -1), (8, 1, 1))[0]
+                if direction >= 0:
+                    edges.append((u, v, seconds, metres))
+                if direction <= 0:
+                    edges.append((v, u, seconds, metres))
+    return RoadGraph.from_edges(lats, lngs, edges).largest_component()
+
+def dijkstra(graph, source, target):
+    return graph.travel_times(source)[target]
+
+def timed(queries, search):
+    started = time.perf_counter()
+    results = [search(source, target) for source, target in queries]
+    return time.perf_counter() - started, results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--grid', type=int, default=150, help='synthetic grid size (nodes per side)')
+    parser.add_argument('--graph', help='converted graph file to use instead of the synthetic grid')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--landmarks', type=int, default=16)
+    parser.add_argument('--active', type=int, default=4, help='landmarks consulted per query')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.graph:
+        graph = RoadGraph.load(args.graph)
+    else:
+        graph = synthetic_road_graph(args.grid)
+    print(f"Graph: {graph.node_count} nodes, {graph.edge_count} edges ({time.perf_counter() - started:.1f}s)")
+    if not graph.landmarks or len(graph.landmarks) != args.landmarks:
+        started = time.perf_counter()
+        graph.select_landmarks(args.landmarks)
+        print(f"Landmarks: {len(graph.landmarks)} ({time.perf_counter() - started:.1f}s)")
+
+    rng = random.Random(7)
+    queries = [(rng.randrange(graph.node_count), rng.randrange(graph.node_count)) for _ in range(args.queries)]
+
+    reference_time, expected = timed(queries, lambda s, t: dijkstra(graph, s, t))
+    rows = [('Dijkstra (one-to-all)', reference_time / len(queries))]
+    for name, landmarks in (('Bidirectional Dijkstra', 0), (f'Bidirectional ALT A* ({args.active} of '
+                                                           f'{len(graph.landmarks)} landmarks)', args.active)):
+        elapsed, results = timed(queries, lambda s, t: graph.shortest_path(s, t, landmarks))
+        for (seconds, _), reference in zip(results, expected):
+            assert abs(seconds - reference) < 1e-6 * max(1.0, reference), (seconds, reference)
+        rows.append((name, elapsed / len(queries)))
+
+    print(f"{'search':<45}  {'ms/query':>9}  {'queries/s':>9}")
+    for name, per_query in rows:
+        print(f"{name:<45}  {per_query * 1000:>9.2f}  {1 / per_query:>9.1f}")
+
+if __name__ == '__main__':
+    main()
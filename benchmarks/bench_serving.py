@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Benchmark: HTTP throughput and latency of the serving modes
+Compares the old ``python app.py`` debug server with gunicorn using
+gunicorn.conf.py, under polling clients while SSE streams are held open.
+
+Usage: python benchmarks/bench_serving.py [--clients 32] [--streams 20] [--seconds 10]
+"""
+
+import os
+import sys
+import argparse
+import http.client
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 3217
+API_KEY = 'emergency-api-key-2024'
+
+MODES = {
+    'debug-server': ([sys.executable, 'app.py'], {'FLASK_DEBUG': '1', 'PORT': str(PORT)}),
+    'gunicorn': ([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                 {'GUNICORN_BIND': f'127.0.0.1:{PORT}', 'GUNICORN_ACCESS_LOG': '/dev/null'}),
+}
+
+# What polling browsers and API clients ask for
+PATHS = ['/api/v1/messages?limit=50', '/api/v1/emergencies?limit=20', '/health']
+
+def seed(db_path):
+    """Create the database with a user and some reports and messages"""
+    os.environ['DATABASE_PATH'] = db_path
+    sys.path.insert(0, ROOT)
+    import database
+    database.init_database()
+    user_id = database.create_user('bench', 'bench@example.com', 'password123', 'user', 'Bench User')
+    for i in range(200):
+        database.create_message(user_id, f'benchmark message {i}')
+        database.create_emergency_report(user_id, f'Street {i}', 'benchmark report', 'medium')
+    database.close_pools()
+
+def wait_ready(timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=2)
+            conn.request('GET', '/api/v1/health')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+def hold_stream(stop):
+    """Log in and keep one chat event stream open"""
+    try:
+        conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=60)
+        conn.request('POST', '/login', body='username=bench&password=password123',
+                     headers={'Content-Type': 'application/x-www-form-urlencoded'})
+        login = conn.getresponse()
+        login.read()
+        cookie = login.getheader('Set-Cookie', '').split(';')[0]
+        conn.request('GET', '/messages/stream', headers={'Cookie': cookie})
+        response = conn.getresponse()
+        while not stop.is_set() and response.fp.readline():
+            pass
+    except OSError:
+        pass
+
+def client(stop, latencies, errors):
+    conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=10)
+    i = 0
+    while not stop.is_set():
+        path = PATHS[i % len(PATHS)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            conn.request('GET', path, headers={'X-API-Key': API_KEY})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+            latencies.append(time.perf_counter() - started)
+        except (OSError, http.client.HTTPException):
+            if stop.is_set():
+                break  # the server is being stopped
+            errors.append('connection')
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=10)
+
+def run_mode(mode, clients, streams, seconds):
+    command, extra_env = MODES[mode]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'bench.db')
+        seeder = subprocess.run([sys.executable, __file__, '--seed', db_path], cwd=ROOT, stdout=subprocess.DEVNULL)
+        if seeder.returncode:
+            raise RuntimeError('seeding failed')
+        env = dict(os.environ, DATABASE_PATH=db_path, MAILER_ENABLED='0', **extra_env)
+        if mode == 'gunicorn':
+            env['PROMETHEUS_MULTIPROC_DIR'] = os.path.join(tmp_dir, 'metrics')
+        server = subprocess.Popen(command, cwd=ROOT, env=env, start_new_session=True,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_ready()
+            stop = threading.Event()
+            latencies, errors = [], []
+            threads = [threading.Thread(target=hold_stream, args=(stop,), daemon=True) for _ in range(streams)]
+            threads += [threading.Thread(target=client, args=(stop, latencies, errors), daemon=True)
+                        for _ in range(clients)]
+            for thread in threads:
+                thread.start()
+            time.sleep(seconds)
+            stop.set()
+            measured = list(latencies), list(errors)
+        finally:
+            os.killpg(server.pid, signal.SIGTERM)
+            server.wait(timeout=30)
+
+    latencies, errors = measured
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0
+    return len(latencies) / seconds, pick(0.5), pick(0.99), len(errors)
+
+def main():
+    parser = argparse.ArgumentParser(description='Serving mode throughput benchmark')
+    parser.add_argument('--clients', type=int, default=32, help='Concurrent polling clients')
+    parser.add_argument('--streams', type=int, default=20, help='Long-lived streams held open')
+    parser.add_argument('--seconds', type=float, default=10.0, help='Duration per mode')
+    parser.add_argument('--seed', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.seed:
+        seed(args.seed)
+        return
+
+    print(f"Polling load: {args.clients} clients, {args.streams} open streams, {args.seconds:.0f}s per mode")
+    baseline = None
+    for mode in MODES:
+        throughput, p50, p99, errors = run_mode(mode, args.clients, args.streams, args.seconds)
+        speedup = f"  ({throughput / baseline:.2f}x)" if baseline else ''
+        print(f"  {mode:<13} {throughput:9.1f} req/s   p50 {p50:6.1f} ms   p99 {p99:7.1f} ms   "
+              f"errors: {errors}{speedup}")
+        baseline = baseline or throughput
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark: mixed read/write throughput across worker processes
+Compares the legacy SQLite settings (rollback journal, synchronous=FULL)
+with the tuned profile (WAL, synchronous=NORMAL, larger cache, mmap).
+
+Usage: python benchmarks/bench_sqlite_concurrency.py [--workers 4] [--seconds 5]
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+import time
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = {
+    'legacy': {
+        'DB_JOURNAL_MODE': 'DELETE',
+        'DB_SYNCHRONOUS': 'FULL',
+        'DB_CACHE_SIZE': '-2000',
+        'DB_MMAP_SIZE': '0',
+        'DB_TEMP_STORE': 'DEFAULT',
+        'DB_BUSY_RETRIES': '0',
+    },
+    'tuned': {
+        'DB_JOURNAL_MODE': 'WAL',
+        'DB_SYNCHRONOUS': 'NORMAL',
+        'DB_CACHE_SIZE': '-16000',
+        'DB_MMAP_SIZE': '134217728',
+        'DB_TEMP_STORE': 'MEMORY',
+        'DB_BUSY_RETRIES': '3',
+    },
+}
+
+def worker(db_path, profile, seconds, write_ratio, results):
+    """Run a read-heavy mix of chat and report operations for a fixed time"""
+    os.environ.update(PROFILES[profile])
+    os.environ['DATABASE_PATH'] = db_path
+    sys.path.insert(0, ROOT)
+    import database
+
+    ops = errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            if ops % 100 < write_ratio * 100:
+                if ops % 2:
+                    database.create_message(1, f'benchmark message {os.getpid()}-{ops}')
+                else:
+                    database.create_emergency_report(1, 'Benchmark', 'benchmark report', 'low')
+            else:
+                database.get_messages(limit=50)
+                database.get_emergency_reports(limit=20)
+            ops += 1
+        except Exception:
+            errors += 1
+    results.put((ops, errors))
+
+def run_profile(profile, workers, seconds, write_ratio):
+    """Initialise a fresh database with the profile and run the workers"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'bench.db')
+        init = multiprocessing.Process(target=_init_database, args=(db_path, profile))
+        init.start()
+        init.join()
+
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=worker, args=(db_path, profile, seconds, write_ratio, results))
+                 for _ in range(workers)]
+        for proc in procs:
+            proc.start()
+        totals = [results.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+
+    ops = sum(t[0] for t in totals)
+    errors = sum(t[1] for t in totals)
+    return ops / seconds, errors
+
+def _init_database(db_path, profile):
+    os.environ.update(PROFILES[profile])
+    os.environ['DATABASE_PATH'] = db_path
+    sys.path.insert(0, ROOT)
+    import database
+    database.init_database()
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite mixed read/write throughput benchmark')
+    parser.add_argument('--workers', type=int, default=4, help='Number of worker processes')
+    parser.add_argument('--seconds', type=float, default=5.0, help='Duration per profile')
+    parser.add_argument('--write-ratio', type=float, default=0.2, help='Fraction of operations that write')
+    args = parser.parse_args()
+
+    print(f"Mixed workload: {args.workers} workers, {args.seconds:.0f}s, {args.write_ratio:.0%} writes")
+    baseline = None
+    for profile in ('legacy', 'tuned'):
+        throughput, errors = run_profile(profile, args.workers, args.seconds, args.write_ratio)
+        speedup = f"  ({throughput / baseline:.2f}x)" if baseline else ''
+        print(f"  {profile:<8} {throughput:10.1f} ops/s   lock errors: {errors}{speedup}")
+        baseline = baseline or throughput
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Emergency Response App - Medical Chatbot
+Rule-based answers for the medical assistant. The keywords of every intent
+are compiled once into a single regex, so a message is scanned in one pass
+and the most urgent intent it mentions wins.
+"""
+
+import re
+
+URGENCY_RANK = {'low': 0, 'medium': 1, 'high': 2, 'critical': 3}
+
+# On equal urgency the intent listed first wins. The first keyword of an
+# intent is its full name; a message naming it beats one sharing a word.
+# Keywords ending in * are stems that match any ending ("burn*": burnt,
+# burning); the others are words that only take plural and verb endings,
+# so "hot" does not match "hotel" nor "heart" match "heartburn".
+INTENTS = [
+    {
+        'name': 'heart_attack',
+        'keywords': ('heart attack', 'heart', 'attack'),
+        'urgency': 'critical',
+        'response': "🚨 **HEART ATTACK EMERGENCY** 🚨\n\n**IMMEDIATE ACTIONS:**\n1. Call 119 (ambulance) immediately\n2. Have the person sit down and rest\n3. Give aspirin if available and not allergic\n4. Loosen tight clothing\n5. Be ready to perform CPR if they become unconscious\n\n**SIGNS:** Chest pain, shortness of breath, nausea, sweating\n\n**DO NOT:** Give food or water"
+    },
+    {
+        'name': 'choking',
+        'keywords': ('choking', 'chok*'),
+        'urgency': 'critical',
+        'response': "🚨 **CHOKING EMERGENCY** 🚨\n\n**IMMEDIATE ACTIONS:**\n1. Ask 'Are you choking?'\n2. If they can't speak/cough: Stand behind them\n3. Give 5 back blows between shoulder blades\n4. Give 5 abdominal thrusts (Heimlich maneuver)\n5. Alternate back blows and abdominal thrusts\n6. Call 118 if object doesn't dislodge\n\n**FOR INFANTS:** Use gentle back blows and chest thrusts"
+    },
+    {
+        'name': 'bleeding',
+        'keywords': ('bleeding', 'bleed*', 'bled'),
+        'urgency': 'high',
+        'response': "🩸 **BLEEDING CONTROL** 🩸\n\n**IMMEDIATE ACTIONS:**\n1. Apply direct pressure with clean cloth\n2. Elevate the injured area above heart level\n3. Don't remove embedded objects\n4. Apply pressure bandage\n5. Call 119 for severe bleeding\n\n**SEVERE BLEEDING SIGNS:** Spurting blood, won't stop after 10 minutes of pressure\n\n**SHOCK PREVENTION:** Keep person warm and lying down"
+    },
+    {
+        'name': 'burn',
+        'keywords': ('burn*', 'sunburn*'),
+        'urgency': 'high',
+        'response': "🔥 **BURN TREATMENT** 🔥\n\n**IMMEDIATE ACTIONS:**\n1. Remove from heat source safely\n2. Cool with running water for 10-20 minutes\n3. Remove jewelry/tight clothing before swelling\n4. Cover with clean, dry cloth\n5. Call 119 for severe burns\n\n**DO NOT:** Use ice, butter, or ointments\n**SEVERE BURNS:** Larger than palm, on face/hands/genitals, or deep"
+    },
+    {
+        'name': 'fracture',
+        'keywords': ('fractur*',),
+        'urgency': 'medium',
+        'response': "🦴 **FRACTURE MANAGEMENT** 🦴\n\n**IMMEDIATE ACTIONS:**\n1. Don't move the person unless in danger\n2. Support the injured area\n3. Apply splint if trained (don't move bone)\n4. Apply ice wrapped in cloth\n5. Call 119 for severe fractures\n\n**SIGNS:** Deformity, severe pain, inability to move, numbness\n**OPEN FRACTURE:** Don't push bone back in, cover with sterile dressing"
+    },
+    {
+        'name': 'seizure',
+        'keywords': ('seizure',),
+        'urgency': 'medium',
+        'response': "🧠 **SEIZURE RESPONSE** 🧠\n\n**IMMEDIATE ACTIONS:**\n1. Stay calm and time the seizure\n2. Clear area of dangerous objects\n3. Turn person on their side\n4. Put something soft under their head\n5. Call 119 if seizure lasts >5 minutes\n\n**DO NOT:** Put anything in their mouth, restrain them\n**AFTER SEIZURE:** Stay with them, they may be confused"
+    },
+    {
+        'name': 'poisoning',
+        'keywords': ('poisoning', 'poison*'),
+        'urgency': 'critical',
+        'response': "☠️ **POISONING EMERGENCY** ☠️\n\n**IMMEDIATE ACTIONS:**\n1. Call Poison Control: 119\n2. Identify the poison if possible\n3. If conscious: rinse mouth with water\n4. Don't induce vomiting unless told to\n5. Save poison container/vomit sample\n\n**INHALED POISON:** Get to fresh air immediately\n**SKIN CONTACT:** Remove contaminated clothing, rinse with water"
+    },
+    {
+        'name': 'allergic_reaction',
+        'keywords': ('allergic reaction', 'allergic', 'reaction', 'allerg*'),
+        'urgency': 'critical',
+        'response': "🤧 **ALLERGIC REACTION** 🤧\n\n**MILD REACTION:**\n- Antihistamine (Benadryl)\n- Cool compress for itching\n- Avoid allergen\n\n**SEVERE (ANAPHYLAXIS):**\n1. Call 119 immediately\n2. Use EpiPen if available\n3. Have person lie down, elevate legs\n4. Be ready for CPR\n\n**SIGNS OF ANAPHYLAXIS:** Difficulty breathing, swelling of face/throat, rapid pulse"
+    },
+    {
+        'name': 'unconscious',
+        'keywords': ('unconscious',),
+        'urgency': 'critical',
+        'response': "😵 **UNCONSCIOUS PERSON** 😵\n\n**IMMEDIATE ACTIONS:**\n1. Check responsiveness: tap shoulders, shout\n2. Call 119 immediately\n3. Check breathing and pulse\n4. If breathing: recovery position\n5. If not breathing: start CPR\n\n**RECOVERY POSITION:** On side, head tilted back, top leg bent\n**CPR:** 30 chest compressions, 2 rescue breaths, repeat"
+    },
+    {
+        'name': 'cpr',
+        'keywords': ('cpr',),
+        'urgency': 'critical',
+        'response': "❤️ **CPR INSTRUCTIONS** ❤️\n\n**STEPS:**\n1. Check responsiveness and breathing\n2. Call 119\n3. Place heel of hand on center of chest\n4. Push hard and fast 2 inches deep\n5. 100-120 compressions per minute\n6. After 30 compressions: 2 rescue breaths\n7. Continue until help arrives\n\n**HAND POSITION:** Between nipples, fingers interlocked\n**DEPTH:** At least 2 inches for adults"
+    },
+    {
+        'name': 'pain',
+        'keywords': ('pain', 'painful', 'hurt', 'ache', 'aching', 'headache'),
+        'urgency': 'low',
+        'response': "🩺 **PAIN MANAGEMENT** 🩺\n\nFor general pain:\n- Rest the affected area\n- Apply ice for injuries (20 min on/off)\n- Over-the-counter pain relievers if appropriate\n- Seek medical attention if severe or persistent\n\n**WHEN TO CALL 119:** Severe pain, chest pain, abdominal pain with fever, head injury pain"
+    },
+    {
+        'name': 'fever',
+        'keywords': ('fever*', 'temperature', 'hot'),
+        'urgency': 'low',
+        'response': "🌡️ **FEVER MANAGEMENT** 🌡️\n\n- Rest and stay hydrated\n- Light clothing\n- Cool compress on forehead\n- Fever reducers if appropriate\n\n**CALL 119 IF:** Fever >104°F (40°C), difficulty breathing, severe headache, stiff neck, confusion"
+    },
+    {
+        'name': 'wound',
+        'keywords': ('cut', 'cutting', 'wound', 'injur*'),
+        'urgency': 'low',
+        'response': "🩹 **WOUND CARE** 🩹\n\n**MINOR CUTS:**\n1. Clean hands first\n2. Stop bleeding with pressure\n3. Clean wound with water\n4. Apply antibiotic ointment\n5. Cover with bandage\n\n**SEEK MEDICAL CARE:** Deep cuts, won't stop bleeding, signs of infection, tetanus concerns"
+    }
+]
+
+DEFAULT_RESPONSE = """🤖 **MEDICAL EMERGENCY AI ASSISTANT** 🤖
+
+I can help with emergency medical situations. Try asking about:
+
+🚨 **EMERGENCIES:**
+- Heart attack
+- Choking
+- Severe bleeding
+- Burns
+- Fractures
+- Seizures
+- Poisoning
+- Allergic reactions
+- Unconscious person
+- CPR instructions
+
+🩺 **GENERAL:**
+- Pain management
+- Fever treatment
+- Wound care
+- Basic first aid
+
+**REMEMBER:** For life-threatening emergencies, call 119 immediately!
+
+What medical emergency can I help you with?"""
+
+def _trie_pattern(node):
+    """Regex for the keywords in a character trie, sharing their common prefixes"""
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+    pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if '' in node:
+        # A keyword ends here; the greedy ? still tries the longer ones first
+        pattern = (pattern if len(branches) > 1 else '(?:' + pattern + ')') + '?'
+    return pattern
+
+def _trie(keywords):
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    return trie
+
+def compile_keywords(keywords):
+    """One regex matching any of the (lowercase) keywords at the start of a word.
+
+    Words may take plural and verb endings, stems (ending in *) any ending;
+    group 1 or 2 holds the word or stem matched. Each kind is merged into a
+    prefix trie, so a prefix keywords share is only tried once per position.
+    """
+    keywords = set(keywords)
+    words = _trie(keyword for keyword in keywords if not keyword.endswith('*'))
+    stems = _trie(keyword[:-1] for keyword in keywords if keyword.endswith('*'))
+    return re.compile(r'\b(?:(' + _trie_pattern(words) + r')(?:s|es|d|ed|ing)?\b|(' + _trie_pattern(stems) + r')\w*)')
+
+KEYWORD_PATTERN = compile_keywords(keyword for intent in INTENTS for keyword in intent['keywords'])
+
+# keyword (stems without their *) -> (intent position, whether the keyword is the intent's full name)
+KEYWORD_INTENTS = {keyword.rstrip('*'): (position, keyword == intent['keywords'][0])
+                   for position, intent in enumerate(INTENTS) for keyword in intent['keywords']}
+
+def match_intent(message):
+    """The intent a message is about, or None.
+
+    Ranks the intents it mentions by urgency, then by whether the full
+    name was used, then by their order in INTENTS.
+    """
+    best_score, best = None, None
+    for match in KEYWORD_PATTERN.finditer((message or '').lower()):
+        position, full_name = KEYWORD_INTENTS[match.group(1) or match.group(2)]
+        intent = INTENTS[position]
+        score = (URGENCY_RANK[intent['urgency']], full_name, -position)
+        if best_score is None or score > best_score:
+            best_score, best = score, intent
+    return best
+
+def get_medical_emergency_response(message):
+    """Simple rule-based medical emergency chatbot responses"""
+    intent = match_intent(message)
+    return intent['response'] if intent else DEFAULT_RESPONSE
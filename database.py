@@ -1,370 +1,1004 @@
 import sqlite3
-import bcrypt
-from datetime import datetime
+import threading
+from datetime import datetime, timezone
 import os
+from db_pool import ConnectionPool, DEFAULT_POOL_SIZE, DEFAULT_POOL_TIMEOUT, retry_on_busy
+from migrations import run_migrations, fire_station_places
+from geocoding import geocode
+from pagination import keyset_page
+from cache import TTLCache
+from events import broker
+import auth_crypto
 
 DATABASE_PATH = os.environ.get('DATABASE_PATH', 'emergency_app.db')
-
-def get_db_connection():
-    """Get database connection"""
-    conn = sqlite3.connect(DATABASE_PATH)
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', DEFAULT_POOL_SIZE))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT))
+
+# Journal mode is persistent in the database file and is applied by init_database;
+# the remaining PRAGMAs are per-connection and applied when a connection is opened.
+DB_JOURNAL_MODE = os.environ.get('DB_JOURNAL_MODE', 'WAL').upper()
+DB_BUSY_TIMEOUT = float(os.environ.get('DB_BUSY_TIMEOUT', 5.0))
+DB_BUSY_RETRIES = int(os.environ.get('DB_BUSY_RETRIES', 3))
+SQLITE_PRAGMAS = {
+    'synchronous': os.environ.get('DB_SYNCHRONOUS', 'NORMAL').upper(),
+    'cache_size': int(os.environ.get('DB_CACHE_SIZE', -16000)),     # negative = KiB, i.e. 16 MB
+    'mmap_size': int(os.environ.get('DB_MMAP_SIZE', 134217728)),    # 128 MB
+    'temp_store': os.environ.get('DB_TEMP_STORE', 'MEMORY').upper(),
+}
+
+_PRAGMA_CHOICES = {
+    'journal_mode': ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'),
+    'synchronous': ('OFF', 'NORMAL', 'FULL', 'EXTRA'),
+    'temp_store': ('DEFAULT', 'FILE', 'MEMORY'),
+}
+
+def _pragma(conn, name, value):
+    """Set a PRAGMA after validating the value (PRAGMAs cannot be parameterized)"""
+    if name in _PRAGMA_CHOICES:
+        if value not in _PRAGMA_CHOICES[name]:
+            raise ValueError(f"Invalid value for PRAGMA {name}: {value}")
+    else:
+        value = int(value)
+    return conn.execute(f'PRAGMA {name} = {value}').fetchone()
+
+write_retry = retry_on_busy(retries=DB_BUSY_RETRIES)
+
+# Login identifiers that matched no user, so repeated guesses skip the database.
+# Keyed by the lowercased identifier, holding the exact spellings that missed,
+# so a registration can evict every case variant of its email.
+UNKNOWN_LOGIN_TTL = float(os.environ.get('UNKNOWN_LOGIN_TTL', 60.0))
+_unknown_logins = TTLCache(maxsize=10000, ttl=UNKNOWN_LOGIN_TTL)
+
+# Users loaded for authenticated requests; every change to a user evicts its entry.
+# Evictions only reach other workers through a shared event log, so with the
+# in-process broker (EVENT_BACKEND=memory) users are not cached across requests.
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 30.0)) if broker.shared else 0.0
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))
+_session_users = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Databases init_database has run against in this process (see ensure_database)
+_initialized = set()
+_init_lock = threading.Lock()
+
+def _open_connection(path):
+    """Open a new physical database connection"""
+    conn = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    for name, value in SQLITE_PRAGMAS.items():
+        _pragma(conn, name, value)
     return conn
 
+def get_pool(path=None):
+    """Get the connection pool for a database path (defaults to DATABASE_PATH)"""
+    path = path or DATABASE_PATH
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                pool = ConnectionPool(path, lambda: _open_connection(path),
+                                      max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT)
+                _pools[path] = pool
+    return pool
+
+def close_pools():
+    """Close every connection pool (used on shutdown and between tests)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+    # An in-memory database is gone once its connection closes
+    _initialized.discard(':memory:')
+
+def set_database_path(path):
+    """Use another database for this process (create_app's DATABASE setting)"""
+    global DATABASE_PATH
+    DATABASE_PATH = path
+
+def get_db_connection():
+    """Get a pooled database connection.
+
+    Use as a context manager (``with get_db_connection() as conn``); calling
+    ``close()`` returns the connection to the pool.
+    """
+    return get_pool().connection()
+
 def init_database():
     """Initialize the database with required tables"""
-    conn = get_db_connection()
-
-    # Create users table
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            user_type TEXT NOT NULL CHECK (user_type IN ('user', 'fire_department')),
-            full_name TEXT NOT NULL,
-            phone TEXT,
-            department_name TEXT,
-            department_location TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            is_active BOOLEAN DEFAULT 1
-        )
-    ''')
-
-    # Create emergency_reports table
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS emergency_reports (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            location TEXT NOT NULL,
-            description TEXT,
-            severity TEXT NOT NULL CHECK (severity IN ('low', 'medium', 'high', 'critical')),
-            status TEXT DEFAULT 'reported' CHECK (status IN ('reported', 'responding', 'resolved', 'cancelled')),
-            latitude REAL,
-            longitude REAL,
-            location_accuracy REAL,
-            reported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            assigned_department_id INTEGER,
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (assigned_department_id) REFERENCES users (id)
-        )
-    ''')
-
-    # Add location_accuracy column if it doesn't exist (for existing databases)
-    try:
-        conn.execute('ALTER TABLE emergency_reports ADD COLUMN location_accuracy REAL')
+    with get_db_connection() as conn:
+        # WAL lets readers proceed while a writer commits (no-op for ':memory:')
+        _pragma(conn, 'journal_mode', DB_JOURNAL_MODE)
+
+        # Create users table
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                user_type TEXT NOT NULL CHECK (user_type IN ('user', 'fire_department')),
+                full_name TEXT NOT NULL,
+                phone TEXT,
+                department_name TEXT,
+                department_location TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                is_active BOOLEAN DEFAULT 1
+            )
+        ''')
+
+        # Create emergency_reports table
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS emergency_reports (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                location TEXT NOT NULL,
+                description TEXT,
+                severity TEXT NOT NULL CHECK (severity IN ('low', 'medium', 'high', 'critical')),
+                status TEXT DEFAULT 'reported' CHECK (status IN ('reported', 'responding', 'resolved', 'cancelled')),
+                latitude REAL,
+                longitude REAL,
+                location_accuracy REAL,
+                reported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                assigned_department_id INTEGER,
+                FOREIGN KEY (user_id) REFERENCES users (id),
+                FOREIGN KEY (assigned_department_id) REFERENCES users (id)
+            )
+        ''')
+
+        # Create sessions table for user sessions
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_sessions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                session_token TEXT UNIQUE NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                expires_at TIMESTAMP NOT NULL,
+                is_active BOOLEAN DEFAULT 1,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+
+        # Create messages table for community chat
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                message_type TEXT DEFAULT 'general' CHECK (message_type IN ('general', 'info', 'alert', 'emergency')),
+                likes INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                is_deleted BOOLEAN DEFAULT 0,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+
         conn.commit()
-        print("Added location_accuracy column to existing database")
-    except sqlite3.OperationalError:
-        # Column already exists
-        pass
-
-    # Create sessions table for user sessions
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS user_sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            session_token TEXT UNIQUE NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            expires_at TIMESTAMP NOT NULL,
-            is_active BOOLEAN DEFAULT 1,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-
-    # Create messages table for community chat
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            content TEXT NOT NULL,
-            message_type TEXT DEFAULT 'general' CHECK (message_type IN ('general', 'info', 'alert', 'emergency')),
-            likes INTEGER DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            is_deleted BOOLEAN DEFAULT 0,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-
-    conn.commit()
-    conn.close()
+
+        # Apply versioned schema changes (columns, indexes) on top of the base tables
+        run_migrations(conn)
+    _initialized.add(DATABASE_PATH)
     print("Database initialized successfully!")
 
+def ensure_database():
+    """Initialize the current database unless this process already did (runs before each request)"""
+    if DATABASE_PATH in _initialized:
+        return
+    with _init_lock:
+        if DATABASE_PATH not in _initialized:
+            init_database()
+
 def hash_password(password):
-    """Hash a password using bcrypt"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    """Hash a password using bcrypt (on the bounded auth_crypto pool)"""
+    return auth_crypto.hash_password(password)
 
 def verify_password(password, password_hash):
-    """Verify a password against its hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    """Verify a password against its hash (on the bounded auth_crypto pool)"""
+    return auth_crypto.verify_password(password, password_hash)
 
+def _geocode_department(conn, department_location):
+    """(latitude, longitude) of a department's location text, or (None, None) if it cannot be placed"""
+    if not department_location:
+        return None, None
+    return geocode(department_location, fire_station_places(conn)) or (None, None)
+
+@write_retry
 def create_user(username, email, password, user_type, full_name, phone=None, department_name=None, department_location=None):
     """Create a new user"""
-    conn = get_db_connection()
-
-    try:
-        password_hash = hash_password(password)
-
-        cursor = conn.execute('''
-            INSERT INTO users (username, email, password_hash, user_type, full_name, phone, department_name, department_location)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (username, email, password_hash, user_type, full_name, phone, department_name, department_location))
-
-        conn.commit()
-        user_id = cursor.lastrowid
-        conn.close()
-        return user_id
-    except sqlite3.IntegrityError as e:
-        conn.close()
-        if 'username' in str(e):
-            raise ValueError("Username already exists")
-        elif 'email' in str(e):
-            raise ValueError("Email already exists")
-        else:
-            raise ValueError("User creation failed")
+    password_hash = hash_password(password)
+
+    with get_db_connection() as conn:
+        try:
+            latitude, longitude = _geocode_department(conn, department_location)
+            cursor = conn.execute('''
+                INSERT INTO users (username, email, password_hash, user_type, full_name, phone, department_name, department_location,
+                                   department_latitude, department_longitude)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (username, email, password_hash, user_type, full_name, phone, department_name, department_location,
+                  latitude, longitude))
+
+            conn.commit()
+            # The new username/email may have been remembered as unknown, and
+            # a new department must reach the dispatch index
+            invalidate_user(cursor.lastrowid, logins=(username, email), user_type=user_type)
+            return cursor.lastrowid
+        except sqlite3.IntegrityError as e:
+            if 'username' in str(e):
+                raise ValueError("Username already exists")
+            elif 'email' in str(e):
+                raise ValueError("Email already exists")
+            else:
+                raise ValueError("User creation failed")
 
 def get_user_by_username(username):
     """Get user by username"""
-    conn = get_db_connection()
-    user = conn.execute(
-        'SELECT * FROM users WHERE username = ? AND is_active = 1',
-        (username,)
-    ).fetchone()
-    conn.close()
+    with get_db_connection() as conn:
+        user = conn.execute(
+            'SELECT * FROM users WHERE username = ? AND is_active = 1',
+            (username,)
+        ).fetchone()
     return dict(user) if user else None
 
 def get_user_by_id(user_id):
     """Get user by ID"""
-    conn = get_db_connection()
-    user = conn.execute(
-        'SELECT * FROM users WHERE id = ? AND is_active = 1',
-        (user_id,)
-    ).fetchone()
-    conn.close()
+    with get_db_connection() as conn:
+        user = conn.execute(
+            'SELECT * FROM users WHERE id = ? AND is_active = 1',
+            (user_id,)
+        ).fetchone()
     return dict(user) if user else None
 
+SESSION_USER_COLUMNS = ('id, username, email, user_type, full_name, phone, '
+                        'department_name, department_location, created_at, is_active')
+
+def get_session_user(user_id):
+    """Get an active user for an authenticated request, through the shared user cache.
+
+    The cached row leaves out password_hash; use get_user_by_id when it is needed.
+    """
+    # Make sure evictions published by other workers reach this one
+    broker.start()
+    key = (DATABASE_PATH, int(user_id))
+    user = _session_users.get(key) if USER_CACHE_TTL > 0 else None
+    if user is None:
+        with get_db_connection() as conn:
+            row = conn.execute(f'SELECT {SESSION_USER_COLUMNS} FROM users WHERE id = ? AND is_active = 1',
+                               (key[1],)).fetchone()
+        if row is None:
+            return None
+        user = dict(row)
+        if USER_CACHE_TTL > 0:
+            _session_users.set(key, user, USER_CACHE_TTL)
+    return dict(user)
+
+def invalidate_user(user_id, logins=(), user_type=None):
+    """Evict a changed user from the cache here and, through the broker, in other workers.
+
+    logins are the user's new username/email, forgotten as unknown logins.
+    user_type lets listeners skip users they do not index (dispatch only
+    rebuilds for fire departments); it is None for a password change.
+    """
+    _session_users.pop((DATABASE_PATH, int(user_id)))
+    _forget_unknown_logins(DATABASE_PATH, logins)
+    broker.publish('user.changed', {'database': DATABASE_PATH, 'id': int(user_id), 'logins': list(logins),
+                                    'user_type': user_type})
+
+def _user_type(conn, user_id):
+    row = conn.execute('SELECT user_type FROM users WHERE id = ?', (user_id,)).fetchone()
+    return row['user_type'] if row else None
+
+def _forget_unknown_logins(database_path, logins):
+    for login in logins:
+        if login:
+            _unknown_logins.pop((database_path, login.lower()))
+
+def _evict_changed_user(event):
+    _session_users.pop((event.data['database'], event.data['id']))
+    _forget_unknown_logins(event.data['database'], event.data.get('logins', ()))
+
+broker.listen(['user.changed'], _evict_changed_user)
+
+AUTH_USER_COLUMNS = ('id, username, email, password_hash, user_type, full_name, phone, '
+                     'department_name, department_location, created_at, is_active')
+
+def get_user_for_login(username_or_email):
+    """Get an active user by username, or else by case-insensitive email, in one query"""
+    key = (DATABASE_PATH, username_or_email.lower())
+    if username_or_email in _unknown_logins.get(key, ()):
+        return None
+
+    with get_db_connection() as conn:
+        user = conn.execute(f'''
+            SELECT {AUTH_USER_COLUMNS} FROM users
+            WHERE (username = ? OR email = ? COLLATE NOCASE) AND is_active = 1
+            ORDER BY username = ? DESC
+            LIMIT 1
+        ''', (username_or_email, username_or_email, username_or_email)).fetchone()
+
+    if user is None:
+        _unknown_logins.set(key, _unknown_logins.get(key, frozenset()) | {username_or_email})
+        return None
+    return dict(user)
+
 def authenticate_user(username_or_email, password):
     """Authenticate user with username/email and password"""
-    # Try to find user by username first
-    user = get_user_by_username(username_or_email)
-
-    # If not found by username, try by email
-    if not user:
-        user = get_user_by_email(username_or_email)
+    # A username match takes precedence over an email match
+    user = get_user_for_login(username_or_email)
 
     # Verify password if user found
     if user and verify_password(password, user['password_hash']):
+        if auth_crypto.needs_rehash(user['password_hash']):
+            # Upgrade the hash to the configured cost while we have the plaintext
+            try:
+                _update_password_hash(user['id'], hash_password(password))
+            except auth_crypto.CryptoBusy:
+                pass
         return user
     return None
 
 def get_user_by_email(email):
     """Get user by email"""
-    conn = get_db_connection()
-    user = conn.execute(
-        'SELECT * FROM users WHERE email = ? AND is_active = 1',
-        (email,)
-    ).fetchone()
-    conn.close()
+    with get_db_connection() as conn:
+        user = conn.execute(
+            'SELECT * FROM users WHERE email = ? AND is_active = 1',
+            (email,)
+        ).fetchone()
     return dict(user) if user else None
 
+@write_retry
 def create_emergency_report(user_id, location, description, severity, latitude=None, longitude=None, location_accuracy=None):
-    """Create a new emergency report"""
-    conn = get_db_connection()
+    """Create a new emergency report, assigned to the nearest available department when it has coordinates"""
+    department_id = None
+    if latitude is not None and longitude is not None:
+        from dispatch import assign_department
+        try:
+            department_id = assign_department(latitude, longitude)
+        except Exception as e:
+            # Unassigned reports still reach every department
+            print(f"Dispatch assignment failed for report at {latitude},{longitude}: {e}")
+
+    with get_db_connection() as conn:
+        cursor = conn.execute('''
+            INSERT INTO emergency_reports (user_id, location, description, severity, latitude, longitude, location_accuracy,
+                                           assigned_department_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, location, description, severity, latitude, longitude, location_accuracy, department_id))
 
-    cursor = conn.execute('''
-        INSERT INTO emergency_reports (user_id, location, description, severity, latitude, longitude, location_accuracy)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (user_id, location, description, severity, latitude, longitude, location_accuracy))
+        conn.commit()
+        report_id = cursor.lastrowid
 
-    conn.commit()
-    report_id = cursor.lastrowid
-    conn.close()
+    broker.publish('report.created', get_emergency_report(report_id))
     return report_id
 
-def get_emergency_reports(limit=50, status=None, department_id=None):
-    """Get emergency reports with optional filtering"""
-    conn = get_db_connection()
-    
-    query = '''
-        SELECT er.*, u.full_name as reporter_name, u.phone as reporter_phone
-        FROM emergency_reports er
-        LEFT JOIN users u ON er.user_id = u.id
-        WHERE 1=1
-    '''
+REPORT_ORDER_COLUMNS = ('reported_at', 'updated_at')
+
+REPORT_SELECT = '''
+    SELECT er.*, u.full_name as reporter_name, u.phone as reporter_phone
+    FROM emergency_reports er
+    LEFT JOIN users u ON er.user_id = u.id
+'''
+
+def _normalize_timestamp(value):
+    """Convert a datetime or ISO 8601 string to the 'YYYY-MM-DD HH:MM:SS' form SQLite stores"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+def _add_filter(clauses, params, column, value):
+    """Append an equality (or IN for lists) filter"""
+    if isinstance(value, (list, tuple, set)):
+        values = list(value)
+        clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+        params.extend(values)
+    else:
+        clauses.append(f'{column} = ?')
+        params.append(value)
+
+def _keyset_clause(sort_column, id_column, keyset, descending):
+    """Return (clause, params, descending) to seek past a (sort value, id, direction) keyset.
+
+    'prev' pages walk the listing backwards, so the comparison and the
+    ORDER BY direction are both flipped.
+    """
+    sort_value, row_id, direction = keyset
+    if direction == 'prev':
+        descending = not descending
+    op = '<' if descending else '>'
+    return f'({sort_column}, {id_column}) {op} (?, ?)', [sort_value, row_id], descending
+
+def _add_department_filter(clauses, params, department_id, include_unassigned):
+    """Append an assigned department filter, optionally keeping unassigned reports"""
+    if include_unassigned:
+        department_clauses = []
+        _add_filter(department_clauses, params, 'er.assigned_department_id', department_id)
+        clauses.append(f'({department_clauses[0]} OR er.assigned_department_id IS NULL)')
+    else:
+        _add_filter(clauses, params, 'er.assigned_department_id', department_id)
+
+def build_report_query(report_id=None, status=None, severity=None, department_id=None,
+                       since=None, until=None, order_by='reported_at', descending=True, limit=50,
+                       keyset=None, count=False, include_unassigned=False):
+    """Build the SQL and parameters for an emergency report lookup.
+
+    status and severity accept a single value or a list. since/until bound
+    the order_by column (inclusive/exclusive). limit=None returns every match.
+    keyset is a decoded pagination cursor (see pagination.py). count=True
+    builds a COUNT(*) over the same filters instead of fetching rows.
+    include_unassigned widens a department_id filter to unassigned reports.
+    """
+    if order_by not in REPORT_ORDER_COLUMNS:
+        raise ValueError(f"Invalid order column: {order_by}")
+
+    clauses = []
     params = []
-    
+    if report_id is not None:
+        _add_filter(clauses, params, 'er.id', report_id)
     if status:
-        query += ' AND er.status = ?'
-        params.append(status)
-    
+        _add_filter(clauses, params, 'er.status', status)
+    if severity:
+        _add_filter(clauses, params, 'er.severity', severity)
     if department_id:
-        query += ' AND er.assigned_department_id = ?'
-        params.append(department_id)
-    
-    query += ' ORDER BY er.reported_at DESC LIMIT ?'
-    params.append(limit)
-    
-    reports = conn.execute(query, params).fetchall()
-    conn.close()
-    
+        _add_department_filter(clauses, params, department_id, include_unassigned)
+    if since is not None:
+        clauses.append(f'er.{order_by} >= ?')
+        params.append(_normalize_timestamp(since))
+    if until is not None:
+        clauses.append(f'er.{order_by} < ?')
+        params.append(_normalize_timestamp(until))
+    if keyset is not None:
+        clause, keyset_params, descending = _keyset_clause(f'er.{order_by}', 'er.id', keyset, descending)
+        clauses.append(clause)
+        params.extend(keyset_params)
+
+    where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+    if count:
+        return 'SELECT COUNT(*) FROM emergency_reports er' + where, params
+
+    direction = 'DESC' if descending else 'ASC'
+    query = REPORT_SELECT + where
+    query += f' ORDER BY er.{order_by} {direction}, er.id {direction}'
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(limit)
+    return query, params
+
+def get_emergency_reports(limit=50, status=None, department_id=None, severity=None,
+                          since=None, until=None, order_by='reported_at', descending=True,
+                          include_unassigned=False):
+    """Get emergency reports with optional filtering"""
+    query, params = build_report_query(status=status, severity=severity, department_id=department_id,
+                                       since=since, until=until, order_by=order_by,
+                                       descending=descending, limit=limit,
+                                       include_unassigned=include_unassigned)
+    with get_db_connection() as conn:
+        reports = conn.execute(query, params).fetchall()
+
     return [dict(report) for report in reports]
 
-def update_report_status(report_id, status, department_id=None):
-    """Update emergency report status"""
-    conn = get_db_connection()
-    
+def get_emergency_reports_page(cursor=None, limit=50, status=None, department_id=None, severity=None,
+                               since=None, until=None, order_by='reported_at', descending=True):
+    """Get one keyset-paginated page of emergency reports.
+
+    Returns {'items', 'next_cursor', 'prev_cursor'}; pass a cursor back to
+    continue in that direction.
+    """
+    def fetch(keyset, page_limit):
+        query, params = build_report_query(status=status, severity=severity, department_id=department_id,
+                                           since=since, until=until, order_by=order_by,
+                                           descending=descending, limit=page_limit, keyset=keyset)
+        with get_db_connection() as conn:
+            return [dict(report) for report in conn.execute(query, params).fetchall()]
+
+    return keyset_page(fetch, limit, cursor, sort_key=order_by)
+
+def count_emergency_reports(status=None, department_id=None, severity=None, since=None, until=None,
+                            order_by='reported_at'):
+    """Count emergency reports matching the same filters as get_emergency_reports"""
+    query, params = build_report_query(status=status, severity=severity, department_id=department_id,
+                                       since=since, until=until, order_by=order_by, count=True)
+    with get_db_connection() as conn:
+        return conn.execute(query, params).fetchone()[0]
+
+def get_stat_counters():
+    """Get the trigger-maintained counters (reports by status/severity, live messages, departments)"""
+    with get_db_connection() as conn:
+        rows = conn.execute('SELECT name, value FROM stat_counters').fetchall()
+    return {row['name']: row['value'] for row in rows}
+
+def get_report_changes(after_revision=0, limit=100, status=None, severity=None, department_id=None,
+                       updated_since=None, include_unassigned=False):
+    """Get reports created or updated after a revision, oldest change first.
+
+    Returns {'reports', 'revision', 'has_more'}; pass 'revision' back as
+    after_revision to fetch the next batch of changes. include_unassigned
+    widens a department_id filter to unassigned reports.
+    """
+    clauses = ['er.revision > ?']
+    params = [after_revision]
+    if status:
+        _add_filter(clauses, params, 'er.status', status)
+    if severity:
+        _add_filter(clauses, params, 'er.severity', severity)
     if department_id:
-        conn.execute('''
-            UPDATE emergency_reports 
-            SET status = ?, assigned_department_id = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        ''', (status, department_id, report_id))
+        _add_department_filter(clauses, params, department_id, include_unassigned)
+    if updated_since is not None:
+        clauses.append('er.updated_at >= ?')
+        params.append(_normalize_timestamp(updated_since))
+    query = REPORT_SELECT + ' WHERE ' + ' AND '.join(clauses) + ' ORDER BY er.revision LIMIT ?'
+    params.append(limit + 1)
+
+    with get_db_connection() as conn:
+        # Read the head first: every change up to it is visible to the query below
+        head = conn.execute("SELECT value FROM stat_counters WHERE name = 'reports.revision'").fetchone()
+        reports = [dict(report) for report in conn.execute(query, params).fetchall()]
+
+    has_more = len(reports) > limit
+    reports = reports[:limit]
+    if has_more:
+        revision = reports[-1]['revision']
     else:
-        conn.execute('''
-            UPDATE emergency_reports 
-            SET status = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        ''', (status, report_id))
-    
-    conn.commit()
-    conn.close()
+        # Nothing else matches up to the head, so filtered pollers can skip ahead
+        revision = max([after_revision, head[0] if head else 0] + [r['revision'] for r in reports])
+    return {'reports': reports, 'revision': revision, 'has_more': has_more}
+
+def get_emergency_report(report_id):
+    """Get a single emergency report by ID"""
+    query, params = build_report_query(report_id=report_id, limit=1)
+    with get_db_connection() as conn:
+        report = conn.execute(query, params).fetchone()
+    return dict(report) if report else None
+
+@write_retry
+def update_report_status(report_id, status, department_id=None):
+    """Update emergency report status"""
+    with get_db_connection() as conn:
+        if department_id:
+            conn.execute('''
+                UPDATE emergency_reports 
+                SET status = ?, assigned_department_id = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (status, department_id, report_id))
+        else:
+            conn.execute('''
+                UPDATE emergency_reports 
+                SET status = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (status, report_id))
+
+        conn.commit()
+
+    report = get_emergency_report(report_id)
+    if report:
+        broker.publish('report.updated', report)
 
 def get_fire_departments():
     """Get all fire departments"""
-    conn = get_db_connection()
-    departments = conn.execute(
-        'SELECT * FROM users WHERE user_type = "fire_department" AND is_active = 1'
-    ).fetchall()
-    conn.close()
+    with get_db_connection() as conn:
+        departments = conn.execute(
+            'SELECT * FROM users WHERE user_type = "fire_department" AND is_active = 1'
+        ).fetchall()
     return [dict(dept) for dept in departments]
 
+# Bounding boxes are (south, west, north, east) in degrees; the R*Tree tables
+# (migration 11) hold active reports with coordinates and all facilities
+MAP_REPORT_SELECT = '''
+    SELECT er.id, er.location, er.description, er.severity, er.status, er.latitude, er.longitude,
+           er.reported_at
+    FROM report_locations rl
+    JOIN emergency_reports er ON er.id = rl.id
+'''
+
+def _bbox_clause(bbox, alias=''):
+    """R*Tree overlap test for bbox; returns (sql, params)"""
+    south, west, north, east = bbox
+    prefix = f'{alias}.' if alias else ''
+    return (f'{prefix}min_lat <= ? AND {prefix}max_lat >= ? AND {prefix}min_lng <= ? AND {prefix}max_lng >= ?',
+            [north, south, east, west])
+
+def get_map_reports(bbox=None, report_ids=None, limit=1000):
+    """Active reports with coordinates inside bbox (or with the given ids), newest first"""
+    clauses, params = [], []
+    if bbox is not None:
+        clause, params = _bbox_clause(bbox, 'rl')
+        clauses.append(clause)
+    if report_ids is not None:
+        clauses.append(f"er.id IN ({', '.join('?' * len(report_ids))})")
+        params.extend(report_ids)
+    query = MAP_REPORT_SELECT + (' WHERE ' + ' AND '.join(clauses) if clauses else '') + ' ORDER BY er.id DESC LIMIT ?'
+    with get_db_connection() as conn:
+        reports = conn.execute(query, params + [limit]).fetchall()
+    return [dict(report) for report in reports]
+
+def get_map_report_clusters(bbox, cell_size):
+    """Group the active reports inside bbox into cell_size-degree grid cells.
+
+    Reads only the R*Tree. The grid is anchored at (-90, -180) so a cell is
+    the same wherever the viewport is. Each row has count, mean
+    latitude/longitude, the worst severity_rank (1 low .. 4 critical) and
+    the lowest report_id (the report itself when count is 1).
+    """
+    clause, params = _bbox_clause(bbox)
+    query = f'''
+        SELECT COUNT(*) AS count, AVG(min_lat) AS latitude, AVG(min_lng) AS longitude,
+               MAX(severity_rank) AS severity_rank, MIN(id) AS report_id
+        FROM report_locations
+        WHERE {clause}
+        GROUP BY CAST((min_lat + 90) / ? AS INTEGER), CAST((min_lng + 180) / ? AS INTEGER)
+    '''
+    with get_db_connection() as conn:
+        rows = conn.execute(query, params + [cell_size, cell_size]).fetchall()
+    return [dict(row) for row in rows]
+
+def get_map_facilities(bbox):
+    """Operational hospitals and fire stations inside bbox"""
+    clause, params = _bbox_clause(bbox, 'fl')
+    query = f'''
+        SELECT f.* FROM facility_locations fl
+        JOIN facilities f ON f.id = fl.id
+        WHERE {clause} AND f.operational
+        ORDER BY f.kind, f.name
+    '''
+    with get_db_connection() as conn:
+        facilities = conn.execute(query, params).fetchall()
+    return [dict(facility) for facility in facilities]
+
+FACILITY_KINDS = ('hospital', 'fire_station')
+
+def get_facilities(kind=None):
+    """Operational facilities of one kind (or all) from the facilities registry"""
+    query = 'SELECT * FROM facilities WHERE operational'
+    params = []
+    if kind:
+        query += ' AND kind = ?'
+        params.append(kind)
+    with get_db_connection() as conn:
+        facilities = conn.execute(query + ' ORDER BY id', params).fetchall()
+    return [dict(facility) for facility in facilities]
+
+def get_facility(facility_id):
+    """Get a single facility by ID"""
+    with get_db_connection() as conn:
+        facility = conn.execute('SELECT * FROM facilities WHERE id = ?', (facility_id,)).fetchone()
+    return dict(facility) if facility else None
+
+@write_retry
+def create_facility(kind, name, latitude, longitude, facility_type=None, phone=None, emergency=False,
+                    vehicles=None, city=None, region=None, external_ref=None):
+    """Register a hospital or fire station; returns its id"""
+    if kind not in FACILITY_KINDS:
+        raise ValueError(f"Unknown facility kind: {kind}")
+    with get_db_connection() as conn:
+        cursor = conn.execute('''
+            INSERT INTO facilities (kind, name, facility_type, latitude, longitude, phone, emergency, vehicles,
+                                    city, region, external_ref)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (kind, name, facility_type, latitude, longitude, phone, emergency, vehicles, city, region,
+              external_ref))
+        conn.commit()
+    broker.publish('facility.changed', {'database': DATABASE_PATH, 'id': cursor.lastrowid})
+    return cursor.lastrowid
+
+@write_retry
+def set_facility_operational(facility_id, operational):
+    """Take a facility out of (or back into) service"""
+    with get_db_connection() as conn:
+        conn.execute('UPDATE facilities SET operational = ? WHERE id = ?', (bool(operational), facility_id))
+        conn.commit()
+    broker.publish('facility.changed', {'database': DATABASE_PATH, 'id': facility_id})
+
+MESSAGE_SELECT = '''
+    SELECT m.*, u.full_name, u.user_type, u.username
+    FROM messages m
+    LEFT JOIN users u ON m.user_id = u.id
+'''
+
+@write_retry
 def create_message(user_id, content, message_type='general'):
     """Create a new message"""
-    conn = get_db_connection()
+    with get_db_connection() as conn:
+        cursor = conn.execute('''
+            INSERT INTO messages (user_id, content, message_type)
+            VALUES (?, ?, ?)
+        ''', (user_id, content, message_type))
 
-    cursor = conn.execute('''
-        INSERT INTO messages (user_id, content, message_type)
-        VALUES (?, ?, ?)
-    ''', (user_id, content, message_type))
+        conn.commit()
+        message_id = cursor.lastrowid
+        message = conn.execute(MESSAGE_SELECT + ' WHERE m.id = ?', (message_id,)).fetchone()
 
-    conn.commit()
-    message_id = cursor.lastrowid
-    conn.close()
+    broker.publish('message.created', dict(message))
     return message_id
 
 def get_messages(limit=50):
     """Get recent messages with user information"""
-    conn = get_db_connection()
-
-    messages = conn.execute('''
-        SELECT m.*, u.full_name, u.user_type, u.username
-        FROM messages m
-        LEFT JOIN users u ON m.user_id = u.id
-        WHERE m.is_deleted = 0
-        ORDER BY m.created_at DESC
-        LIMIT ?
-    ''', (limit,)).fetchall()
-
-    conn.close()
+    with get_db_connection() as conn:
+        messages = conn.execute(MESSAGE_SELECT + '''
+            WHERE m.is_deleted = 0
+            ORDER BY m.created_at DESC, m.id DESC
+            LIMIT ?
+        ''', (limit,)).fetchall()
+
     return [dict(message) for message in reversed(messages)]
 
+def get_messages_page(cursor=None, limit=50):
+    """Get one keyset-paginated page of messages.
+
+    Pages walk back through history: the first page holds the newest
+    messages, next_cursor leads to older ones. Items within a page are in
+    chronological order, like get_messages().
+    """
+    def fetch(keyset, page_limit):
+        query = MESSAGE_SELECT + ' WHERE m.is_deleted = 0'
+        params = []
+        descending = True
+        if keyset is not None:
+            clause, params, descending = _keyset_clause('m.created_at', 'm.id', keyset, descending)
+            query += ' AND ' + clause
+        direction = 'DESC' if descending else 'ASC'
+        query += f' ORDER BY m.created_at {direction}, m.id {direction} LIMIT ?'
+        params.append(page_limit)
+        with get_db_connection() as conn:
+            return [dict(message) for message in conn.execute(query, params).fetchall()]
+
+    page = keyset_page(fetch, limit, cursor, sort_key='created_at')
+    page['items'].reverse()
+    return page
+
+@write_retry
 def delete_message(message_id, user_id):
     """Delete a message (soft delete)"""
-    conn = get_db_connection()
-
-    # Check if user owns the message
-    message = conn.execute(
-        'SELECT user_id FROM messages WHERE id = ? AND is_deleted = 0',
-        (message_id,)
-    ).fetchone()
-
-    if not message or message['user_id'] != user_id:
-        conn.close()
-        return False
-
-    # Soft delete the message
-    conn.execute('''
-        UPDATE messages
-        SET is_deleted = 1, updated_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (message_id,))
-
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        # Check if user owns the message
+        message = conn.execute(
+            'SELECT user_id FROM messages WHERE id = ? AND is_deleted = 0',
+            (message_id,)
+        ).fetchone()
+
+        if not message or message['user_id'] != user_id:
+            return False
+
+        # Soft delete the message
+        conn.execute('''
+            UPDATE messages
+            SET is_deleted = 1, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (message_id,))
+
+        conn.commit()
+
+    broker.publish('message.deleted', {'id': message_id})
     return True
 
+@write_retry
 def like_message(message_id):
     """Increment likes for a message"""
-    conn = get_db_connection()
-
-    conn.execute('''
-        UPDATE messages
-        SET likes = likes + 1, updated_at = CURRENT_TIMESTAMP
-        WHERE id = ? AND is_deleted = 0
-    ''', (message_id,))
+    with get_db_connection() as conn:
+        conn.execute('''
+            UPDATE messages
+            SET likes = likes + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND is_deleted = 0
+        ''', (message_id,))
 
-    # Get updated likes count
-    result = conn.execute(
-        'SELECT likes FROM messages WHERE id = ?',
-        (message_id,)
-    ).fetchone()
+        # Get updated likes count
+        result = conn.execute(
+            'SELECT likes FROM messages WHERE id = ?',
+            (message_id,)
+        ).fetchone()
 
-    conn.commit()
-    conn.close()
+        conn.commit()
 
-    return result['likes'] if result else 0
+    if not result:
+        return 0
+    broker.publish('message.liked', {'id': message_id, 'likes': result['likes']})
+    return result['likes']
 
+@write_retry
 def update_user_profile(user_id, full_name, email, username, phone=None, department_name=None, department_location=None):
     """Update user profile information"""
-    conn = get_db_connection()
+    with get_db_connection() as conn:
+        try:
+            latitude, longitude = _geocode_department(conn, department_location)
+            conn.execute('''
+                UPDATE users
+                SET full_name = ?, email = ?, username = ?, phone = ?,
+                    department_name = ?, department_location = ?,
+                    department_latitude = ?, department_longitude = ?
+                WHERE id = ?
+            ''', (full_name, email, username, phone, department_name, department_location, latitude, longitude,
+                  user_id))
+
+            conn.commit()
+            invalidate_user(user_id, logins=(username, email), user_type=_user_type(conn, user_id))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+def change_user_password(user_id, new_password):
+    """Change user password"""
+    return _update_password_hash(user_id, hash_password(new_password))
 
-    try:
+@write_retry
+def _update_password_hash(user_id, password_hash):
+    with get_db_connection() as conn:
         conn.execute('''
             UPDATE users
-            SET full_name = ?, email = ?, username = ?, phone = ?,
-                department_name = ?, department_location = ?
+            SET password_hash = ?
             WHERE id = ?
-        ''', (full_name, email, username, phone, department_name, department_location, user_id))
+        ''', (password_hash, user_id))
 
         conn.commit()
-        conn.close()
-        return True
-    except sqlite3.IntegrityError:
-        conn.close()
-        return False
+    invalidate_user(user_id)
+    return True
 
-def change_user_password(user_id, new_password):
-    """Change user password"""
-    conn = get_db_connection()
+@write_retry
+def delete_user_account(user_id):
+    """Delete user account (soft delete)"""
+    with get_db_connection() as conn:
+        conn.execute('''
+            UPDATE users
+            SET is_active = 0
+            WHERE id = ?
+        ''', (user_id,))
 
-    password_hash = hash_password(new_password)
+        conn.commit()
+        user_type = _user_type(conn, user_id)
+    invalidate_user(user_id, user_type=user_type)
+    return True
 
-    conn.execute('''
-        UPDATE users
-        SET password_hash = ?
-        WHERE id = ?
-    ''', (password_hash, user_id))
+@write_retry
+def enqueue_email(to_email, subject, body_text, body_html=None):
+    """Add an email to the outbox for the background mailer"""
+    with get_db_connection() as conn:
+        cursor = conn.execute('''
+            INSERT INTO email_outbox (to_email, subject, body_text, body_html)
+            VALUES (?, ?, ?, ?)
+        ''', (to_email, subject, body_text, body_html))
 
-    conn.commit()
-    conn.close()
-    return True
+        conn.commit()
+        return cursor.lastrowid
+
+@write_retry
+def claim_outbox_emails(limit, lease_seconds):
+    """Atomically claim up to limit due emails for sending.
+
+    Also reclaims 'sending' rows older than lease_seconds, whose worker
+    presumably died. Each claim counts as one attempt.
+    """
+    with get_db_connection() as conn:
+        emails = conn.execute('''
+            UPDATE email_outbox
+            SET status = 'sending', attempts = attempts + 1, claimed_at = CURRENT_TIMESTAMP
+            WHERE id IN (
+                SELECT id FROM email_outbox
+                WHERE (status = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP)
+                   OR (status = 'sending' AND claimed_at <= datetime('now', ?))
+                ORDER BY next_attempt_at, id
+                LIMIT ?
+            )
+            RETURNING *
+        ''', (f'-{int(lease_seconds)} seconds', limit)).fetchall()
 
-def delete_user_account(user_id):
-    """Delete user account (soft delete)"""
-    conn = get_db_connection()
+        conn.commit()
+    return sorted((dict(email) for email in emails), key=lambda email: email['id'])
+
+@write_retry
+def mark_email_sent(email_id):
+    """Mark an outbox email as delivered"""
+    with get_db_connection() as conn:
+        conn.execute('''
+            UPDATE email_outbox
+            SET status = 'sent', sent_at = CURRENT_TIMESTAMP, last_error = NULL
+            WHERE id = ?
+        ''', (email_id,))
 
-    conn.execute('''
-        UPDATE users
-        SET is_active = 0
-        WHERE id = ?
-    ''', (user_id,))
+        conn.commit()
 
-    conn.commit()
-    conn.close()
-    return True
+@write_retry
+def mark_email_failed(email_id, error, retry_in=None):
+    """Record a failed send: retry after retry_in seconds, or dead-letter when retry_in is None"""
+    with get_db_connection() as conn:
+        if retry_in is None:
+            conn.execute('''
+                UPDATE email_outbox SET status = 'dead', last_error = ? WHERE id = ?
+            ''', (error, email_id))
+        else:
+            conn.execute('''
+                UPDATE email_outbox
+                SET status = 'pending', last_error = ?, next_attempt_at = datetime('now', ?)
+                WHERE id = ?
+            ''', (error, f'+{int(retry_in)} seconds', email_id))
+
+        conn.commit()
+
+def get_outbox_counts():
+    """Count outbox emails by status"""
+    with get_db_connection() as conn:
+        rows = conn.execute('SELECT status, COUNT(*) FROM email_outbox GROUP BY status').fetchall()
+    return {row[0]: row[1] for row in rows}
+
+@write_retry
+def create_user_session(user_id, session_token, lifetime_seconds):
+    """Record a new server-side session that expires after lifetime_seconds of inactivity"""
+    with get_db_connection() as conn:
+        conn.execute('''
+            INSERT INTO user_sessions (user_id, session_token, expires_at, last_seen_at)
+            VALUES (?, ?, datetime('now', ?), CURRENT_TIMESTAMP)
+        ''', (user_id, session_token, f'+{int(lifetime_seconds)} seconds'))
+
+        conn.commit()
+
+def get_session_user_id(session_token):
+    """Return the user id of a live (active, unexpired) session, or None"""
+    with get_db_connection() as conn:
+        row = conn.execute('''
+            SELECT user_id FROM user_sessions
+            WHERE session_token = ? AND is_active = 1 AND expires_at > CURRENT_TIMESTAMP
+        ''', (session_token,)).fetchone()
+    return row[0] if row else None
+
+@write_retry
+def touch_user_sessions(last_seen, lifetime_seconds):
+    """Record last use (unix time) for many sessions at once and slide their expiry"""
+    with get_db_connection() as conn:
+        conn.executemany('''
+            UPDATE user_sessions
+            SET last_seen_at = datetime(?, 'unixepoch'), expires_at = datetime(?, 'unixepoch', ?)
+            WHERE session_token = ? AND is_active = 1
+        ''', [(seen, seen, f'+{int(lifetime_seconds)} seconds', token) for token, seen in last_seen.items()])
+
+        conn.commit()
+
+@write_retry
+def revoke_user_session(session_token):
+    """End one session; the sweeper deletes it later"""
+    with get_db_connection() as conn:
+        conn.execute('''
+            UPDATE user_sessions SET is_active = 0, expires_at = CURRENT_TIMESTAMP
+            WHERE session_token = ?
+        ''', (session_token,))
+
+        conn.commit()
+
+@write_retry
+def revoke_user_sessions(user_id):
+    """End every live session of a user; returns their tokens"""
+    with get_db_connection() as conn:
+        rows = conn.execute('''
+            UPDATE user_sessions SET is_active = 0, expires_at = CURRENT_TIMESTAMP
+            WHERE user_id = ? AND is_active = 1
+            RETURNING session_token
+        ''', (user_id,)).fetchall()
+
+        conn.commit()
+    return [row[0] for row in rows]
+
+@write_retry
+def delete_expired_sessions(limit):
+    """Delete up to limit expired or revoked sessions; returns how many were deleted"""
+    with get_db_connection() as conn:
+        cursor = conn.execute('''
+            DELETE FROM user_sessions WHERE id IN (
+                SELECT id FROM user_sessions WHERE expires_at <= CURRENT_TIMESTAMP LIMIT ?
+            )
+        ''', (limit,))
+
+        conn.commit()
+        return cursor.rowcount
+
+def count_active_session_users(window_seconds):
+    """Count distinct users whose sessions were used in the last window_seconds (any worker)"""
+    with get_db_connection() as conn:
+        row = conn.execute('''
+            SELECT COUNT(DISTINCT user_id) FROM user_sessions
+            WHERE last_seen_at >= datetime('now', ?)
+        ''', (f'-{int(window_seconds)} seconds',)).fetchone()
+    return row[0]
 
 # Initialize database when module is imported
 if __name__ == "__main__":
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Emergency Response App - SQLite Connection Pool
+Thread-safe pool of reusable sqlite3 connections with per-thread reuse,
+health checks and Prometheus metrics for wait time and utilisation, plus
+the retry policy for lock contention between workers.
+"""
+
+import random
+import sqlite3
+import threading
+import time
+from functools import wraps
+from prometheus_client import Counter, Gauge, Histogram
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_POOL_TIMEOUT = 5.0
+DEFAULT_HEALTH_CHECK_INTERVAL = 30.0
+
+pool_wait_seconds = Histogram('db_pool_wait_seconds', 'Time spent waiting to check out a database connection',
+                              ['database'], buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5))
+pool_connections_in_use = Gauge('db_pool_connections_in_use', 'Database connections currently checked out', ['database'],
+                                multiprocess_mode='livesum')
+pool_connections_open = Gauge('db_pool_connections_open', 'Database connections currently open', ['database'],
+                              multiprocess_mode='livesum')
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the pool timeout"""
+
+
+class PooledConnection:
+    """Proxy around a pooled sqlite3 connection.
+
+    Behaves like the underlying connection; ``close()`` (or leaving a
+    ``with`` block) hands the connection back to the pool instead of closing it.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self._released = False
+
+    def __getattr__(self, name):
+        if self._released:
+            raise sqlite3.ProgrammingError('Cannot operate on a connection returned to the pool')
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and not self._released:
+            self._conn.rollback()
+        self.close()
+        return False
+
+    def close(self):
+        """Return the connection to the pool"""
+        if not self._released:
+            self._released = True
+            self._pool.release(self._conn)
+
+
+class _Slot:
+    """Bookkeeping for one physical connection"""
+
+    __slots__ = ('conn', 'last_used', 'owner', 'depth')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.last_used = time.monotonic()
+        self.owner = None
+        self.depth = 0
+
+
+class ConnectionPool:
+    """Bounded pool of sqlite3 connections for a single database file.
+
+    A thread that already holds a connection gets the same one back on
+    nested checkouts, so helpers can call each other without deadlocking
+    the pool or splitting a transaction across connections.
+    """
+
+    def __init__(self, database, connect, max_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_POOL_TIMEOUT,
+                 health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL):
+        self.database = database
+        self._connect = connect
+        # Every connection to ':memory:' is a separate database, so share one
+        self.max_size = 1 if database == ':memory:' else max(1, int(max_size))
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._lock = threading.Condition(threading.Lock())
+        self._idle = []
+        self._slots = {}
+        self._local = threading.local()
+        self._closed = False
+        self._label = database
+        self._wait_total = 0.0
+        self._checkouts = 0
+
+    # ------------------------------------------------------------------
+    # Checkout / release
+    # ------------------------------------------------------------------
+
+    def connection(self):
+        """Check out a connection; use as a context manager or call close()"""
+        slot = getattr(self._local, 'slot', None)
+        if slot is not None:
+            slot.depth += 1
+            return PooledConnection(self, slot.conn)
+
+        started = time.monotonic()
+        slot = self._acquire(started)
+        waited = time.monotonic() - started
+        pool_wait_seconds.labels(database=self._label).observe(waited)
+
+        slot.owner = threading.get_ident()
+        slot.depth = 1
+        self._local.slot = slot
+        with self._lock:
+            self._wait_total += waited
+            self._checkouts += 1
+            pool_connections_in_use.labels(database=self._label).set(self._in_use())
+        return PooledConnection(self, slot.conn)
+
+    def release(self, conn):
+        """Return a connection checked out by the current thread"""
+        slot = self._slots.get(id(conn))
+        if slot is None:
+            conn.close()
+            return
+        slot.depth -= 1
+        if slot.depth > 0:
+            return
+
+        self._local.slot = None
+        slot.owner = None
+        slot.last_used = time.monotonic()
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(slot)
+            return
+
+        with self._lock:
+            if self._closed:
+                self._discard_locked(slot)
+            else:
+                self._idle.append(slot)
+            pool_connections_in_use.labels(database=self._label).set(self._in_use())
+            self._lock.notify()
+
+    def _acquire(self, started):
+        deadline = started + self.timeout
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise PoolTimeout(f'Connection pool for {self.database} is closed')
+                while self._idle:
+                    slot = self._idle.pop()
+                    if self._is_healthy(slot):
+                        return slot
+                    self._discard_locked(slot)
+                if len(self._slots) < self.max_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f'Timed out waiting for a connection to {self.database}')
+                self._lock.wait(remaining)
+
+            # Reserve the slot count before connecting outside the lock
+            placeholder = object()
+            self._slots[id(placeholder)] = placeholder
+
+        try:
+            conn = self._connect()
+            if conn is None:
+                raise sqlite3.OperationalError(f'Unable to open database {self.database}')
+        except Exception:
+            with self._lock:
+                del self._slots[id(placeholder)]
+                self._lock.notify()
+            raise
+
+        slot = _Slot(conn)
+        with self._lock:
+            del self._slots[id(placeholder)]
+            self._slots[id(conn)] = slot
+            pool_connections_open.labels(database=self._label).set(len(self._slots))
+        return slot
+
+    def _is_healthy(self, slot):
+        if time.monotonic() - slot.last_used < self.health_check_interval:
+            return True
+        try:
+            slot.conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, slot):
+        with self._lock:
+            self._discard_locked(slot)
+            self._lock.notify()
+
+    def _discard_locked(self, slot):
+        self._slots.pop(id(slot.conn), None)
+        try:
+            slot.conn.close()
+        except sqlite3.Error:
+            pass
+        pool_connections_open.labels(database=self._label).set(len(self._slots))
+
+    def _in_use(self):
+        return sum(1 for slot in self._slots.values() if isinstance(slot, _Slot) and slot.owner is not None)
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def stats(self):
+        """Return a snapshot of pool utilisation"""
+        with self._lock:
+            return {
+                'database': self.database,
+                'max_size': self.max_size,
+                'open': len(self._slots),
+                'idle': len(self._idle),
+                'in_use': self._in_use(),
+                'checkouts': self._checkouts,
+                'avg_wait_seconds': self._wait_total / self._checkouts if self._checkouts else 0.0,
+            }
+
+    def close(self):
+        """Close idle connections; checked-out ones close when released"""
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                self._discard_locked(self._idle.pop())
+            self._lock.notify_all()
+
+
+# ----------------------------------------------------------------------
+# Lock contention policy
+# ----------------------------------------------------------------------
+
+busy_retries_total = Counter('db_busy_retries_total', 'Database operations retried after a locked/busy error', ['operation'])
+
+def is_busy_error(error):
+    """True if a sqlite3 error means another connection holds the lock"""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+def retry_on_busy(retries=3, base_delay=0.05, max_delay=1.0):
+    """Retry a database operation with jittered exponential backoff on SQLITE_BUSY.
+
+    The connection-level busy timeout handles short waits; this covers the
+    cases it cannot (timeout exhausted, snapshot conflicts in WAL mode).
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            attempt = 0
+            while True:
+                try:
+                    return func(*args, **kwargs)
+                except sqlite3.OperationalError as e:
+                    if attempt >= retries or not is_busy_error(e):
+                        raise
+                    busy_retries_total.labels(operation=func.__name__).inc()
+                    delay = min(max_delay, base_delay * (2 ** attempt))
+                    time.sleep(delay / 2 + random.uniform(0, delay / 2))
+                    attempt += 1
+        return wrapper
+    return decorator
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Emergency Response App - Dispatch Assignment
+Assigns each new report with coordinates to the nearest available fire
+department. Department locations are geocoded once, when they are saved
+(users.department_latitude/longitude). Departments are held in a k-d tree,
+so an assignment costs one tree query and at most one indexed count.
+"""
+
+import os
+import time
+import database
+from cache import TTLCache
+from events import broker
+from nearest import KDTree, to_unit_vector, chord_to_km
+from prometheus_client import Counter, Histogram
+
+# Nearest departments considered per report
+DISPATCH_CANDIDATES = int(os.environ.get('DISPATCH_CANDIDATES', 3))
+# Open (reported/responding) reports a department can hold before it is skipped; 0 = no limit
+DISPATCH_MAX_OPEN_REPORTS = int(os.environ.get('DISPATCH_MAX_OPEN_REPORTS', 0))
+# Time allowed for choosing a department before the open report count is
+# skipped and the report left unassigned for a dispatcher; 0 = no budget
+DISPATCH_BUDGET_MS = float(os.environ.get('DISPATCH_BUDGET_MS', 5.0))
+# Upper bound on staleness for departments edited outside database.py
+DISPATCH_INDEX_TTL = float(os.environ.get('DISPATCH_INDEX_TTL', 300.0))
+
+dispatch_assignments_total = Counter('dispatch_assignments_total', 'Reports auto-assigned on creation', ['outcome'])
+dispatch_assignment_seconds = Histogram('dispatch_assignment_seconds', 'Time to choose a department for a report',
+                                        buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+
+_indexes = TTLCache(maxsize=64, ttl=DISPATCH_INDEX_TTL)
+
+def _build_index():
+    with database.get_db_connection() as conn:
+        departments = [dict(row) for row in conn.execute('''
+            SELECT id, department_name, department_latitude AS latitude, department_longitude AS longitude
+            FROM users
+            WHERE user_type = 'fire_department' AND is_active = 1 AND department_latitude IS NOT NULL
+            ORDER BY id
+        ''').fetchall()]
+    return KDTree([to_unit_vector(d['latitude'], d['longitude']) for d in departments], departments)
+
+def get_department_index():
+    """k-d tree over active, geocoded fire departments, cached per database"""
+    # Make sure department changes published by other workers reach this one
+    broker.start()
+    return _indexes.get_or_set(database.DATABASE_PATH, _build_index)
+
+def _evict_department_index(event):
+    # Citizens registering, editing profiles or having passwords rehashed leave the tree as it is
+    if event.data.get('user_type') == 'fire_department':
+        _indexes.pop(event.data['database'])
+
+broker.listen(['user.changed'], _evict_department_index)
+
+def _open_report_counts(department_ids):
+    with database.get_db_connection() as conn:
+        rows = conn.execute(f'''
+            SELECT assigned_department_id, COUNT(*) FROM emergency_reports
+            WHERE assigned_department_id IN ({', '.join('?' * len(department_ids))})
+              AND status IN ('reported', 'responding')
+            GROUP BY assigned_department_id
+        ''', department_ids).fetchall()
+    return {department_id: count for department_id, count in rows}
+
+def nearest_departments(latitude, longitude, k=DISPATCH_CANDIDATES):
+    """The k departments nearest to a point, closest first, each with its distance_km"""
+    results = get_department_index().nearest(to_unit_vector(latitude, longitude), k)
+    return [dict(department, distance_km=round(chord_to_km(distance), 3)) for distance, department in results]
+
+def assign_department(latitude, longitude):
+    """Id of the nearest available department for a report at this point, or None.
+
+    A department is available while it holds fewer than
+    DISPATCH_MAX_OPEN_REPORTS open reports (when that limit is set). If
+    finding the candidates already took longer than DISPATCH_BUDGET_MS, the
+    count is skipped and the report is left unassigned rather than holding
+    up its creation. Rebuilding the index after a department change is not
+    charged to the budget.
+    """
+    started = time.perf_counter()
+    get_department_index()
+    budget_started = time.perf_counter()
+    candidates = nearest_departments(latitude, longitude)
+    outcome = None
+    if candidates and DISPATCH_MAX_OPEN_REPORTS > 0:
+        if 0 < DISPATCH_BUDGET_MS < (time.perf_counter() - budget_started) * 1000:
+            candidates, outcome = [], 'over_budget'
+        else:
+            counts = _open_report_counts([department['id'] for department in candidates])
+            candidates = [department for department in candidates
+                          if counts.get(department['id'], 0) < DISPATCH_MAX_OPEN_REPORTS]
+    department_id = candidates[0]['id'] if candidates else None
+
+    dispatch_assignment_seconds.observe(time.perf_counter() - started)
+    dispatch_assignments_total.labels(outcome=outcome or ('assigned' if department_id else 'unassigned')).inc()
+    return department_id
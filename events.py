@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Emergency Response App - Event Broker
+Publish/subscribe fan-out used by the Server-Sent Events streams.
+Keeps a bounded replay buffer so reconnecting clients can resume from
+their Last-Event-ID instead of re-fetching everything.
+
+By default events stay inside the process. Set EVENT_BACKEND=sqlite to
+route them through a shared event log so every gunicorn worker delivers
+every event, in the same order and with the same ids.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from prometheus_client import Counter, Gauge
+
+EVENT_HISTORY_SIZE = int(os.environ.get('EVENT_HISTORY_SIZE', 1000))
+SUBSCRIBER_QUEUE_SIZE = int(os.environ.get('SUBSCRIBER_QUEUE_SIZE', 256))
+EVENT_BACKEND = os.environ.get('EVENT_BACKEND', 'memory')
+EVENT_POLL_INTERVAL = float(os.environ.get('EVENT_POLL_INTERVAL', 0.2))
+EVENT_LOG_RETENTION = int(os.environ.get('EVENT_LOG_RETENTION', 10000))
+
+events_published_total = Counter('events_published_total', 'Events published to the broker', ['topic'])
+event_subscribers = Gauge('event_subscribers', 'Open event stream subscriptions', multiprocess_mode='livesum')
+
+
+class Event:
+    """A published event; ``id`` is '<broker epoch>:<sequence>'"""
+
+    __slots__ = ('id', 'seq', 'topic', 'data')
+
+    def __init__(self, epoch, seq, topic, data):
+        self.id = f'{epoch}:{seq}'
+        self.seq = seq
+        self.topic = topic
+        self.data = data
+
+
+class Subscription:
+    """A consumer's bounded queue of events matching its topics and filter"""
+
+    def __init__(self, broker, topics, predicate=None, after=0):
+        self._broker = broker
+        self.topics = frozenset(topics)
+        self.predicate = predicate
+        # Sequence number the client has already seen
+        self.after = after
+        self._queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # Set when events were lost (replay gap or slow consumer); client should resync
+        self.missed = False
+        self.closed = False
+
+    def matches(self, event):
+        return (event.seq > self.after and event.topic in self.topics
+                and (self.predicate is None or self.predicate(event)))
+
+    def _offer(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # Drop rather than block publishers; the consumer will be told to resync
+            self.missed = True
+
+    def get(self, timeout=None):
+        """Return the next event, or None if none arrived within timeout"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._broker._unsubscribe(self)
+            # Wake a consumer blocked in get()
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+class SQLiteEventBackend:
+    """Shared event log in a SQLite table, tailed by every worker's broker.
+
+    A backend provides epoch, poll_interval, append(topic, data),
+    read_after(seq) and read_recent(limit); the last two return
+    (seq, topic, data) tuples in sequence order.
+    """
+
+    def __init__(self, path, poll_interval=EVENT_POLL_INTERVAL, retention=EVENT_LOG_RETENTION):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS event_log (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    topic TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.execute('CREATE TABLE IF NOT EXISTS event_log_info (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            # The epoch changes only if the log is recreated, so ids stay valid across restarts
+            conn.execute("INSERT OR IGNORE INTO event_log_info VALUES ('epoch', ?)",
+                         (format(int(time.time() * 1000), 'x'),))
+            self.epoch = conn.execute("SELECT value FROM event_log_info WHERE name = 'epoch'").fetchone()[0]
+
+    def _connection(self):
+        """Per-thread connection, reopened after a fork"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def append(self, topic, data):
+        with self._connection() as conn:
+            seq = conn.execute('INSERT INTO event_log (topic, data) VALUES (?, ?)',
+                               (topic, json.dumps(data, default=str))).lastrowid
+            if seq % 500 == 0:
+                conn.execute('DELETE FROM event_log WHERE id <= ?', (seq - self.retention,))
+
+    def read_after(self, seq, limit=1000):
+        rows = self._connection().execute(
+            'SELECT id, topic, data FROM event_log WHERE id > ? ORDER BY id LIMIT ?', (seq, limit)).fetchall()
+        return [(row[0], row[1], json.loads(row[2])) for row in rows]
+
+    def read_recent(self, limit):
+        rows = self._connection().execute(
+            'SELECT id, topic, data FROM event_log ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        return [(row[0], row[1], json.loads(row[2])) for row in reversed(rows)]
+
+
+class EventBroker:
+    """Fan-out broker: delivers each published event to every matching subscription.
+
+    backend may also be a function returning one; it is then built on first
+    use (publish, start or subscribe), not when the broker is created.
+    """
+
+    def __init__(self, history_size=EVENT_HISTORY_SIZE, backend=None):
+        self._backend = backend
+        self._backend_lock = threading.Lock()
+        self._epoch = format(int(time.time() * 1000), 'x')
+        self._seq = 0
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._tail_pid = None
+        self._closed = False
+
+    @property
+    def backend(self):
+        if callable(self._backend):
+            with self._backend_lock:
+                if callable(self._backend):
+                    self._backend = self._backend()
+        return self._backend
+
+    @property
+    def shared(self):
+        """True if events reach other processes (a backend is configured, opened or not)"""
+        return self._backend is not None
+
+    @property
+    def epoch(self):
+        return self.backend.epoch if self.backend else self._epoch
+
+    def publish(self, topic, data):
+        """Publish an event to current subscribers and the replay buffer.
+
+        Without a backend the event is delivered immediately and returned.
+        With one it is appended to the shared log and delivered (here and in
+        every other worker) by the log tail, so this returns None.
+        """
+        events_published_total.labels(topic=topic).inc()
+        if self.backend is None:
+            with self._lock:
+                return self._deliver(self._seq + 1, topic, data)
+
+        self._ensure_tail()
+        self.backend.append(topic, data)
+        self._wakeup.set()
+        return None
+
+    def _deliver(self, seq, topic, data):
+        """Record and fan out one event; the caller holds the lock"""
+        event = Event(self.epoch, seq, topic, data)
+        self._seq = seq
+        self._history.append(event)
+        # Offer under the lock so every subscriber sees events in sequence order
+        for subscription in self._subscribers:
+            if subscription.matches(event):
+                subscription._offer(event)
+        for topics, callback in self._listeners:
+            if topic in topics:
+                try:
+                    callback(event)
+                except Exception as e:
+                    print(f"Event listener for {topic} failed: {e}")
+        return event
+
+    def _ensure_tail(self):
+        """Start tailing the backend log in this process (again after a fork)"""
+        if self.backend is None or self._tail_pid == os.getpid():
+            return
+        with self._lock:
+            if self._tail_pid == os.getpid():
+                return
+            self._tail_pid = os.getpid()
+            # Seed the replay buffer so clients can resume against any worker
+            self._history.clear()
+            for seq, topic, data in self.backend.read_recent(self._history.maxlen):
+                self._history.append(Event(self.epoch, seq, topic, data))
+                self._seq = seq
+            threading.Thread(target=self._tail, name='event-log-tail', daemon=True).start()
+
+    def _tail(self):
+        while True:
+            self._wakeup.wait(self.backend.poll_interval)
+            self._wakeup.clear()
+            if self._closed:
+                return
+            try:
+                rows = self.backend.read_after(self._seq)
+            except sqlite3.Error as e:
+                print(f"Event log read failed: {e}")
+                continue
+            with self._lock:
+                for seq, topic, data in rows:
+                    self._deliver(seq, topic, data)
+
+    def listen(self, topics, callback):
+        """Call callback(event) for every event on topics, including other workers' (keep it fast).
+
+        Other workers' events arrive once start() (or any publish/subscribe)
+        has run in this process.
+        """
+        with self._lock:
+            self._listeners.append((frozenset(topics), callback))
+
+    def start(self):
+        """Begin receiving events from other workers in this process; cheap to call repeatedly"""
+        self._ensure_tail()
+
+    def subscribe(self, topics, last_event_id=None, predicate=None):
+        """Open a subscription, replaying buffered events after last_event_id"""
+        self._ensure_tail()
+        subscription = Subscription(self, topics, predicate)
+        with self._lock:
+            if last_event_id:
+                epoch, _, seq = str(last_event_id).partition(':')
+                oldest = self._history[0].seq if self._history else self._seq + 1
+                # With a shared log another worker may be slightly ahead of this one's tail
+                newest = float('inf') if self.backend else self._seq
+                if epoch != self.epoch or not seq.isdigit() or not oldest - 1 <= int(seq) <= newest:
+                    subscription.missed = True
+                else:
+                    subscription.after = int(seq)
+                    for event in self._history:
+                        if subscription.matches(event):
+                            subscription._offer(event)
+            else:
+                subscription.after = self._seq
+            self._subscribers.add(subscription)
+            event_subscribers.set(len(self._subscribers))
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+            event_subscribers.set(len(self._subscribers))
+
+    def close(self):
+        """Stop tailing the backend log and end every open stream (worker shutdown)"""
+        self._closed = True
+        self._wakeup.set()
+        with self._lock:
+            subscriptions = list(self._subscribers)
+        for subscription in subscriptions:
+            subscription.close()
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+def format_sse(event=None, event_type=None, data=None, comment=None):
+    """Serialize one Server-Sent Events frame"""
+    if comment is not None:
+        return f': {comment}\n\n'
+    if event is not None:
+        return f'id: {event.id}\nevent: {event.topic}\ndata: {json.dumps(event.data, default=str)}\n\n'
+    return f'event: {event_type}\ndata: {json.dumps(data, default=str)}\n\n'
+
+
+def stream_events(subscription, heartbeat=15.0, retry_ms=3000):
+    """Yield SSE frames for a subscription until the client disconnects or the broker closes.
+
+    Sends a 'resync' event whenever events were lost, and a comment
+    heartbeat when idle so proxies keep the connection open.
+    """
+    try:
+        yield f'retry: {retry_ms}\n\n'
+        while True:
+            if subscription.missed:
+                subscription.missed = False
+                yield format_sse(event_type='resync', data={})
+            event = subscription.get(timeout=heartbeat)
+            if subscription.closed:
+                # The worker is shutting down; the client reconnects with Last-Event-ID
+                return
+            yield format_sse(event) if event is not None else format_sse(comment='keepalive')
+    finally:
+        subscription.close()
+
+
+def _open_event_log():
+    """The shared event log in EVENT_LOG_PATH, or else the app database in use at the time"""
+    import database
+    return SQLiteEventBackend(os.environ.get('EVENT_LOG_PATH') or database.DATABASE_PATH)
+
+
+def create_broker(backend=EVENT_BACKEND):
+    """Create the broker for the configured EVENT_BACKEND ('memory' or 'sqlite').
+
+    The sqlite log is opened on first use, so importing the app touches no
+    database and a path set later by create_app({'DATABASE': ...}) is used.
+    """
+    if backend == 'memory':
+        return EventBroker()
+    if backend == 'sqlite':
+        return EventBroker(backend=_open_event_log)
+    raise ValueError(f"Unknown EVENT_BACKEND: {backend}")
+
+
+# Process-wide broker used by database.py publishers and the stream endpoints
+broker = create_broker()
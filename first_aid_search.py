@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Emergency Response App - First Aid Search
+An in-memory index over the first aid practices, built once per app: lookup
+by id, category/difficulty filters, and BM25-ranked full-text search over
+titles, descriptions, categories and keywords that tolerates unfinished
+words and small typos.
+"""
+
+import math
+import re
+import unicodedata
+from bisect import bisect_left
+
+# Field weights: a term in the title counts three times one in the description
+SEARCH_FIELDS = (('title', 3.0), ('keywords', 2.0), ('emergency_type', 1.0), ('description', 1.0))
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Query terms that only match as the start of a word, or with a typo, count for less
+PREFIX_WEIGHT = 0.8
+TYPO_WEIGHT = 0.6
+MIN_PREFIX_LENGTH = 3
+MIN_TYPO_LENGTH = 4
+
+STOPWORDS = {'a', 'an', 'and', 'are', 'at', 'be', 'by', 'do', 'for', 'from', 'has', 'have', 'having', 'he',
+             'her', 'his', 'how', 'i', 'in', 'is', 'it', 'me', 'my', 'of', 'on', 'or', 'she', 'so', 'the',
+             'their', 'they', 'this', 'to', 'was', 'what', 'with', 'you', 'your'}
+
+def tokenize(text):
+    """Lowercase, accent-free search terms, without stopwords and plural endings"""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode().lower()
+    terms = []
+    for word in re.findall(r'[a-z0-9]+', text):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+def within_edits(a, b, limit):
+    """Whether a and b are at most limit edits apart, a swap of neighbouring letters counting as one"""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    before, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i]
+        for j in range(1, len(b) + 1):
+            distance = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                distance = min(distance, before[j - 2] + 1)
+            current.append(distance)
+        if min(current) > limit:
+            return False
+        before, previous = previous, current
+    return previous[-1] <= limit
+
+class FirstAidIndex:
+    """Lookup and search over a list of first aid practices"""
+
+    def __init__(self, practices):
+        self.practices = list(practices)
+        self.by_id = {practice['id']: practice for practice in self.practices}
+
+        # Every (category, difficulty) filter, with None for "any", maps to its practices
+        self._groups = {}
+        for practice in self.practices:
+            category, difficulty = practice.get('emergency_type'), practice.get('difficulty')
+            for key in ((None, None), (category, None), (None, difficulty), (category, difficulty)):
+                self._groups.setdefault(key, []).append(practice)
+
+        # Weighted term frequencies and lengths per practice
+        frequencies, lengths = [], []
+        for practice in self.practices:
+            counts = {}
+            for field, weight in SEARCH_FIELDS:
+                value = practice.get(field) or ''
+                for term in tokenize(' '.join(value) if isinstance(value, list) else value):
+                    counts[term] = counts.get(term, 0.0) + weight
+            frequencies.append(counts)
+            lengths.append(sum(counts.values()))
+        average_length = sum(lengths) / len(lengths) if lengths else 0.0
+
+        # term -> {position: BM25 weight}, so scoring a query is a sum of lookups
+        self.postings = {}
+        for position, counts in enumerate(frequencies):
+            for term in counts:
+                self.postings.setdefault(term, {})[position] = 0.0
+        count = len(self.practices)
+        for term, documents in self.postings.items():
+            idf = math.log(1 + (count - len(documents) + 0.5) / (len(documents) + 0.5))
+            for position in documents:
+                frequency = frequencies[position][term]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[position] / average_length)
+                documents[position] = idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        self.vocabulary = sorted(self.postings)
+
+    def get(self, practice_id):
+        """The practice with this id, or None"""
+        return self.by_id.get(practice_id)
+
+    def filter(self, category=None, difficulty=None):
+        """Practices in a category and/or of a difficulty, in their original order"""
+        return self._groups.get((category or None, difficulty or None), [])
+
+    def expand(self, term):
+        """{vocabulary term: weight} for a query term.
+
+        The term itself counts fully, longer words starting with it count
+        PREFIX_WEIGHT, and, only when neither exists, words one edit away
+        (two for long terms) count TYPO_WEIGHT.
+        """
+        expansions = {term: 1.0} if term in self.postings else {}
+        if len(term) >= MIN_PREFIX_LENGTH:
+            start = bisect_left(self.vocabulary, term)
+            for candidate in self.vocabulary[start:]:
+                if not candidate.startswith(term):
+                    break
+                expansions.setdefault(candidate, PREFIX_WEIGHT)
+        if not expansions and len(term) >= MIN_TYPO_LENGTH:
+            limit = 2 if len(term) >= 8 else 1
+            expansions = {candidate: TYPO_WEIGHT for candidate in self.vocabulary
+                          if within_edits(term, candidate, limit)}
+        return expansions
+
+    def search(self, query, limit=10):
+        """[(score, practice)] best first for a free-text query.
+
+        Each query term adds its best-weighted expansion's BM25 weight, so a
+        prefix matching several words does not count several times.
+        """
+        scores = {}
+        for term in dict.fromkeys(tokenize(query)):
+            best = {}
+            for candidate, weight in self.expand(term).items():
+                for position, term_weight in self.postings[candidate].items():
+                    best[position] = max(best.get(position, 0.0), weight * term_weight)
+            for position, score in best.items():
+                scores[position] = scores.get(position, 0.0) + score
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [(score, self.practices[position]) for position, score in ranked]
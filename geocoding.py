@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Emergency Response App - Offline Geocoding
+Turns free-text places such as a department's "Akwa, Douala" into
+coordinates without an external service. It accepts "lat, lng" text, the
+names of known places (fire stations from the facilities registry), and
+Cameroonian towns.
+"""
+
+import re
+import unicodedata
+
+CAMEROON_TOWNS = {
+    'Yaoundé': (3.8480, 11.5021), 'Douala': (4.0511, 9.7679), 'Bamenda': (5.9597, 10.1463),
+    'Garoua': (9.3265, 13.3981), 'Bafoussam': (5.4781, 10.4199), 'Maroua': (10.5913, 14.3153),
+    'Bertoua': (4.5774, 13.6848), 'Ebolowa': (2.9156, 11.1543), 'Ngaoundéré': (7.3167, 13.5833),
+    'Kribi': (2.9373, 9.9073), 'Limbe': (4.0167, 9.2000), 'Buea': (4.1527, 9.2410),
+    'Kumba': (4.6363, 9.4469), 'Nkongsamba': (4.9547, 9.9404), 'Dschang': (5.4500, 10.0500),
+    'Foumban': (5.7269, 10.9006), 'Edéa': (3.8000, 10.1333), 'Kousséri': (12.0769, 15.0306),
+    'Mbalmayo': (3.5167, 11.5000), 'Sangmélima': (2.9333, 11.9833),
+}
+
+# Words that say what a place is rather than where it is
+GENERIC_WORDS = {'fire', 'station', 'department', 'dept', 'brigade', 'headquarters', 'hq', 'main', 'regional',
+                 'district', 'sapeurs', 'pompiers', 'caserne', 'of', 'the', 'de', 'du', 'des', 'la', 'le'}
+
+COORDINATES = re.compile(r'^\s*(-?\d+(?:\.\d+)?)\s*[,; ]\s*(-?\d+(?:\.\d+)?)\s*$')
+
+def place_words(text):
+    """Lowercase, accent-free words of a place name, without generic words"""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode().lower()
+    return set(re.findall(r'[a-z0-9]+', text)) - GENERIC_WORDS
+
+def geocode(text, places=()):
+    """(latitude, longitude) for a place description, or None if it cannot be placed.
+
+    places are extra (name, latitude, longitude) entries tried alongside the
+    towns. The place sharing the most words with text wins, then the one
+    with the fewest words text does not mention, then places over towns; a
+    remaining tie between different coordinates is ambiguous and gives None.
+    """
+    match = COORDINATES.match(text or '')
+    if match:
+        latitude, longitude = float(match.group(1)), float(match.group(2))
+        return (latitude, longitude) if -90 <= latitude <= 90 and -180 <= longitude <= 180 else None
+
+    words = place_words(text)
+    candidates = [(name, latitude, longitude, 1) for name, latitude, longitude in places]
+    candidates += [(town, latitude, longitude, 0) for town, (latitude, longitude) in CAMEROON_TOWNS.items()]
+    best_score, best = None, set()
+    for name, latitude, longitude, known_place in candidates:
+        name_words = place_words(name)
+        shared = len(words & name_words)
+        if not shared:
+            continue
+        score = (shared, -len(name_words - words), known_place)
+        if best_score is None or score > best_score:
+            best_score, best = score, {(latitude, longitude)}
+        elif score == best_score:
+            best.add((latitude, longitude))
+    return best.pop() if len(best) == 1 else None
@@ -0,0 +1,91 @@
+"""
+Emergency Response App - Gunicorn Configuration
+Run with ``gunicorn -c gunicorn.conf.py`` (serves wsgi:app).
+
+Traffic is I/O bound: chat and dashboard polling, long-lived Server-Sent
+Events streams, SQLite reads and queued email. Threaded workers keep a
+thread per open stream without a process per connection, and the app is
+preloaded so migrations run once in the master before workers fork.
+
+Prometheus metrics are kept in PROMETHEUS_MULTIPROC_DIR (one mmap file per
+worker) so /metrics reports the sum over every worker, not whichever one
+answered the scrape.
+"""
+
+import glob
+import os
+import signal
+import sys
+import tempfile
+import threading
+
+# Must be set, and the directory emptied, before the preloaded app imports
+# prometheus_client; files left by a previous run would be summed in
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'emergency-app-metrics'))
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+for stale in glob.glob(os.path.join(os.environ['PROMETHEUS_MULTIPROC_DIR'], '*.db')):
+    os.unlink(stale)
+
+from prometheus_client import multiprocess  # noqa: E402
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:3000')
+
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', min(2 * (os.cpu_count() or 1) + 1, 8)))
+if workers > 1:
+    # Event streams must see events published by the other workers
+    os.environ.setdefault('EVENT_BACKEND', 'sqlite')
+# Each open SSE stream holds a thread, so allow many per worker
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+# Connections waiting for a thread beyond this are refused instead of queueing forever
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# Behind nginx: keep upstream connections open briefly between polls
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# With gthread this is the worker heartbeat, not a request limit, so SSE streams are unaffected
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+# Recycle workers now and then (staggered) to bound slow memory growth
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 500))
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+# Heartbeat files in memory: a disk-backed /tmp can stall workers in containers
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+forwarded_allow_ips = os.environ.get('FORWARDED_ALLOW_IPS', '127.0.0.1')
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+
+
+def pre_fork(server, worker):
+    """Close the master's database connections so no SQLite handle crosses a fork"""
+    if 'database' in sys.modules:
+        sys.modules['database'].close_pools()
+
+
+def post_worker_init(worker):
+    """Start delivering the email outbox, and end event streams as soon as a
+    graceful stop begins so they do not hold up the drain"""
+    from mailer import start_mailer
+    start_mailer()
+
+    handle_exit = worker.handle_exit
+
+    def drain(sig, frame):
+        handle_exit(sig, frame)
+        from app import shutdown
+        threading.Thread(target=shutdown, name='drain', daemon=True).start()
+
+    signal.signal(signal.SIGTERM, drain)
+
+
+def worker_exit(server, worker):
+    """Finish the drain (mailer batch, session flush) once in-flight requests are done"""
+    from app import shutdown
+    shutdown(timeout=graceful_timeout / 2)
+
+
+def child_exit(server, worker):
+    """Drop a dead worker's live gauges (counters and histograms keep its totals)"""
+    multiprocess.mark_process_dead(worker.pid)
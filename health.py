@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Emergency Response App - System Health Score
+The health score is recomputed on a background timer from inputs every
+worker shares (trigger-maintained report counters and the session-based
+active user count), so reading it is O(1) and no request pays for it.
+"""
+
+import os
+import threading
+from prometheus_client import Gauge
+import database
+from sessions import sessions
+
+HEALTH_REFRESH_INTERVAL = float(os.environ.get('HEALTH_REFRESH_INTERVAL', 15.0))
+HEALTH_BASE_SCORE = 95
+
+system_health_gauge = Gauge('system_health_score', 'System health score (0-100)', multiprocess_mode='livemax')
+
+
+def compute_health_score(open_emergencies, active_users):
+    """Score 0-100: open emergencies cost up to 30 points, user load up to 10"""
+    emergency_impact = min(30, open_emergencies * 2)
+    user_load_impact = min(10, active_users * 0.5)
+    return max(0, HEALTH_BASE_SCORE - emergency_impact - user_load_impact)
+
+
+class HealthMonitor:
+    """Keeps the latest health score and its inputs, refreshed in the background"""
+
+    def __init__(self, interval=HEALTH_REFRESH_INTERVAL):
+        self.interval = interval
+        self.score = 100
+        self.open_emergencies = 0
+        self.total_reports = 0
+        self._stopping = threading.Event()
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Recompute the score from the shared counters; returns it"""
+        counters = database.get_stat_counters()
+        self.open_emergencies = (counters.get('reports.status.reported', 0) +
+                                 counters.get('reports.status.responding', 0))
+        self.total_reports = counters.get('reports.total', 0)
+        self.score = compute_health_score(self.open_emergencies, sessions.active_users)
+        system_health_gauge.set(self.score)
+        return self.score
+
+    def snapshot(self):
+        """Latest score and inputs, without touching the database"""
+        self.start()
+        return {
+            'system_health_score': self.score,
+            'open_emergencies': self.open_emergencies,
+            'total_emergency_reports': self.total_reports,
+            'active_users': sessions.active_users,
+        }
+
+    def start(self):
+        """Start the refresh thread in this process (again after a fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            sessions.start()
+            threading.Thread(target=self._run, name='health-monitor', daemon=True).start()
+
+    def stop(self):
+        self._stopping.set()
+        with self._lock:
+            self._pid = None
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Health refresh failed: {e}")
+            if self._stopping.wait(self.interval):
+                return
+
+
+health = HealthMonitor()
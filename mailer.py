@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Emergency Response App - Email Outbox Worker
+Emails are queued in the email_outbox table and delivered by a small pool
+of background workers, each reusing one authenticated SMTP session, so
+HTTP requests never wait on the mail server. Failed sends are retried
+with exponential backoff and dead-lettered once they are hopeless.
+
+Run ``python mailer.py`` to deliver from a dedicated process instead of
+the web workers (set MAILER_ENABLED=0 for the web workers then).
+"""
+
+import os
+import smtplib
+import threading
+import time
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from prometheus_client import Counter, Histogram
+import database
+
+# Email configuration
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 587))
+EMAIL_USER = os.environ.get('EMAIL_USER', 'your-email@gmail.com')  # Replace with your email
+EMAIL_PASSWORD = os.environ.get('EMAIL_PASSWORD', 'your-app-password')  # Replace with your app password
+EMAIL_FROM = os.environ.get('EMAIL_FROM', 'Emergency Response App <your-email@gmail.com>')
+EMAIL_STARTTLS = os.environ.get('EMAIL_STARTTLS', '1') == '1'
+SMTP_TIMEOUT = float(os.environ.get('SMTP_TIMEOUT', 10.0))
+# Sessions idle longer than this are checked with NOOP before reuse
+SMTP_IDLE_CHECK = float(os.environ.get('SMTP_IDLE_CHECK', 30.0))
+
+MAILER_ENABLED = os.environ.get('MAILER_ENABLED', '1') == '1'
+MAILER_WORKERS = int(os.environ.get('MAILER_WORKERS', 2))
+MAILER_BATCH_SIZE = int(os.environ.get('MAILER_BATCH_SIZE', 20))
+MAILER_POLL_INTERVAL = float(os.environ.get('MAILER_POLL_INTERVAL', 5.0))
+MAILER_MAX_ATTEMPTS = int(os.environ.get('MAILER_MAX_ATTEMPTS', 6))
+MAILER_BASE_DELAY = float(os.environ.get('MAILER_BASE_DELAY', 30.0))
+MAILER_MAX_DELAY = float(os.environ.get('MAILER_MAX_DELAY', 3600.0))
+# A 'sending' email whose worker has not finished within this is claimed again
+MAILER_LEASE_SECONDS = int(os.environ.get('MAILER_LEASE_SECONDS', 300))
+
+emails_sent_total = Counter('emails_sent_total', 'Emails delivered to the SMTP server')
+email_failures_total = Counter('email_failures_total', 'Failed email send attempts', ['kind'])
+emails_dead_lettered_total = Counter('emails_dead_lettered_total', 'Emails given up on after failing')
+email_send_seconds = Histogram('email_send_seconds', 'Time to hand one email to the SMTP server')
+
+
+def build_message(to_email, subject, body_text, body_html=None):
+    """Build a plain text (and optionally HTML) MIME message"""
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = EMAIL_FROM
+    msg['To'] = to_email
+    msg.attach(MIMEText(body_text, 'plain'))
+    if body_html:
+        msg.attach(MIMEText(body_html, 'html'))
+    return msg
+
+
+def connect_smtp():
+    """Open an authenticated SMTP session with the configured server"""
+    server = smtplib.SMTP(EMAIL_HOST, EMAIL_PORT, timeout=SMTP_TIMEOUT)
+    if EMAIL_STARTTLS:
+        server.starttls()
+    if EMAIL_USER and EMAIL_PASSWORD:
+        server.login(EMAIL_USER, EMAIL_PASSWORD)
+    return server
+
+
+def is_permanent_failure(error):
+    """True for errors a retry cannot fix (rejected recipient, 5xx reply)"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        # Bad credentials are a configuration problem; keep the email for later
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 500 <= error.smtp_code < 600
+    return False
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt, doubling from MAILER_BASE_DELAY"""
+    return min(MAILER_BASE_DELAY * 2 ** (attempts - 1), MAILER_MAX_DELAY)
+
+
+class SMTPSession:
+    """One reusable SMTP connection, reopened when the server drops it"""
+
+    def __init__(self, connect=connect_smtp):
+        self._connect = connect
+        self._server = None
+        self._last_used = 0.0
+
+    def _ensure_connected(self):
+        if self._server is not None and time.monotonic() - self._last_used > SMTP_IDLE_CHECK:
+            try:
+                if self._server.noop()[0] != 250:
+                    self.close()
+            except OSError:  # includes SMTPException
+                self.close()
+        if self._server is None:
+            self._server = self._connect()
+
+    def send(self, msg):
+        self._ensure_connected()
+        try:
+            self._server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # The server timed out our idle session; reconnect once and resend
+            self.close()
+            self._ensure_connected()
+            self._server.send_message(msg)
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except OSError:
+                pass
+            self._server = None
+
+
+class Mailer:
+    """Pool of outbox worker threads"""
+
+    def __init__(self, workers=MAILER_WORKERS, batch_size=MAILER_BATCH_SIZE,
+                 poll_interval=MAILER_POLL_INTERVAL, connect=connect_smtp):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.connect = connect
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the worker threads in this process (again after a fork)"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._threads = [threading.Thread(target=self._run, name=f'mailer-{i}', daemon=True)
+                             for i in range(self.workers)]
+            for thread in self._threads:
+                thread.start()
+
+    def wake(self):
+        """Check the outbox now instead of at the next poll"""
+        self._wakeup.set()
+
+    def stop(self, timeout=10.0):
+        """Stop the workers after their current batch"""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        with self._lock:
+            self._threads = []
+            self._pid = None
+
+    def _run(self):
+        session = SMTPSession(self.connect)
+        try:
+            while not self._stopping.is_set():
+                try:
+                    sent = self.process_batch(session)
+                except Exception as e:
+                    print(f"Mailer batch failed: {e}")
+                    sent = 0
+                if not sent:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+        finally:
+            session.close()
+
+    def process_batch(self, session):
+        """Claim and send one batch over session; returns how many were claimed"""
+        emails = database.claim_outbox_emails(self.batch_size, MAILER_LEASE_SECONDS)
+        for email in emails:
+            self._deliver(session, email)
+        return len(emails)
+
+    def _deliver(self, session, email):
+        msg = build_message(email['to_email'], email['subject'], email['body_text'], email['body_html'])
+        try:
+            with email_send_seconds.time():
+                session.send(msg)
+        except Exception as e:
+            permanent = is_permanent_failure(e)
+            email_failures_total.labels(kind='permanent' if permanent else 'transient').inc()
+            if not permanent:
+                # Connection-level trouble: start the next email on a fresh session
+                session.close()
+            if permanent or email['attempts'] >= MAILER_MAX_ATTEMPTS:
+                emails_dead_lettered_total.inc()
+                database.mark_email_failed(email['id'], str(e))
+                print(f"Email {email['id']} to {email['to_email']} dead-lettered: {e}")
+            else:
+                database.mark_email_failed(email['id'], str(e), retry_in=retry_delay(email['attempts']))
+            return
+        emails_sent_total.inc()
+        database.mark_email_sent(email['id'])
+
+
+mailer = Mailer()
+
+
+def start_mailer():
+    """Deliver from this process, unless MAILER_ENABLED=0; returns whether it does.
+
+    Called when a worker starts, so emails left pending, waiting for a
+    retry or with an expired lease are delivered without waiting for the
+    next queue_email.
+    """
+    if MAILER_ENABLED:
+        mailer.start()
+    return MAILER_ENABLED
+
+
+def queue_email(to_email, subject, message, html_message=None):
+    """Queue an email for background delivery; returns the outbox id"""
+    email_id = database.enqueue_email(to_email, subject, message, html_message)
+    if start_mailer():
+        mailer.wake()
+    return email_id
+
+
+if __name__ == '__main__':
+    mailer.start()
+    print(f"Mailer running with {mailer.workers} workers against {EMAIL_HOST}:{EMAIL_PORT}")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        mailer.stop()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Emergency Response App - Map Data Service
+Reports, hospitals and fire stations inside a map viewport, read through the
+R*Tree indexes of migration 11. Below MAP_CLUSTER_MAX_ZOOM reports are
+grouped into grid clusters by SQLite, so a response stays small at any
+table size. Results are cached per viewport and data revision.
+"""
+
+import math
+import os
+import zlib
+import database
+from cache import TTLCache
+
+# At this zoom and above every report is sent as a point
+MAP_CLUSTER_MAX_ZOOM = int(os.environ.get('MAP_CLUSTER_MAX_ZOOM', 13))
+# Cluster cell size on screen, in pixels
+MAP_CLUSTER_RADIUS = int(os.environ.get('MAP_CLUSTER_RADIUS', 60))
+MAP_POINT_LIMIT = int(os.environ.get('MAP_POINT_LIMIT', 1000))
+MAP_DEFAULT_ZOOM = 6
+MAP_MAX_ZOOM = 22
+
+MAP_CACHE_TTL = float(os.environ.get('MAP_CACHE_TTL', 60.0))
+MAP_CACHE_SIZE = int(os.environ.get('MAP_CACHE_SIZE', 1024))
+
+WORLD = (-90.0, -180.0, 90.0, 180.0)
+SEVERITIES = ('low', 'medium', 'high', 'critical')  # severity_rank 1..4
+
+_map_cache = TTLCache(maxsize=MAP_CACHE_SIZE, ttl=MAP_CACHE_TTL)
+
+def degrees_per_pixel(zoom):
+    """Degrees of longitude per pixel on 256px web map tiles"""
+    return 360.0 / (256 * 2 ** zoom)
+
+def parse_viewport(bbox=None, zoom=None):
+    """Parse ?bbox=south,west,north,east and ?zoom; returns (bbox, zoom) or raises ValueError.
+
+    The bbox is clamped to the world and grown to whole tiles at this zoom,
+    so nearby viewports share cache entries and ETags.
+    """
+    zoom = MAP_DEFAULT_ZOOM if zoom in (None, '') else int(zoom)
+    zoom = min(max(zoom, 0), MAP_MAX_ZOOM)
+    if not bbox:
+        return WORLD, zoom
+
+    parts = [float(part) for part in bbox.split(',')]
+    if len(parts) != 4 or not all(math.isfinite(part) for part in parts):
+        raise ValueError('bbox must be south,west,north,east')
+    south, west, north, east = parts
+    if south > north or west > east:
+        raise ValueError('bbox must be south,west,north,east')
+
+    tile = 256 * degrees_per_pixel(zoom)
+    return (max(math.floor(south / tile) * tile, -90.0), max(math.floor(west / tile) * tile, -180.0),
+            min(math.ceil(north / tile) * tile, 90.0), min(math.ceil(east / tile) * tile, 180.0)), zoom
+
+def _map_version(counters):
+    return counters.get('reports.revision', 0), counters.get('facilities.revision', 0)
+
+def map_etag(counters, bbox, zoom):
+    """ETag for a viewport: changes whenever any report or facility changes"""
+    reports_revision, facilities_revision = _map_version(counters)
+    return f"map-{reports_revision}-{facilities_revision}-{zoom}-{zlib.crc32(repr(bbox).encode()):x}"
+
+def _report_point(report):
+    return {
+        'id': report['id'],
+        'location': report['location'],
+        'description': report['description'],
+        'severity': report['severity'],
+        'status': report['status'],
+        'coordinates': [report['latitude'], report['longitude']],
+        'reported_at': report['reported_at'],
+    }
+
+def _build_map_features(bbox, zoom):
+    clusters = []
+    if zoom >= MAP_CLUSTER_MAX_ZOOM:
+        reports = database.get_map_reports(bbox, limit=MAP_POINT_LIMIT)
+    else:
+        cells = database.get_map_report_clusters(bbox, MAP_CLUSTER_RADIUS * degrees_per_pixel(zoom))
+        single_ids = [cell['report_id'] for cell in cells if cell['count'] == 1][:MAP_POINT_LIMIT]
+        reports = database.get_map_reports(report_ids=single_ids, limit=MAP_POINT_LIMIT) if single_ids else []
+        clusters = [{
+            'coordinates': [round(cell['latitude'], 6), round(cell['longitude'], 6)],
+            'count': cell['count'],
+            'severity': SEVERITIES[cell['severity_rank'] - 1],
+        } for cell in cells if cell['count'] > 1]
+
+    hospitals, fire_stations = [], []
+    for facility in database.get_map_facilities(bbox):
+        feature = {
+            'id': facility['id'],
+            'name': facility['name'],
+            'coordinates': [facility['latitude'], facility['longitude']],
+            'type': facility['facility_type'],
+            'phone': facility['phone'],
+        }
+        if facility['kind'] == 'hospital':
+            feature['emergency'] = bool(facility['emergency'])
+            hospitals.append(feature)
+        else:
+            feature['vehicles'] = facility['vehicles']
+            fire_stations.append(feature)
+
+    return {
+        'emergencies': [_report_point(report) for report in reports],
+        'clusters': clusters,
+        'hospitals': hospitals,
+        'fire_stations': fire_stations,
+        'bbox': list(bbox),
+        'zoom': zoom,
+    }
+
+def get_map_features(bbox, zoom, counters=None):
+    """Map data for a parsed viewport (see parse_viewport), cached per data revision.
+
+    Pass the stat counters the ETag was computed from, so the cache entry is
+    keyed by the same revision as the ETag.
+    """
+    counters = database.get_stat_counters() if counters is None else counters
+    key = (database.DATABASE_PATH, _map_version(counters), bbox, zoom)
+    return _map_cache.get_or_set(key, lambda: _build_map_features(bbox, zoom))
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Emergency Response App - Schema Migrations
+Versioned, ordered schema changes applied on top of the base tables created
+by init_database. Applied versions are recorded in the schema_migrations table.
+"""
+
+import sqlite3
+from geocoding import geocode
+
+def _add_report_location_accuracy(conn):
+    """Add emergency_reports.location_accuracy for databases created before it existed"""
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(emergency_reports)')]
+    if 'location_accuracy' not in columns:
+        conn.execute('ALTER TABLE emergency_reports ADD COLUMN location_accuracy REAL')
+
+def _counter_upsert(name_expr, delta):
+    """SQL that adds delta to a stat_counters row (used inside triggers)"""
+    return (f"INSERT INTO stat_counters (name, value) VALUES ({name_expr}, {delta}) "
+            f"ON CONFLICT (name) DO UPDATE SET value = value + ({delta});")
+
+def _create_stat_counters(conn):
+    """Counters maintained by triggers so statistics never scan the tables"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stat_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    def report_counters(row, delta):
+        return ''.join([
+            _counter_upsert("'reports.total'", delta),
+            _counter_upsert(f"'reports.status.' || {row}.status", delta),
+            _counter_upsert(f"'reports.severity.' || {row}.severity", delta),
+        ])
+
+    message_live = _counter_upsert("'messages.live'", '{delta}')
+    department = _counter_upsert("'users.fire_department'", '{delta}')
+    triggers = {
+        'trg_reports_counters_insert': f'''
+            AFTER INSERT ON emergency_reports BEGIN {report_counters('NEW', 1)} END''',
+        'trg_reports_counters_delete': f'''
+            AFTER DELETE ON emergency_reports BEGIN {report_counters('OLD', -1)} END''',
+        'trg_reports_counters_update': f'''
+            AFTER UPDATE OF status, severity ON emergency_reports
+            WHEN OLD.status IS NOT NEW.status OR OLD.severity IS NOT NEW.severity
+            BEGIN {report_counters('OLD', -1)} {report_counters('NEW', 1)} END''',
+        'trg_messages_counters_insert': f'''
+            AFTER INSERT ON messages WHEN NOT NEW.is_deleted
+            BEGIN {message_live.format(delta=1)} END''',
+        'trg_messages_counters_delete': f'''
+            AFTER DELETE ON messages WHEN NOT OLD.is_deleted
+            BEGIN {message_live.format(delta=-1)} END''',
+        'trg_messages_counters_update': f'''
+            AFTER UPDATE OF is_deleted ON messages WHEN OLD.is_deleted IS NOT NEW.is_deleted
+            BEGIN {message_live.format(delta="CASE WHEN NEW.is_deleted THEN -1 ELSE 1 END")} END''',
+        'trg_users_counters_insert': f'''
+            AFTER INSERT ON users WHEN NEW.user_type = 'fire_department' AND NEW.is_active
+            BEGIN {department.format(delta=1)} END''',
+        'trg_users_counters_delete': f'''
+            AFTER DELETE ON users WHEN OLD.user_type = 'fire_department' AND OLD.is_active
+            BEGIN {department.format(delta=-1)} END''',
+        'trg_users_counters_update': f'''
+            AFTER UPDATE OF is_active, user_type ON users
+            WHEN (OLD.user_type = 'fire_department' AND OLD.is_active) IS NOT
+                 (NEW.user_type = 'fire_department' AND NEW.is_active)
+            BEGIN {department.format(delta="CASE WHEN NEW.user_type = 'fire_department' AND NEW.is_active THEN 1 ELSE -1 END")} END''',
+    }
+    for name, body in triggers.items():
+        conn.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+
+    # Backfill from existing rows
+    conn.execute('DELETE FROM stat_counters')
+    conn.execute("INSERT INTO stat_counters SELECT 'reports.total', COUNT(*) FROM emergency_reports")
+    conn.execute("INSERT INTO stat_counters SELECT 'reports.status.' || status, COUNT(*) "
+                 "FROM emergency_reports GROUP BY status")
+    conn.execute("INSERT INTO stat_counters SELECT 'reports.severity.' || severity, COUNT(*) "
+                 "FROM emergency_reports GROUP BY severity")
+    conn.execute("INSERT INTO stat_counters SELECT 'messages.live', COUNT(*) FROM messages WHERE NOT is_deleted")
+    conn.execute("INSERT INTO stat_counters SELECT 'users.fire_department', COUNT(*) FROM users "
+                 "WHERE user_type = 'fire_department' AND is_active")
+
+def _add_report_revisions(conn):
+    """Stamp every report insert/update with a global, monotonically increasing revision.
+
+    Pollers ask for "revision > n" instead of comparing second-resolution
+    updated_at timestamps, so no change is skipped or delivered twice.
+    """
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(emergency_reports)')]
+    if 'revision' not in columns:
+        conn.execute('ALTER TABLE emergency_reports ADD COLUMN revision INTEGER NOT NULL DEFAULT 0')
+
+    # Backfill in change order, then continue the sequence from the last one
+    conn.execute('''
+        UPDATE emergency_reports SET revision = ordered.rn
+        FROM (SELECT id, ROW_NUMBER() OVER (ORDER BY updated_at, id) AS rn FROM emergency_reports) AS ordered
+        WHERE ordered.id = emergency_reports.id
+    ''')
+    conn.execute("INSERT OR REPLACE INTO stat_counters SELECT 'reports.revision', COALESCE(MAX(revision), 0) "
+                 "FROM emergency_reports")
+
+    bump = (_counter_upsert("'reports.revision'", 1) +
+            "UPDATE emergency_reports SET revision = "
+            "(SELECT value FROM stat_counters WHERE name = 'reports.revision') WHERE id = NEW.id;")
+    conn.execute(f'CREATE TRIGGER IF NOT EXISTS trg_reports_revision_insert '
+                 f'AFTER INSERT ON emergency_reports BEGIN {bump} END')
+    # The WHEN clause keeps the trigger's own revision update from re-firing it
+    conn.execute(f'CREATE TRIGGER IF NOT EXISTS trg_reports_revision_update '
+                 f'AFTER UPDATE ON emergency_reports WHEN NEW.revision IS OLD.revision BEGIN {bump} END')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_reports_revision ON emergency_reports (revision)')
+
+def _add_session_tracking(conn):
+    """Track when each user_sessions row was last used; index expiry for the sweeper.
+
+    Token lookups already use the UNIQUE index on session_token.
+    """
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(user_sessions)')]
+    if 'last_seen_at' not in columns:
+        conn.execute('ALTER TABLE user_sessions ADD COLUMN last_seen_at TIMESTAMP')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_sessions_expires_at ON user_sessions (expires_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_sessions_user ON user_sessions (user_id, is_active)')
+
+# Hospitals and fire stations formerly hard-coded in /api/map-data
+SEED_FACILITIES = [
+    ('hospital', 'Yaoundé Central Hospital', 'General Hospital', 3.8634, 11.5167, '119', 1, None),
+    ('hospital', 'Douala General Hospital', 'General Hospital', 4.0435, 9.7043, '119', 1, None),
+    ('hospital', 'Bamenda Regional Hospital', 'Regional Hospital', 5.9597, 10.1463, '119', 1, None),
+    ('hospital', 'Garoua Regional Hospital', 'Regional Hospital', 9.3265, 13.3981, '119', 1, None),
+    ('fire_station', 'Yaoundé Fire Station', 'Main Station', 3.8480, 11.5021, '118', 0, 5),
+    ('fire_station', 'Douala Fire Station', 'Port Station', 4.0511, 9.7679, '118', 0, 8),
+    ('fire_station', 'Bamenda Fire Station', 'Regional Station', 5.9631, 10.1591, '118', 0, 3),
+]
+
+def _create_geo_index(conn):
+    """Facilities table plus R*Tree indexes for viewport (bounding box) queries.
+
+    report_locations holds only active reports (reported/responding) that have
+    coordinates, with the severity rank as an auxiliary column so clusters are
+    computed from the index alone. Triggers keep both trees in sync.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS facilities (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL CHECK (kind IN ('hospital', 'fire_station')),
+            name TEXT NOT NULL,
+            facility_type TEXT,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            phone TEXT,
+            emergency BOOLEAN DEFAULT 0,
+            vehicles INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE VIRTUAL TABLE IF NOT EXISTS report_locations '
+                 'USING rtree(id, min_lat, max_lat, min_lng, max_lng, +severity_rank)')
+    conn.execute('CREATE VIRTUAL TABLE IF NOT EXISTS facility_locations '
+                 'USING rtree(id, min_lat, max_lat, min_lng, max_lng)')
+
+    severity_rank = ("CASE {row}.severity WHEN 'low' THEN 1 WHEN 'medium' THEN 2 "
+                     "WHEN 'high' THEN 3 ELSE 4 END")
+    index_report = ("INSERT INTO report_locations SELECT NEW.id, NEW.latitude, NEW.latitude, "
+                    f"NEW.longitude, NEW.longitude, {severity_rank.format(row='NEW')} "
+                    "WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL "
+                    "AND NEW.status IN ('reported', 'responding');")
+    index_facility = ("INSERT INTO facility_locations VALUES "
+                      "(NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);")
+    facility_changed = _counter_upsert("'facilities.revision'", 1)
+    triggers = {
+        'trg_reports_geo_insert': f'AFTER INSERT ON emergency_reports BEGIN {index_report} END',
+        'trg_reports_geo_update': f'''
+            AFTER UPDATE OF status, severity, latitude, longitude ON emergency_reports
+            BEGIN DELETE FROM report_locations WHERE id = OLD.id; {index_report} END''',
+        'trg_reports_geo_delete': '''
+            AFTER DELETE ON emergency_reports BEGIN DELETE FROM report_locations WHERE id = OLD.id; END''',
+        'trg_facilities_geo_insert': f'AFTER INSERT ON facilities BEGIN {index_facility} {facility_changed} END',
+        'trg_facilities_geo_update': f'''
+            AFTER UPDATE ON facilities
+            BEGIN DELETE FROM facility_locations WHERE id = OLD.id; {index_facility} {facility_changed} END''',
+        'trg_facilities_geo_delete': f'''
+            AFTER DELETE ON facilities
+            BEGIN DELETE FROM facility_locations WHERE id = OLD.id; {facility_changed} END''',
+    }
+    for name, body in triggers.items():
+        conn.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+
+    # Backfill from existing rows
+    conn.execute('DELETE FROM report_locations')
+    conn.execute(f'''
+        INSERT INTO report_locations
+        SELECT id, latitude, latitude, longitude, longitude, {severity_rank.format(row='emergency_reports')}
+        FROM emergency_reports
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND status IN ('reported', 'responding')
+    ''')
+    if not conn.execute('SELECT 1 FROM facilities LIMIT 1').fetchone():
+        conn.executemany('INSERT INTO facilities (kind, name, facility_type, latitude, longitude, phone, '
+                         'emergency, vehicles) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', SEED_FACILITIES)
+
+# Hospitals and fire stations shown on the map page, keyed by the page's ids
+REGISTRY_FACILITIES = [
+    # (external_ref, kind, name, facility_type,
+    #  latitude, longitude, phone, emergency, vehicles, city, region)
+    ('h001', 'hospital', 'Yaoundé Central Hospital (Hôpital Central)', 'Public General Hospital',
+     3.8634, 11.5167, '+237222234567', 1, None, 'Yaoundé', 'Centre'),
+    ('h002', 'hospital', 'Yaoundé University Teaching Hospital (CHU)', 'Public Teaching Hospital',
+     3.848, 11.5021, '+237222234568', 1, None, 'Yaoundé', 'Centre'),
+    ('h003', 'hospital', 'Yaoundé Gyneco-Obstetric Hospital', 'Specialized Hospital',
+     3.8691, 11.5174, '+237222234569', 1, None, 'Yaoundé', 'Centre'),
+    ('h004', 'hospital', 'Clinique Pasteur Yaoundé', 'Private Clinic',
+     3.858, 11.512, '+237222234570', 1, None, 'Yaoundé', 'Centre'),
+    ('h005', 'hospital', 'Polyclinique Bonanjo', 'Private Polyclinic',
+     3.872, 11.52, '+237222234571', 1, None, 'Yaoundé', 'Centre'),
+    ('h006', 'hospital', 'Douala General Hospital (Hôpital Général)', 'Public General Hospital',
+     4.0435, 9.7043, '+237233345678', 1, None, 'Douala', 'Littoral'),
+    ('h007', 'hospital', 'Douala Laquintinie Hospital', 'Public Hospital',
+     4.0511, 9.7679, '+237233345679', 1, None, 'Douala', 'Littoral'),
+    ('h008', 'hospital', 'Clinique des Spécialités Douala', 'Private Specialty Clinic',
+     4.038, 9.71, '+237233345680', 1, None, 'Douala', 'Littoral'),
+    ('h009', 'hospital', 'Hôpital Sainte Thérèse Douala', 'Private Catholic Hospital',
+     4.06, 9.75, '+237233345681', 1, None, 'Douala', 'Littoral'),
+    ('h010', 'hospital', 'Bamenda Regional Hospital', 'Public Regional Hospital',
+     5.9597, 10.1463, '+237233456789', 1, None, 'Bamenda', 'North West'),
+    ('h011', 'hospital', 'Bamenda Provincial Hospital', 'Public Provincial Hospital',
+     5.9631, 10.1591, '+237233456790', 1, None, 'Bamenda', 'North West'),
+    ('h012', 'hospital', 'Mezam Polyclinic Bamenda', 'Private Polyclinic',
+     5.955, 10.14, '+237233456791', 1, None, 'Bamenda', 'North West'),
+    ('h013', 'hospital', 'Garoua Regional Hospital', 'Public Regional Hospital',
+     9.3265, 13.3981, '+237222567890', 1, None, 'Garoua', 'North'),
+    ('h014', 'hospital', 'Garoua Provincial Hospital', 'Public Provincial Hospital',
+     9.32, 13.4, '+237222567891', 1, None, 'Garoua', 'North'),
+    ('h015', 'hospital', 'Bafoussam Regional Hospital', 'Public Regional Hospital',
+     5.4781, 10.4199, '+237233678901', 1, None, 'Bafoussam', 'West'),
+    ('h016', 'hospital', 'Maroua Regional Hospital', 'Public Regional Hospital',
+     10.5913, 14.3153, '+237222789012', 1, None, 'Maroua', 'Far North'),
+    ('h017', 'hospital', 'Bertoua Regional Hospital', 'Public Regional Hospital',
+     4.5774, 13.6848, '+237222890123', 1, None, 'Bertoua', 'East'),
+    ('h018', 'hospital', 'Ebolowa Regional Hospital', 'Public Regional Hospital',
+     2.9156, 11.1543, '+237222901234', 1, None, 'Ebolowa', 'South'),
+    ('h019', 'hospital', 'Ngaoundéré Regional Hospital', 'Public Regional Hospital',
+     7.3167, 13.5833, '+237222012345', 1, None, 'Ngaoundéré', 'Adamawa'),
+    ('h020', 'hospital', 'Kribi District Hospital', 'Public District Hospital',
+     2.9373, 9.9073, '+237233123456', 1, None, 'Kribi', 'South'),
+    ('fs001', 'fire_station', 'Yaoundé Central Fire Station', 'Main Headquarters',
+     3.848, 11.5021, '+237118001', 0, 12, 'Yaoundé', 'Centre'),
+    ('fs002', 'fire_station', 'Yaoundé Bastos Fire Station', 'District Station',
+     3.8691, 11.5174, '+237118002', 0, 6, 'Yaoundé', 'Centre'),
+    ('fs003', 'fire_station', 'Yaoundé Mfoundi Fire Station', 'District Station',
+     3.858, 11.512, '+237118003', 0, 4, 'Yaoundé', 'Centre'),
+    ('fs004', 'fire_station', 'Douala Port Fire Station', 'Port Authority Station',
+     4.0511, 9.7679, '+237118004', 0, 15, 'Douala', 'Littoral'),
+    ('fs005', 'fire_station', 'Douala Central Fire Station', 'Main Station',
+     4.0435, 9.7043, '+237118005', 0, 10, 'Douala', 'Littoral'),
+    ('fs006', 'fire_station', 'Douala Akwa Fire Station', 'District Station',
+     4.038, 9.71, '+237118006', 0, 5, 'Douala', 'Littoral'),
+    ('fs007', 'fire_station', 'Douala Bonaberi Fire Station', 'District Station',
+     4.06, 9.75, '+237118007', 0, 4, 'Douala', 'Littoral'),
+    ('fs008', 'fire_station', 'Bamenda Regional Fire Station', 'Regional Station',
+     5.9631, 10.1591, '+237118008', 0, 6, 'Bamenda', 'North West'),
+    ('fs009', 'fire_station', 'Bamenda Commercial Avenue Fire Station', 'District Station',
+     5.9597, 10.1463, '+237118009', 0, 3, 'Bamenda', 'North West'),
+    ('fs010', 'fire_station', 'Garoua Regional Fire Station', 'Regional Station',
+     9.3265, 13.3981, '+237118010', 0, 5, 'Garoua', 'North'),
+    ('fs011', 'fire_station', 'Bafoussam Regional Fire Station', 'Regional Station',
+     5.4781, 10.4199, '+237118011', 0, 4, 'Bafoussam', 'West'),
+    ('fs012', 'fire_station', 'Maroua Regional Fire Station', 'Regional Station',
+     10.5913, 14.3153, '+237118012', 0, 3, 'Maroua', 'Far North'),
+    ('fs013', 'fire_station', 'Bertoua Regional Fire Station', 'Regional Station',
+     4.5774, 13.6848, '+237118013', 0, 3, 'Bertoua', 'East'),
+    ('fs014', 'fire_station', 'Ebolowa Regional Fire Station', 'Regional Station',
+     2.9156, 11.1543, '+237118014', 0, 3, 'Ebolowa', 'South'),
+    ('fs015', 'fire_station', 'Ngaoundéré Regional Fire Station', 'Regional Station',
+     7.3167, 13.5833, '+237118015', 0, 4, 'Ngaoundéré', 'Adamawa'),
+    ('fs016', 'fire_station', 'Kribi Coastal Fire Station', 'Coastal Station',
+     2.9373, 9.9073, '+237118016', 0, 3, 'Kribi', 'South'),
+    ('fs017', 'fire_station', 'Limbe Fire Station', 'District Station',
+     4.0186, 9.2043, '+237118017', 0, 3, 'Limbe', 'South West'),
+    ('fs018', 'fire_station', 'Buea Fire Station', 'District Station',
+     4.156, 9.2904, '+237118018', 0, 2, 'Buea', 'South West'),
+]
+
+def _add_facility_registry(conn):
+    """Make facilities the registry behind nearest-facility search.
+
+    Adds the map page's hospitals and stations (unless their external_ref is
+    already present). They replace the rows seeded by migration 11, which
+    are the same places.
+    """
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(facilities)')]
+    for column, definition in (('external_ref', 'TEXT'), ('city', 'TEXT'), ('region', 'TEXT'),
+                               ('operational', 'BOOLEAN NOT NULL DEFAULT 1')):
+        if column not in columns:
+            conn.execute(f'ALTER TABLE facilities ADD COLUMN {column} {definition}')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_facilities_external_ref ON facilities (external_ref)')
+
+    conn.executemany('DELETE FROM facilities WHERE external_ref IS NULL AND kind = ? AND name = ?',
+                     [(kind, name) for kind, name, *_ in SEED_FACILITIES])
+    conn.executemany('INSERT OR IGNORE INTO facilities (external_ref, kind, name, facility_type, latitude, '
+                     'longitude, phone, emergency, vehicles, city, region) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                     REGISTRY_FACILITIES)
+
+def fire_station_places(conn):
+    """(name, latitude, longitude) of registered fire stations, for geocoding department locations"""
+    return [tuple(row) for row in conn.execute(
+        "SELECT name, latitude, longitude FROM facilities WHERE kind = 'fire_station' AND operational")]
+
+def _add_department_coordinates(conn):
+    """Geocode each department's department_location once, for dispatch assignment"""
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(users)')]
+    for column in ('department_latitude', 'department_longitude'):
+        if column not in columns:
+            conn.execute(f'ALTER TABLE users ADD COLUMN {column} REAL')
+
+    places = fire_station_places(conn)
+    departments = conn.execute("SELECT id, department_location FROM users "
+                               "WHERE user_type = 'fire_department' AND department_location IS NOT NULL").fetchall()
+    for department_id, location in departments:
+        point = geocode(location, places)
+        if point:
+            conn.execute('UPDATE users SET department_latitude = ?, department_longitude = ? WHERE id = ?',
+                         (*point, department_id))
+
+# (version, name, SQL statements or callable taking the connection)
+MIGRATIONS = [
+    (1, 'add_report_location_accuracy', _add_report_location_accuracy),
+    (2, 'index_emergency_report_feeds', [
+        # Unfiltered feed: ORDER BY reported_at DESC LIMIT n
+        'CREATE INDEX IF NOT EXISTS idx_reports_reported_at ON emergency_reports (reported_at)',
+        # Feeds filtered by status or by assigned department, newest first
+        'CREATE INDEX IF NOT EXISTS idx_reports_status_reported_at ON emergency_reports (status, reported_at)',
+        'CREATE INDEX IF NOT EXISTS idx_reports_department_reported_at '
+        'ON emergency_reports (assigned_department_id, reported_at)',
+    ]),
+    (3, 'index_message_feed', [
+        # Chat feed: WHERE is_deleted = 0 ORDER BY created_at DESC LIMIT n
+        'CREATE INDEX IF NOT EXISTS idx_messages_deleted_created_at ON messages (is_deleted, created_at)',
+    ]),
+    (4, 'index_report_severity', [
+        # Feeds filtered by severity (API ?severity=critical), newest first
+        'CREATE INDEX IF NOT EXISTS idx_reports_severity_reported_at ON emergency_reports (severity, reported_at)',
+    ]),
+    (5, 'maintained_stat_counters', _create_stat_counters),
+    (6, 'report_change_revisions', _add_report_revisions),
+    (7, 'email_outbox', [
+        '''
+        CREATE TABLE IF NOT EXISTS email_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            to_email TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            body_text TEXT NOT NULL,
+            body_html TEXT,
+            status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'sending', 'sent', 'dead')),
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            claimed_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent_at TIMESTAMP
+        )
+        ''',
+        # Mailer claims: due pending rows, and 'sending' rows whose worker died
+        'CREATE INDEX IF NOT EXISTS idx_outbox_status_next_attempt ON email_outbox (status, next_attempt_at)',
+        'CREATE INDEX IF NOT EXISTS idx_outbox_status_claimed ON email_outbox (status, claimed_at)',
+    ]),
+    (8, 'index_user_login_email', [
+        # Logins match email case-insensitively; username is already covered by its UNIQUE index
+        'CREATE INDEX IF NOT EXISTS idx_users_email_nocase ON users (email COLLATE NOCASE)',
+    ]),
+    (9, 'server_side_sessions', _add_session_tracking),
+    (10, 'index_session_activity', [
+        # Active user count: DISTINCT user_id WHERE last_seen_at >= now - window, from the index alone
+        'CREATE INDEX IF NOT EXISTS idx_user_sessions_last_seen_user ON user_sessions (last_seen_at, user_id)',
+    ]),
+    (11, 'map_geo_index', _create_geo_index),
+    (12, 'facility_registry', _add_facility_registry),
+    (13, 'department_coordinates', _add_department_coordinates),
+]
+
+def _ensure_migrations_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def get_schema_version(conn):
+    """Return the highest applied migration version (0 if none)"""
+    _ensure_migrations_table(conn)
+    row = conn.execute('SELECT MAX(version) FROM schema_migrations').fetchone()
+    return row[0] or 0
+
+def run_migrations(conn, migrations=None):
+    """Apply pending migrations in order; returns the list of versions applied.
+
+    Each migration runs in its own IMMEDIATE transaction so that concurrent
+    workers starting up serialize on the write lock and skip versions another
+    worker already applied.
+    """
+    migrations = sorted(migrations or MIGRATIONS, key=lambda m: m[0])
+    if conn.in_transaction:
+        conn.commit()
+    _ensure_migrations_table(conn)
+
+    applied = []
+    for version, name, steps in migrations:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            done = conn.execute('SELECT 1 FROM schema_migrations WHERE version = ?', (version,)).fetchone()
+            if done:
+                conn.rollback()
+                continue
+            if callable(steps):
+                steps(conn)
+            else:
+                for statement in steps:
+                    conn.execute(statement)
+            conn.execute('INSERT INTO schema_migrations (version, name) VALUES (?, ?)', (version, name))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        applied.append(version)
+        print(f"Applied migration {version}: {name}")
+    return applied
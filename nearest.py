@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Emergency Response App - Nearest Facility Search
+k-nearest hospitals and fire stations from the facilities registry.
+Facilities are indexed in a k-d tree over points on the unit sphere, where
+straight-line (chord) distance orders points exactly like great-circle
+distance, so a query visits a handful of nodes instead of every facility.
+The index is rebuilt when a facility changes.
+"""
+
+import heapq
+import math
+import os
+import database
+from cache import TTLCache
+from events import broker
+
+EARTH_RADIUS_KM = 6371.0088
+NEAREST_MAX_K = int(os.environ.get('NEAREST_MAX_K', 50))
+# Upper bound on staleness for facilities edited outside database.py
+NEAREST_INDEX_TTL = float(os.environ.get('NEAREST_INDEX_TTL', 300.0))
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometres"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def to_unit_vector(lat, lng):
+    """Point on the unit sphere for a latitude/longitude in degrees"""
+    lat, lng = math.radians(lat), math.radians(lng)
+    return (math.cos(lat) * math.cos(lng), math.cos(lat) * math.sin(lng), math.sin(lat))
+
+def chord_to_km(chord_squared):
+    """Great-circle distance for a squared chord length on the unit sphere"""
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(chord_squared) / 2))
+
+
+class KDTree:
+    """Static k-d tree over 3-d points; ``items[i]`` is returned for ``points[i]``"""
+
+    def __init__(self, points, items):
+        self.points = points
+        self.items = items
+        # Node n splits points[self._index[n]] on self._axis[n]; -1 is an empty subtree
+        self._index, self._axis, self._left, self._right = [], [], [], []
+        self._root = self._build(list(range(len(points))))
+
+    def __len__(self):
+        return len(self.points)
+
+    def _build(self, indexes):
+        if not indexes:
+            return -1
+        # Split on the widest dimension at the median
+        spreads = [max(self.points[i][axis] for i in indexes) - min(self.points[i][axis] for i in indexes)
+                   for axis in range(3)]
+        axis = spreads.index(max(spreads))
+        indexes.sort(key=lambda i: self.points[i][axis])
+        middle = len(indexes) // 2
+
+        node = len(self._index)
+        self._index.append(indexes[middle])
+        self._axis.append(axis)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._left[node] = self._build(indexes[:middle])
+        self._right[node] = self._build(indexes[middle + 1:])
+        return node
+
+    def nearest(self, target, k=1, accept=None):
+        """The k accepted items closest to target as (squared distance, item), closest first"""
+        points, items = self.points, self.items
+        best = []  # max-heap of (-squared distance, -index)
+        stack = [(self._root, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if node < 0 or (len(best) == k and bound > -best[0][0]):
+                continue
+            i = self._index[node]
+            point = points[i]
+            distance = ((point[0] - target[0]) ** 2 + (point[1] - target[1]) ** 2
+                        + (point[2] - target[2]) ** 2)
+            if accept is None or accept(items[i]):
+                # Ties go to the lower index, so results do not depend on visiting order
+                if len(best) < k:
+                    heapq.heappush(best, (-distance, -i))
+                elif (-distance, -i) > best[0]:
+                    heapq.heapreplace(best, (-distance, -i))
+
+            diff = target[self._axis[node]] - point[self._axis[node]]
+            near, far = (self._left[node], self._right[node]) if diff < 0 else (self._right[node], self._left[node])
+            # The far side is at least diff away along this axis; visit it last
+            stack.append((far, diff * diff))
+            stack.append((near, 0.0))
+        return [(-distance, items[-i]) for distance, i in sorted(best, reverse=True)]
+
+
+_indexes = TTLCache(maxsize=64, ttl=NEAREST_INDEX_TTL)
+
+def _build_index(kind):
+    facilities = database.get_facilities(kind)
+    return KDTree([to_unit_vector(f['latitude'], f['longitude']) for f in facilities], facilities)
+
+def get_facility_index(kind=None):
+    """k-d tree over operational facilities of one kind (or all), cached per database"""
+    # Make sure changes published by other workers reach this one
+    broker.start()
+    return _indexes.get_or_set((database.DATABASE_PATH, kind), lambda: _build_index(kind))
+
+def _evict_changed_facilities(event):
+    for kind in (None,) + database.FACILITY_KINDS:
+        _indexes.pop((event.data['database'], kind))
+
+broker.listen(['facility.changed'], _evict_changed_facilities)
+
+def nearest_facilities(latitude, longitude, kind=None, k=5, emergency=None, min_vehicles=None):
+    """The k facilities nearest to a point, closest first, each with its distance_km.
+
+    Optionally only hospitals with (or without) emergency care and stations
+    with at least min_vehicles vehicles. Raises ValueError for bad input.
+    """
+    if kind is not None and kind not in database.FACILITY_KINDS:
+        raise ValueError(f"type must be one of: {', '.join(database.FACILITY_KINDS)}")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError('lat must be between -90 and 90 and lng between -180 and 180')
+    if not 1 <= k <= NEAREST_MAX_K:
+        raise ValueError(f'k must be between 1 and {NEAREST_MAX_K}')
+
+    accept = None
+    if emergency is not None or min_vehicles is not None:
+        def accept(facility):
+            if emergency is not None and bool(facility['emergency']) != emergency:
+                return False
+            return min_vehicles is None or (facility['vehicles'] or 0) >= min_vehicles
+
+    results = get_facility_index(kind).nearest(to_unit_vector(latitude, longitude), k, accept)
+    return [dict(facility, distance_km=round(chord_to_km(distance), 3)) for distance, facility in results]
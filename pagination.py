@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Emergency Response App - Keyset Pagination
+Opaque cursors over (sort value, id) so that every page is a single index
+seek, no matter how deep into the history the client has paged.
+"""
+
+import base64
+import json
+
+DIRECTIONS = ('next', 'prev')
+SORT_VALUE_TYPES = (str, int, float)
+
+def encode_cursor(sort_value, row_id, direction='next'):
+    """Encode a position in an ordered listing as an opaque URL-safe token"""
+    payload = json.dumps([sort_value, row_id, direction], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """Decode a cursor token into (sort_value, row_id, direction); raises ValueError if malformed"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        sort_value, row_id, direction = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid pagination cursor')
+    if direction not in DIRECTIONS or not _is_a(row_id, int) or not _is_a(sort_value, SORT_VALUE_TYPES):
+        raise ValueError('Invalid pagination cursor')
+    return sort_value, row_id, direction
+
+def _is_a(value, types):
+    """isinstance that does not let JSON true/false pass as a number"""
+    return isinstance(value, types) and not isinstance(value, bool)
+
+def keyset_page(fetch, limit, cursor=None, sort_key='created_at'):
+    """Fetch one page of a keyset-paginated listing.
+
+    fetch(keyset, limit) must return rows in traversal order, where keyset is
+    None for the first page or (sort_value, id, direction). For 'prev' pages
+    fetch returns rows walking backwards; they are flipped back here so items
+    are always in listing order.
+
+    Returns {'items', 'next_cursor', 'prev_cursor'}.
+    """
+    keyset = decode_cursor(cursor) if cursor else None
+    direction = keyset[2] if keyset else 'next'
+
+    rows = fetch(keyset, limit + 1)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == 'prev':
+        rows.reverse()
+
+    more_after = has_more if direction == 'next' else keyset is not None
+    more_before = keyset is not None if direction == 'next' else has_more
+
+    next_cursor = prev_cursor = None
+    if rows and more_after:
+        next_cursor = encode_cursor(rows[-1][sort_key], rows[-1]['id'], 'next')
+    if rows and more_before:
+        prev_cursor = encode_cursor(rows[0][sort_key], rows[0]['id'], 'prev')
+    return {'items': rows, 'next_cursor': next_cursor, 'prev_cursor': prev_cursor}
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Emergency Response App - Road Routing
+Driving routes and ETAs over an offline road graph.
+
+The graph is a compact array-backed (CSR) adjacency file, built once from an
+OpenStreetMap extract with ``python routing.py convert``. Conversion also
+precomputes ALT landmarks: travel times to and from a few far-apart nodes,
+which give A* a lower bound on the time left. Queries run bidirectional A*
+on those bounds. Set ROAD_GRAPH_PATH to the converted file to enable
+/api/v1/route.
+"""
+
+import argparse
+import bz2
+import gzip
+import heapq
+import math
+import os
+import struct
+import sys
+import threading
+import xml.etree.ElementTree as ET
+from array import array
+from nearest import haversine_km
+
+ROAD_GRAPH_PATH = os.environ.get('ROAD_GRAPH_PATH', 'roads.graph')
+ROUTING_LANDMARKS = int(os.environ.get('ROUTING_LANDMARKS', 16))
+# Landmarks consulted per query: the ones giving the best bound between its endpoints
+ROUTING_ACTIVE_LANDMARKS = int(os.environ.get('ROUTING_ACTIVE_LANDMARKS', 4))
+# Points further than this from any road are not routed
+ROUTING_SNAP_KM = float(os.environ.get('ROUTING_SNAP_KM', 5.0))
+
+GRAPH_MAGIC = b'ERGRAPH1'
+SNAP_CELL_DEGREES = 0.01
+
+# Free-flow speeds (km/h) by OSM highway class, for ways without a maxspeed
+ROAD_SPEEDS_KMH = {
+    'motorway': 100, 'motorway_link': 60, 'trunk': 80, 'trunk_link': 50,
+    'primary': 65, 'primary_link': 40, 'secondary': 55, 'secondary_link': 35,
+    'tertiary': 45, 'tertiary_link': 30, 'unclassified': 35, 'residential': 25,
+    'living_street': 10, 'service': 15, 'road': 30,
+}
+
+INF = float('inf')
+
+
+class RoadGraph:
+    """Directed road graph in compressed sparse row form.
+
+    Edges leaving node u are targets[offsets[u]:offsets[u + 1]], with travel
+    times (seconds) and lengths (metres) at the same positions. The reverse
+    graph, edges entering each node, is derived when the graph is created.
+    """
+
+    def __init__(self, lats, lngs, offsets, targets, seconds, metres, landmarks=None, landmark_from=(),
+                 landmark_to=()):
+        self.lats, self.lngs = lats, lngs
+        self.offsets, self.targets, self.seconds, self.metres = offsets, targets, seconds, metres
+        self.landmarks = landmarks if landmarks is not None else array('i')
+        self.landmark_from, self.landmark_to = list(landmark_from), list(landmark_to)
+        self._build_reverse()
+        self._snap_grid = None
+        self._snap_lock = threading.Lock()
+
+    @property
+    def node_count(self):
+        return len(self.lats)
+
+    @property
+    def edge_count(self):
+        return len(self.targets)
+
+    @classmethod
+    def from_edges(cls, lats, lngs, edges):
+        """Build from node coordinates and (u, v, seconds, metres) edges, keeping the fastest parallel edge"""
+        fastest = {}
+        for u, v, seconds, metres in edges:
+            if u != v and seconds < fastest.get((u, v), (INF,))[0]:
+                fastest[(u, v)] = (seconds, metres)
+
+        offsets = array('i', [0]) * (len(lats) + 1)
+        targets, times, lengths = array('i'), array('d'), array('d')
+        for (u, v), (seconds, metres) in sorted(fastest.items()):
+            offsets[u + 1] += 1
+            targets.append(v)
+            times.append(seconds)
+            lengths.append(metres)
+        for u in range(len(lats)):
+            offsets[u + 1] += offsets[u]
+        return cls(array('d', lats), array('d', lngs), offsets, targets, times, lengths)
+
+    def _build_reverse(self):
+        n, offsets, targets = self.node_count, self.offsets, self.targets
+        reverse_offsets = array('i', [0]) * (n + 1)
+        for v in targets:
+            reverse_offsets[v + 1] += 1
+        for v in range(n):
+            reverse_offsets[v + 1] += reverse_offsets[v]
+        position = array('i', reverse_offsets[:n])
+        sources = array('i', [0]) * len(targets)
+        times = array('d', [0.0]) * len(targets)
+        for u in range(n):
+            for i in range(offsets[u], offsets[u + 1]):
+                v = targets[i]
+                sources[position[v]] = u
+                times[position[v]] = self.seconds[i]
+                position[v] += 1
+        self.reverse_offsets, self.reverse_sources, self.reverse_seconds = reverse_offsets, sources, times
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def save(self, path):
+        """Write the graph and its landmarks to a binary file (little-endian)"""
+        with open(path, 'wb') as f:
+            f.write(struct.pack('<8sIII', GRAPH_MAGIC, self.node_count, self.edge_count, len(self.landmarks)))
+            for values in (self.lats, self.lngs, self.offsets, self.targets, self.seconds, self.metres,
+                           self.landmarks, *self.landmark_from, *self.landmark_to):
+                if sys.byteorder == 'big':
+                    values = array(values.typecode, values)
+                    values.byteswap()
+                values.tofile(f)
+
+    @classmethod
+    def load(cls, path):
+        """Read a graph written by save()"""
+        with open(path, 'rb') as f:
+            magic, nodes, edges, landmark_count = struct.unpack('<8sIII', f.read(20))
+            if magic != GRAPH_MAGIC:
+                raise ValueError(f"{path} is not a road graph file")
+
+            def read(typecode, count):
+                values = array(typecode)
+                values.fromfile(f, count)
+                if sys.byteorder == 'big':
+                    values.byteswap()
+                return values
+
+            lats, lngs = read('d', nodes), read('d', nodes)
+            offsets, targets = read('i', nodes + 1), read('i', edges)
+            seconds, metres = read('d', edges), read('d', edges)
+            landmarks = read('i', landmark_count)
+            landmark_from = [read('d', nodes) for _ in range(landmark_count)]
+            landmark_to = [read('d', nodes) for _ in range(landmark_count)]
+        return cls(lats, lngs, offsets, targets, seconds, metres, landmarks, landmark_from, landmark_to)
+
+    # ------------------------------------------------------------------
+    # Searches
+    # ------------------------------------------------------------------
+
+    def travel_times(self, source, reverse=False):
+        """Fastest travel time (seconds) from source to every node, or from every node to source if reverse"""
+        if reverse:
+            offsets, targets, seconds = self.reverse_offsets, self.reverse_sources, self.reverse_seconds
+        else:
+            offsets, targets, seconds = self.offsets, self.targets, self.seconds
+        times = array('d', [INF]) * self.node_count
+        times[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            time, u = heapq.heappop(heap)
+            if time > times[u]:
+                continue
+            for i in range(offsets[u], offsets[u + 1]):
+                v, arrival = targets[i], time + seconds[i]
+                if arrival < times[v]:
+                    times[v] = arrival
+                    heapq.heappush(heap, (arrival, v))
+        return times
+
+    def largest_component(self):
+        """Subgraph of the largest strongly connected component, so every route exists (Kosaraju)"""
+        n = self.node_count
+        order, seen = [], bytearray(n)
+        for start in range(n):
+            if seen[start]:
+                continue
+            seen[start] = 1
+            stack = [(start, self.offsets[start])]
+            while stack:
+                u, i = stack[-1]
+                if i < self.offsets[u + 1]:
+                    stack[-1] = (u, i + 1)
+                    v = self.targets[i]
+                    if not seen[v]:
+                        seen[v] = 1
+                        stack.append((v, self.offsets[v]))
+                else:
+                    stack.pop()
+                    order.append(u)
+
+        component, best = array('i', [-1]) * n, (0, -1)
+        for start in reversed(order):
+            if component[start] >= 0:
+                continue
+            component[start], stack, size = start, [start], 0
+            while stack:
+                u = stack.pop()
+                size += 1
+                for i in range(self.reverse_offsets[u], self.reverse_offsets[u + 1]):
+                    v = self.reverse_sources[i]
+                    if component[v] < 0:
+                        component[v] = start
+                        stack.append(v)
+            best = max(best, (size, start))
+        keep = [v for v in range(n) if component[v] == best[1]]
+        renumber = {v: i for i, v in enumerate(keep)}
+        return RoadGraph.from_edges(
+            [self.lats[v] for v in keep], [self.lngs[v] for v in keep],
+            ((renumber[u], renumber[self.targets[i]], self.seconds[i], self.metres[i])
+             for u in keep for i in range(self.offsets[u], self.offsets[u + 1]) if self.targets[i] in renumber))
+
+    def select_landmarks(self, count=ROUTING_LANDMARKS):
+        """Pick far-apart landmarks (farthest-first) and store travel times to and from each"""
+        self.landmarks, self.landmark_from, self.landmark_to = array('i'), [], []
+        if not self.node_count:
+            return
+        nodes = range(self.node_count)
+        # Round trip to the closest landmark so far; the first landmark is the node farthest from node 0
+        separation = self.travel_times(0)
+        for _ in range(min(count, self.node_count)):
+            landmark = max(nodes, key=lambda v: separation[v] if separation[v] < INF else -1)
+            if self.landmarks and separation[landmark] <= 0:
+                break
+            from_landmark, to_landmark = self.travel_times(landmark), self.travel_times(landmark, reverse=True)
+            round_trip = array('d', (from_landmark[v] + to_landmark[v] for v in nodes))
+            separation = round_trip if not self.landmarks else array(
+                'd', (min(separation[v], round_trip[v]) for v in nodes))
+            self.landmarks.append(landmark)
+            self.landmark_from.append(from_landmark)
+            self.landmark_to.append(to_landmark)
+
+    def _active_landmarks(self, source, target, count):
+        bounds = []
+        for from_landmark, to_landmark in zip(self.landmark_from, self.landmark_to):
+            bound = max(from_landmark[target] - from_landmark[source], to_landmark[source] - to_landmark[target])
+            bounds.append((bound, from_landmark, to_landmark))
+        bounds.sort(key=lambda entry: entry[0], reverse=True)
+        return [(from_landmark, to_landmark, from_landmark[target], to_landmark[target],
+                 from_landmark[source], to_landmark[source]) for _, from_landmark, to_landmark in bounds[:count]]
+
+    def shortest_path(self, source, target, landmarks=ROUTING_ACTIVE_LANDMARKS):
+        """Fastest path as (seconds, [node ids]), or None if target is unreachable.
+
+        Bidirectional A* with the average of the forward and reverse ALT
+        bounds as potential, so both searches see the same nonnegative
+        reduced costs. landmarks=0 makes it plain bidirectional Dijkstra.
+        """
+        if source == target:
+            return 0.0, [source]
+        active = self._active_landmarks(source, target, landmarks) if landmarks else []
+        potentials = {}
+
+        def potential(v):
+            # (lower bound of v -> target  -  lower bound of source -> v) / 2
+            value = potentials.get(v)
+            if value is None:
+                to_target = from_source = 0.0
+                for from_landmark, to_landmark, from_at_target, to_at_target, from_at_source, to_at_source in active:
+                    from_v, to_v = from_landmark[v], to_landmark[v]
+                    to_target = max(to_target, from_at_target - from_v, to_v - to_at_target)
+                    from_source = max(from_source, from_v - from_at_source, to_at_source - to_v)
+                value = potentials[v] = (to_target - from_source) / 2
+            return value
+
+        searches = (
+            # (times, parents, heap, offsets, targets, seconds, sign of the potential)
+            ({source: 0.0}, {source: -1}, [(potential(source), source)], self.offsets, self.targets, self.seconds, 1),
+            ({target: 0.0}, {target: -1}, [(-potential(target), target)], self.reverse_offsets,
+             self.reverse_sources, self.reverse_seconds, -1),
+        )
+        forward, backward = searches
+        best, meeting = INF, -1
+        while forward[2] and backward[2] and forward[2][0][0] + backward[2][0][0] < best:
+            search, other = (forward, backward) if len(forward[2]) <= len(backward[2]) else (backward, forward)
+            times, parents, heap, offsets, targets, seconds, sign = search
+            key, u = heapq.heappop(heap)
+            time = times[u]
+            if key > time + sign * potential(u):
+                continue
+            other_times = other[0]
+            for i in range(offsets[u], offsets[u + 1]):
+                v, arrival = targets[i], time + seconds[i]
+                if arrival < times.get(v, INF):
+                    times[v] = arrival
+                    parents[v] = u
+                    heapq.heappush(heap, (arrival + sign * potential(v), v))
+                    if v in other_times and arrival + other_times[v] < best:
+                        best, meeting = arrival + other_times[v], v
+
+        if meeting < 0:
+            return None
+        path, v = [], meeting
+        while v >= 0:
+            path.append(v)
+            v = forward[1][v]
+        path.reverse()
+        v = backward[1][meeting]
+        while v >= 0:
+            path.append(v)
+            v = backward[1][v]
+        return best, path
+
+    def path_metres(self, path):
+        """Length of a path returned by shortest_path"""
+        total = 0.0
+        for u, v in zip(path, path[1:]):
+            total += min(self.metres[i] for i in range(self.offsets[u], self.offsets[u + 1]) if self.targets[i] == v)
+        return total
+
+    # ------------------------------------------------------------------
+    # Snapping coordinates to nodes
+    # ------------------------------------------------------------------
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / SNAP_CELL_DEGREES), math.floor(lng / SNAP_CELL_DEGREES)
+
+    def nearest_node(self, lat, lng, max_km=ROUTING_SNAP_KM):
+        """Closest node to a point and its distance in km; raises ValueError if none is within max_km"""
+        if self._snap_grid is None:
+            with self._snap_lock:
+                if self._snap_grid is None:
+                    grid = {}
+                    for v in range(self.node_count):
+                        grid.setdefault(self._cell(self.lats[v], self.lngs[v]), []).append(v)
+                    self._snap_grid = grid
+
+        row, col = self._cell(lat, lng)
+        # Narrowest cell width near this latitude, in km
+        cell_km = SNAP_CELL_DEGREES * 111.19 * max(math.cos(math.radians(min(abs(lat) + 1, 89))), 0.01)
+        best, best_km = -1, INF
+        for ring in range(int(max_km / cell_km) + 2):
+            for r in range(row - ring, row + ring + 1):
+                for c in range(col - ring, col + ring + 1):
+                    if ring and r not in (row - ring, row + ring) and c not in (col - ring, col + ring):
+                        continue
+                    for v in self._snap_grid.get((r, c), ()):
+                        km = haversine_km(lat, lng, self.lats[v], self.lngs[v])
+                        if km < best_km or (km == best_km and v < best):
+                            best, best_km = v, km
+            # Nodes in further rings are at least ring cells away
+            if best_km <= ring * cell_km:
+                break
+        if best_km > max_km:
+            raise ValueError(f'No road within {max_km:g} km of {lat:.5f},{lng:.5f}')
+        return best, best_km
+
+    def route(self, from_lat, from_lng, to_lat, to_lng):
+        """Fastest driving route between two points as a dict, or None if there is none"""
+        source, _ = self.nearest_node(from_lat, from_lng)
+        target, _ = self.nearest_node(to_lat, to_lng)
+        found = self.shortest_path(source, target)
+        if found is None:
+            return None
+        seconds, path = found
+        return {
+            'eta_seconds': round(seconds, 1),
+            'distance_km': round(self.path_metres(path) / 1000, 3),
+            'path': [[self.lats[v], self.lngs[v]] for v in path],
+        }
+
+
+# ----------------------------------------------------------------------
+# Loading for the web app
+# ----------------------------------------------------------------------
+
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+def get_road_graph():
+    """The graph at ROAD_GRAPH_PATH, loaded once per process; None if the file does not exist"""
+    graph = _graphs.get(ROAD_GRAPH_PATH)
+    if graph is None and os.path.exists(ROAD_GRAPH_PATH):
+        with _graphs_lock:
+            graph = _graphs.get(ROAD_GRAPH_PATH)
+            if graph is None:
+                graph = _graphs[ROAD_GRAPH_PATH] = RoadGraph.load(ROAD_GRAPH_PATH)
+                print(f"Loaded road graph {ROAD_GRAPH_PATH}: {graph.node_count} nodes, {graph.edge_count} edges")
+    return graph
+
+
+# ----------------------------------------------------------------------
+# OpenStreetMap conversion
+# ----------------------------------------------------------------------
+
+def _open_extract(path):
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+def _way_speed(tags):
+    maxspeed = tags.get('maxspeed', '').split()
+    if maxspeed and maxspeed[0].isdigit():
+        return int(maxspeed[0]) * (1.609 if 'mph' in maxspeed else 1)
+    return ROAD_SPEEDS_KMH[tags['highway']]
+
+def _way_direction(tags):
+    """1 = forward only, -1 = backward only, 0 = both ways"""
+    oneway = tags.get('oneway', '')
+    if oneway == '-1':
+        return -1
+    if oneway in ('yes', 'true', '1') or tags.get('junction') == 'roundabout' or tags['highway'] == 'motorway':
+        return 1
+    return 0
+
+def graph_from_osm(path, landmarks=ROUTING_LANDMARKS):
+    """Build a RoadGraph (largest strongly connected part, with landmarks) from an .osm XML extract"""
+    ways, needed = [], set()
+    for _, element in ET.iterparse(_open_extract(path)):
+        if element.tag == 'way':
+            tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+            if tags.get('highway') in ROAD_SPEEDS_KMH and tags.get('access') not in ('no', 'private'):
+                refs = [int(nd.get('ref')) for nd in element.iter('nd')]
+                ways.append((refs, _way_speed(tags) / 3.6, _way_direction(tags)))
+                needed.update(refs)
+        if element.tag in ('node', 'way', 'relation'):
+            element.clear()
+
+    index, lats, lngs = {}, array('d'), array('d')
+    for _, element in ET.iterparse(_open_extract(path)):
+        if element.tag == 'node':
+            osm_id = int(element.get('id'))
+            if osm_id in needed:
+                index[osm_id] = len(lats)
+                lats.append(float(element.get('lat')))
+                lngs.append(float(element.get('lon')))
+        if element.tag in ('node', 'way', 'relation'):
+            element.clear()
+
+    edges = []
+    for refs, metres_per_second, direction in ways:
+        nodes = [index[ref] for ref in refs if ref in index]
+        for u, v in zip(nodes, nodes[1:]):
+            metres = haversine_km(lats[u], lngs[u], lats[v], lngs[v]) * 1000
+            if direction >= 0:
+                edges.append((u, v, metres / metres_per_second, metres))
+            if direction <= 0:
+                edges.append((v, u, metres / metres_per_second, metres))
+    graph = RoadGraph.from_edges(lats, lngs, edges).largest_component()
+    graph.select_landmarks(landmarks)
+    return graph
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert an OpenStreetMap extract into a road graph file')
+    parser.add_argument('command', choices=['convert'])
+    parser.add_argument('extract', help='.osm XML extract (optionally .bz2 or .gz)')
+    parser.add_argument('output', nargs='?', default=ROAD_GRAPH_PATH)
+    parser.add_argument('--landmarks', type=int, default=ROUTING_LANDMARKS)
+    args = parser.parse_args()
+
+    graph = graph_from_osm(args.extract, args.landmarks)
+    graph.save(args.output)
+    print(f"Wrote {args.output}: {graph.node_count} nodes, {graph.edge_count} edges, "
+          f"{len(graph.landmarks)} landmarks")
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Emergency Response App - Server-Side Sessions
+Each login gets a row in user_sessions whose token is kept in the signed
+Flask session, so sessions can be listed, counted and revoked on the
+server. Live tokens are cached in memory, last-seen times are written in
+batches, and a background thread sweeps expired rows in small chunks.
+
+Revocations reach other workers' token caches only as broker events, so the
+cache is used only with a shared event log (EVENT_BACKEND=sqlite); with the
+in-process broker every validation reads user_sessions.
+"""
+
+import os
+import secrets
+import threading
+import time
+from prometheus_client import Counter, Gauge
+import database
+from cache import TTLCache
+from events import broker
+
+# A session not used for this long expires (each use slides the expiry)
+SESSION_IDLE_TIMEOUT = int(os.environ.get('SESSION_IDLE_TIMEOUT', 30 * 24 * 3600))
+SESSION_CACHE_TTL = float(os.environ.get('SESSION_CACHE_TTL', 60.0)) if broker.shared else 0.0
+SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', 10000))
+# How often last-seen times are written and the active user count refreshed
+SESSION_FLUSH_INTERVAL = float(os.environ.get('SESSION_FLUSH_INTERVAL', 30.0))
+SESSION_SWEEP_INTERVAL = float(os.environ.get('SESSION_SWEEP_INTERVAL', 300.0))
+SESSION_SWEEP_CHUNK = int(os.environ.get('SESSION_SWEEP_CHUNK', 500))
+# Users whose sessions were used within this window count as active
+ACTIVE_USER_WINDOW = int(os.environ.get('ACTIVE_USER_WINDOW', 900))
+
+sessions_created_total = Counter('sessions_created_total', 'Server-side sessions started')
+sessions_revoked_total = Counter('sessions_revoked_total', 'Server-side sessions revoked')
+sessions_swept_total = Counter('sessions_swept_total', 'Expired or revoked sessions deleted by the sweeper')
+# Every worker reports the same global count, so aggregate with max rather than sum
+active_users_gauge = Gauge('active_users', 'Users seen in the last ACTIVE_USER_WINDOW seconds, across workers',
+                           multiprocess_mode='livemax')
+
+
+class SessionStore:
+    """user_sessions with a token cache, batched last-seen writes and a sweeper thread"""
+
+    def __init__(self, idle_timeout=SESSION_IDLE_TIMEOUT, cache_ttl=SESSION_CACHE_TTL,
+                 flush_interval=SESSION_FLUSH_INTERVAL, sweep_interval=SESSION_SWEEP_INTERVAL,
+                 sweep_chunk=SESSION_SWEEP_CHUNK, active_window=ACTIVE_USER_WINDOW):
+        self.idle_timeout = idle_timeout
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
+        self.sweep_chunk = sweep_chunk
+        self.active_window = active_window
+        self.active_users = 0
+        self.cache_ttl = cache_ttl
+        self._cache = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=cache_ttl)
+        self._last_seen = {}
+        self._last_seen_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def create(self, user_id):
+        """Start a session for user_id and return its token"""
+        token = secrets.token_urlsafe(32)
+        database.create_user_session(int(user_id), token, self.idle_timeout)
+        if self.cache_ttl > 0:
+            self._cache.set((database.DATABASE_PATH, token), int(user_id))
+        sessions_created_total.inc()
+        self.start()
+        return token
+
+    def validate(self, token, user_id):
+        """True if token is a live session of user_id; records the use"""
+        self.start()
+        key = (database.DATABASE_PATH, token)
+        owner = self._cache.get(key) if self.cache_ttl > 0 else None
+        if owner is None:
+            owner = database.get_session_user_id(token)
+            if owner is None:
+                return False
+            if self.cache_ttl > 0:
+                self._cache.set(key, owner)
+        if owner != int(user_id):
+            return False
+        with self._last_seen_lock:
+            self._last_seen[token] = time.time()
+        return True
+
+    def revoke(self, token):
+        """End one session (logout)"""
+        database.revoke_user_session(token)
+        self._forget([token])
+
+    def revoke_user(self, user_id):
+        """End every session of a user"""
+        self._forget(database.revoke_user_sessions(int(user_id)))
+
+    def _forget(self, tokens):
+        sessions_revoked_total.inc(len(tokens))
+        for token in tokens:
+            self._cache.pop((database.DATABASE_PATH, token))
+        with self._last_seen_lock:
+            for token in tokens:
+                self._last_seen.pop(token, None)
+        # Other workers may have the tokens cached too
+        broker.publish('session.revoked', {'database': database.DATABASE_PATH, 'tokens': tokens})
+
+    def _evict_revoked(self, event):
+        for token in event.data['tokens']:
+            self._cache.pop((event.data['database'], token))
+
+    def flush(self):
+        """Write the batched last-seen times; returns how many sessions were touched"""
+        with self._last_seen_lock:
+            last_seen, self._last_seen = self._last_seen, {}
+        if last_seen:
+            database.touch_user_sessions(last_seen, self.idle_timeout)
+        return len(last_seen)
+
+    def sweep(self):
+        """Delete expired sessions in chunks so writers are never blocked for long"""
+        swept = 0
+        while not self._stopping.is_set():
+            deleted = database.delete_expired_sessions(self.sweep_chunk)
+            swept += deleted
+            if deleted < self.sweep_chunk:
+                break
+            time.sleep(0.05)
+        sessions_swept_total.inc(swept)
+        return swept
+
+    def refresh_active_users(self):
+        """Recount users active within the window for the active_users gauge.
+
+        last_seen_at is shared by every worker, so this is a global count,
+        not this process's share; it is bounded by the flush interval's lag.
+        """
+        self.active_users = database.count_active_session_users(self.active_window)
+        active_users_gauge.set(self.active_users)
+        return self.active_users
+
+    def start(self):
+        """Start the maintenance thread in this process (again after a fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            broker.start()
+            self._thread = threading.Thread(target=self._run, name='session-maintenance', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10.0):
+        """Flush pending last-seen times and stop the maintenance thread"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._lock:
+            self._thread = None
+            self._pid = None
+
+    def _run(self):
+        next_sweep = 0.0
+        while True:
+            try:
+                self.flush()
+                if time.monotonic() >= next_sweep:
+                    self.sweep()
+                    next_sweep = time.monotonic() + self.sweep_interval
+                self.refresh_active_users()
+            except Exception as e:
+                print(f"Session maintenance failed: {e}")
+            if self._stopping.wait(self.flush_interval):
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"Session flush failed: {e}")
+                return
+
+
+sessions = SessionStore()
+broker.listen(['session.revoked'], sessions._evict_revoked)
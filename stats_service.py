@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Emergency Response App - Statistics Service
+System statistics read from trigger-maintained counters (see migration 5)
+and cached for a short TTL, so status pages cost the same at any table size.
+"""
+
+import os
+import database
+from cache import TTLCache
+
+REPORT_STATUSES = ('reported', 'responding', 'resolved', 'cancelled')
+REPORT_SEVERITIES = ('low', 'medium', 'high', 'critical')
+
+STATS_CACHE_TTL = float(os.environ.get('STATS_CACHE_TTL', 5.0))
+
+_stats_cache = TTLCache(maxsize=8, ttl=STATS_CACHE_TTL)
+
+def _compute_statistics():
+    counters = database.get_stat_counters()
+    by_status = {status: counters.get(f'reports.status.{status}', 0) for status in REPORT_STATUSES}
+    by_severity = {severity: counters.get(f'reports.severity.{severity}', 0) for severity in REPORT_SEVERITIES}
+    return {
+        'total_emergency_reports': counters.get('reports.total', 0),
+        'reports_by_status': by_status,
+        'reports_by_severity': by_severity,
+        'active_emergencies': by_status['reported'] + by_status['responding'],
+        'pending_emergencies': by_status['reported'],
+        'total_messages': counters.get('messages.live', 0),
+        'total_fire_departments': counters.get('users.fire_department', 0),
+    }
+
+def get_system_statistics():
+    """Get report, message and department statistics (cached for STATS_CACHE_TTL seconds)"""
+    return _stats_cache.get_or_set(database.DATABASE_PATH, _compute_statistics)
+
+def invalidate_statistics():
+    """Drop the cached statistics so the next read sees fresh counters"""
+    _stats_cache.clear()
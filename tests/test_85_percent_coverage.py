@@ -15,7 +15,8 @@ from datetime import datetime
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app import app
+from app import create_app
+import database
 from database import *
 from auth import *
 import api_endpoints
@@ -23,13 +24,13 @@ import api_endpoints
 @pytest.fixture
 def client():
     """Create test client"""
-    app.config['TESTING'] = True
-    app.config['DATABASE'] = ':memory:'
+    app = create_app({'TESTING': True, 'DATABASE': ':memory:'})
     
     with app.test_client() as client:
         with app.app_context():
             init_database()
         yield client
+    database.close_pools()
 
 @pytest.fixture
 def api_headers():
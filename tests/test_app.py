@@ -7,24 +7,26 @@ import pytest
 import sys
 import os
 import json
+import subprocess
 from unittest.mock import patch, MagicMock
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app import app
+from app import create_app
+import database
 from database import init_database
 
 @pytest.fixture
 def client():
     """Create test client"""
-    app.config['TESTING'] = True
-    app.config['DATABASE'] = ':memory:'
+    app = create_app({'TESTING': True, 'DATABASE': ':memory:'})
     
     with app.test_client() as client:
         with app.app_context():
             init_database()
         yield client
+    database.close_pools()
 
 @pytest.fixture
 def api_headers():
@@ -190,6 +192,7 @@ class TestAuthenticationEndpoints:
     
     def test_login_valid_user(self, client):
         """Test login with valid credentials"""
+        database.create_user('testuser', 'testuser@example.com', 'password123', 'user', 'Test User')
         login_data = {
             'username': 'testuser',
             'password': 'password123'
@@ -545,5 +548,49 @@ class TestInputValidation:
                                   headers=api_headers)
             assert response.status_code in [201, 400]
 
+class TestAppFactory:
+    """Test create_app configuration and lazy initialization"""
+
+    def test_import_does_not_touch_database(self, tmp_path):
+        """Test that importing app neither builds an app nor creates the database"""
+        db_path = tmp_path / 'app.db'
+        code = 'import app, sys; sys.exit("app" in vars(app))'
+        result = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.dirname(__file__)),
+                                env=dict(os.environ, DATABASE_PATH=str(db_path)))
+        assert result.returncode == 0
+        assert not db_path.exists()
+
+    def test_configured_database_created_on_first_request(self, tmp_path):
+        """Test that DATABASE is honored and initialized on the first request"""
+        db_path = str(tmp_path / 'configured.db')
+        with patch('database.DATABASE_PATH', database.DATABASE_PATH):
+            app = create_app({'TESTING': True, 'DATABASE': db_path})
+            assert database.DATABASE_PATH == db_path
+            assert not os.path.exists(db_path)
+
+            assert app.test_client().get('/api/v1/health').status_code == 200
+            assert database.get_user_by_username('nobody') is None
+        database.close_pools()
+        assert os.path.exists(db_path)
+
+    def test_in_memory_database(self, client, api_headers):
+        """Test that the fixture's in-memory database starts empty and receives writes"""
+        assert database.DATABASE_PATH == ':memory:'
+        assert database.count_emergency_reports() == 0
+        response = client.post('/api/v1/emergencies', headers=api_headers,
+                               json={'emergency_type': 'fire', 'location': 'Test Location',
+                                     'description': 'In-memory report', 'severity': 'low'})
+        assert response.status_code == 201
+        assert database.count_emergency_reports() == 1
+
+    def test_apps_are_independent(self):
+        """Test that each call builds a separate app with its own config"""
+        first = create_app({'TESTING': True, 'API_KEY': 'first-key'})
+        second = create_app({'TESTING': True})
+        assert first is not second
+        assert first.config['API_KEY'] == 'first-key'
+        assert second.config['API_KEY'] == 'emergency-api-key-2024'
+        assert 'web.login' in second.view_functions
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
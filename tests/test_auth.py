@@ -352,3 +352,187 @@ class TestAuthEdgeCases:
 
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
+
+class TestLoginLookup:
+    """Test the single-query username-or-email lookup and its negative cache"""
+
+    @pytest.fixture
+    def test_db(self):
+        """Create a test database"""
+        import tempfile
+        import database
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp_file:
+            db_path = tmp_file.name
+
+        with patch('database.DATABASE_PATH', db_path):
+            database.init_database()
+            yield db_path
+
+        database.close_pools()
+        if os.path.exists(db_path):
+            os.unlink(db_path)
+
+    def count_queries(self, func, *args):
+        """Run func and return (result, number of SELECTs it issued)"""
+        from database import get_db_connection
+        statements = []
+        with get_db_connection() as conn:
+            conn.set_trace_callback(statements.append)
+            try:
+                result = func(*args)
+            finally:
+                conn.set_trace_callback(None)
+        return result, sum(1 for sql in statements if sql.lstrip().upper().startswith('SELECT'))
+
+    def test_email_login_is_one_query(self, test_db):
+        """Test that an email login needs a single query, matching email case-insensitively"""
+        from database import get_user_for_login
+        user_id = create_user('testuser', 'Test@Example.com', 'password123', 'user', 'Test User')
+        user, queries = self.count_queries(get_user_for_login, 'test@example.COM')
+        assert user['id'] == user_id and queries == 1
+        assert authenticate_user('TEST@example.com', 'password123')['id'] == user_id
+
+    def test_username_takes_precedence_over_email(self, test_db):
+        """Test that a username match wins over another user's email"""
+        from database import get_user_for_login
+        by_username = create_user('shared@example.com', 'first@example.com', 'password123', 'user', 'First')
+        create_user('second', 'shared@example.com', 'password123', 'user', 'Second')
+        assert get_user_for_login('shared@example.com')['id'] == by_username
+
+    def test_unknown_identifier_is_negatively_cached(self, test_db):
+        """Test that repeated unknown logins skip the database until a user registers"""
+        from database import get_user_for_login
+        assert self.count_queries(get_user_for_login, 'nobody') == (None, 1)
+        assert self.count_queries(get_user_for_login, 'nobody') == (None, 0)
+
+        user_id = create_user('nobody', 'nobody@example.com', 'password123', 'user', 'Nobody')
+        user, queries = self.count_queries(get_user_for_login, 'nobody')
+        assert user['id'] == user_id and queries == 1
+
+    def test_registration_only_forgets_its_own_logins(self, test_db):
+        """Test that other unknown identifiers stay cached when someone registers"""
+        from database import get_user_for_login
+        get_user_for_login('stuffed')
+        create_user('someone', 'someone@example.com', 'password123', 'user', 'Someone')
+        assert self.count_queries(get_user_for_login, 'stuffed') == (None, 0)
+
+    def test_unknown_login_evicted_from_another_worker(self, test_db):
+        """Test that a user.changed event carrying logins evicts them, whatever their email case"""
+        import database
+        from database import get_user_for_login
+        get_user_for_login('Late@Example.com')
+        user_id = create_user('late', 'late@example.com', 'password123', 'user', 'Late')
+        # As if the user had registered through another worker
+        database._unknown_logins.set((test_db, 'late@example.com'), frozenset({'Late@Example.com'}))
+        database.broker.publish('user.changed', {'database': test_db, 'id': user_id,
+                                                 'logins': ['late', 'late@example.com']})
+        user, queries = self.count_queries(get_user_for_login, 'Late@Example.com')
+        assert user['id'] == user_id and queries == 1
+
+    def test_deactivated_user_cannot_log_in(self, test_db):
+        """Test that only active users are returned"""
+        from database import get_user_for_login, delete_user_account
+        user_id = create_user('testuser', 'test@example.com', 'password123', 'user', 'Test User')
+        delete_user_account(user_id)
+        assert get_user_for_login('testuser') is None
+        assert authenticate_user('test@example.com', 'password123') is None
+
+class TestUserCache:
+    """Test the shared user cache behind load_user and its invalidation"""
+
+    @pytest.fixture
+    def test_db(self):
+        """Create a test database, caching users as with a shared event log"""
+        import tempfile
+        import database
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp_file:
+            db_path = tmp_file.name
+
+        with patch('database.DATABASE_PATH', db_path), patch('database.USER_CACHE_TTL', 30.0):
+            database.init_database()
+            yield db_path
+
+        database.close_pools()
+        if os.path.exists(db_path):
+            os.unlink(db_path)
+
+    def count_queries(self, func, *args):
+        """Run func and return (result, number of SELECTs it issued)"""
+        from database import get_db_connection
+        statements = []
+        with get_db_connection() as conn:
+            conn.set_trace_callback(statements.append)
+            try:
+                result = func(*args)
+            finally:
+                conn.set_trace_callback(None)
+        return result, sum(1 for sql in statements if sql.lstrip().upper().startswith('SELECT'))
+
+    def test_repeat_loads_skip_the_database(self, test_db):
+        """Test that only the first load of a user queries the database"""
+        user_id = create_user('testuser', 'test@example.com', 'password123', 'user', 'Test User')
+        user, queries = self.count_queries(load_user, str(user_id))
+        assert user.username == 'testuser' and queries == 1
+        user, queries = self.count_queries(load_user, str(user_id))
+        assert user.username == 'testuser' and queries == 0
+
+    def test_cached_user_has_no_password_hash(self, test_db):
+        """Test that password hashes are not kept in the cache"""
+        from database import get_session_user
+        user_id = create_user('testuser', 'test@example.com', 'password123', 'user', 'Test User')
+        assert 'password_hash' not in get_session_user(user_id)
+
+    def test_profile_and_password_changes_evict(self, test_db):
+        """Test that profile and password changes are visible on the next load"""
+        from database import update_user_profile, change_user_password, get_session_user, _session_users
+        user_id = create_user('testuser', 'test@example.com', 'password123', 'user', 'Test User')
+        load_user(str(user_id))
+        update_user_profile(user_id, 'Renamed User', 'test@example.com', 'testuser')
+        assert load_user(str(user_id)).full_name == 'Renamed User'
+
+        get_session_user(user_id)
+        assert (test_db, user_id) in _session_users
+        change_user_password(user_id, 'newpassword123')
+        assert (test_db, user_id) not in _session_users
+
+    def test_deactivation_takes_effect_immediately(self, test_db):
+        """Test that a deleted account's session stops working on the next request"""
+        from app import app
+        from database import delete_user_account
+        app.config['TESTING'] = True
+        user_id = create_user('testuser', 'test@example.com', 'password123', 'user', 'Test User')
+        with app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user_id)
+            assert client.get('/messages').status_code == 200
+            delete_user_account(user_id)
+            assert client.get('/messages').status_code == 302
+
+    def test_eviction_from_another_worker(self, test_db):
+        """Test that a user.changed event published elsewhere evicts the cached user"""
+        import database
+        user_id = create_user('testuser', 'test@example.com', 'password123', 'user', 'Test User')
+        database.get_session_user(user_id)
+        assert (test_db, user_id) in database._session_users
+        database.broker.publish('user.changed', {'database': test_db, 'id': user_id})
+        assert (test_db, user_id) not in database._session_users
+
+    def test_no_cache_without_shared_event_log(self, test_db):
+        """Test that with the in-process broker a user deleted by another worker stops loading"""
+        import database
+        user_id = create_user('testuser', 'test@example.com', 'password123', 'user', 'Test User')
+        with patch('database.USER_CACHE_TTL', 0.0):
+            assert load_user(str(user_id)).username == 'testuser'
+            assert (test_db, user_id) not in database._session_users
+            # Another worker deactivates the account; its user.changed event never arrives here
+            with database.get_db_connection() as conn:
+                conn.execute('UPDATE users SET is_active = 0 WHERE id = ?', (user_id,))
+                conn.commit()
+            assert load_user(str(user_id)) is None
+
+    def test_load_is_memoized_per_request(self, test_db):
+        """Test that repeated loads within one request return the same object"""
+        from app import app
+        user_id = create_user('testuser', 'test@example.com', 'password123', 'user', 'Test User')
+        with app.test_request_context():
+            assert load_user(str(user_id)) is load_user(str(user_id))
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the bounded password hashing executor
+"""
+
+import pytest
+import sys
+import os
+import json
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import auth_crypto
+from auth_crypto import CryptoBusy, CryptoExecutor, needs_rehash
+from database import init_database, create_user, authenticate_user, get_user_by_id
+
+@pytest.fixture
+def test_db():
+    """Create a test database hashing at the cheapest bcrypt cost"""
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp_file:
+        db_path = tmp_file.name
+
+    with patch('database.DATABASE_PATH', db_path), patch('auth_crypto.BCRYPT_ROUNDS', 4):
+        init_database()
+        yield db_path
+
+    database.close_pools()
+    if os.path.exists(db_path):
+        os.unlink(db_path)
+
+class TestCryptoExecutor:
+    """Test the bounded pool and its backpressure"""
+
+    def test_rejects_when_saturated(self):
+        """Test that work beyond workers + queue raises CryptoBusy instead of queueing"""
+        executor = CryptoExecutor(workers=1, queue_size=1)
+        release = threading.Event()
+        started = threading.Semaphore(0)
+
+        def block():
+            started.release()
+            release.wait(5)
+            return 'done'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(executor.run('hash', block))) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        started.acquire(timeout=5)
+        deadline = time.monotonic() + 5
+        while executor._slots._value and time.monotonic() < deadline:
+            time.sleep(0.01)  # wait for the second call to take the queue slot
+
+        with pytest.raises(CryptoBusy) as busy:
+            executor.run('hash', block)
+        assert busy.value.retry_after > 0
+
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        assert results == ['done', 'done']
+        assert executor.run('verify', lambda: 42) == 42
+
+    def test_exceptions_propagate(self):
+        """Test that errors from the hashing call reach the caller and free the slot"""
+        executor = CryptoExecutor(workers=1, queue_size=0)
+        with pytest.raises(ValueError):
+            executor.run('verify', auth_crypto.bcrypt.checkpw, b'password', b'not-a-hash')
+        assert executor.run('verify', lambda: True)
+
+class TestPasswordHashing:
+    """Test hashing, verification and cost upgrades"""
+
+    def test_hash_uses_configured_cost(self):
+        """Test that BCRYPT_ROUNDS sets the cost factor"""
+        with patch('auth_crypto.BCRYPT_ROUNDS', 5):
+            password_hash = auth_crypto.hash_password('secret')
+            assert password_hash.startswith('$2b$05$')
+            assert auth_crypto.verify_password('secret', password_hash)
+            assert not auth_crypto.verify_password('wrong', password_hash)
+            assert not needs_rehash(password_hash)
+        with patch('auth_crypto.BCRYPT_ROUNDS', 6):
+            assert needs_rehash(password_hash)
+        assert needs_rehash('garbage')
+
+    def test_login_rehashes_outdated_cost(self, test_db):
+        """Test that a successful login transparently upgrades the stored hash"""
+        user_id = create_user('user', 'user@example.com', 'password123', 'user', 'User')
+        assert get_user_by_id(user_id)['password_hash'].startswith('$2b$04$')
+
+        with patch('auth_crypto.BCRYPT_ROUNDS', 5):
+            assert authenticate_user('user', 'wrong-password') is None
+            assert get_user_by_id(user_id)['password_hash'].startswith('$2b$04$')
+            assert authenticate_user('user', 'password123')['id'] == user_id
+            upgraded = get_user_by_id(user_id)['password_hash']
+        assert upgraded.startswith('$2b$05$')
+        assert authenticate_user('user@example.com', 'password123')['id'] == user_id
+
+class TestBackpressureResponses:
+    """Test 503 + Retry-After when hashing is saturated"""
+
+    @pytest.fixture
+    def client(self, test_db):
+        from app import app
+        app.config['TESTING'] = True
+        create_user('user', 'user@example.com', 'password123', 'user', 'User')
+        with app.test_client() as client, \
+                patch.object(auth_crypto.executor, 'run', side_effect=CryptoBusy(retry_after=3)):
+            yield client
+
+    def test_api_login_returns_503(self, client):
+        """Test that the API login reports saturation with Retry-After"""
+        response = client.post('/api/v1/auth/login', json={'username': 'user', 'password': 'password123'})
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '3'
+        assert 'busy' in json.loads(response.data)['data']['error']
+
+    def test_web_login_returns_503(self, client):
+        """Test that the login form re-renders with 503 and Retry-After"""
+        response = client.post('/login', data={'username': 'user', 'password': 'password123'})
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '3'
+        assert b'busy' in response.data
+
+    def test_api_register_returns_503(self, client):
+        """Test that registration is not swallowed as a generic 500"""
+        response = client.post('/api/v1/auth/register', json={
+            'username': 'new', 'email': 'new@example.com', 'password': 'password123',
+            'full_name': 'New User', 'phone': '123'})
+        assert response.status_code == 503
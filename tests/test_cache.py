@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the in-process TTL cache
+"""
+
+import pytest
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import TTLCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestTTLCache:
+    """Test expiry, LRU eviction and invalidation"""
+
+    def test_entries_expire(self):
+        """Test that entries disappear after their TTL"""
+        clock = FakeClock()
+        cache = TTLCache(ttl=10, clock=clock)
+        cache.set('a', 1)
+        cache.set('b', 2, ttl=1)
+        clock.now = 5
+        assert cache.get('a') == 1
+        assert cache.get('b') is None
+        clock.now = 11
+        assert 'a' not in cache
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first"""
+        cache = TTLCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        assert 'a' in cache and 'c' in cache
+        assert 'b' not in cache
+
+    def test_get_or_set_computes_once(self):
+        """Test that the factory only runs on a miss"""
+        cache = TTLCache()
+        calls = []
+        for _ in range(3):
+            assert cache.get_or_set('k', lambda: calls.append(1) or 'v') == 'v'
+        assert len(calls) == 1
+        assert cache.hits == 2
+
+    def test_pop_and_clear(self):
+        """Test invalidation of single keys and the whole cache"""
+        cache = TTLCache()
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.pop('a')
+        assert 'a' not in cache and len(cache) == 1
+        cache.clear()
+        assert len(cache) == 0
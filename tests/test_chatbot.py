@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the medical chatbot intent matcher
+"""
+
+import pytest
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot import INTENTS, DEFAULT_RESPONSE, match_intent, get_medical_emergency_response
+
+class TestMatchIntent:
+    """Test choosing an intent for a message"""
+
+    @pytest.mark.parametrize('message, intent', [
+        ('My father is having a heart attack', 'heart_attack'),
+        ('my chest hurts, is it my heart?', 'heart_attack'),
+        ('She is CHOKING on a fish bone', 'choking'),
+        ('I burned my arm on the stove', 'burn'),
+        ('bad sunburn after the beach', 'burn'),
+        ('he fractured his wrist', 'fracture'),
+        ('allergic reaction to peanuts', 'allergic_reaction'),
+        ('how do I do cpr', 'cpr'),
+        ('my knee hurts', 'pain'),
+        ('high temperature since yesterday', 'fever'),
+        ('small cut on my finger', 'wound'),
+        ('I was cutting onions and sliced my finger', 'wound'),
+        ('burnt my hand on the pot', 'burn'),
+        ('he choked on a grape', 'choking'),
+        ('she bled for ten minutes', 'bleeding'),
+        ('bee sting allergy', 'allergic_reaction'),
+        ('injuries from a car crash', 'wound'),
+    ])
+    def test_keywords(self, message, intent):
+        """Test keywords in any case, with word endings, stems and irregular forms"""
+        assert match_intent(message)['name'] == intent
+
+    @pytest.mark.parametrize('message', ['', None, 'hello', 'we stayed at a hotel', 'execute the plan',
+                                         'I have heartburn', 'painting the fence', 'a cute puppy'])
+    def test_no_match_inside_words(self, message):
+        """Test that keywords only match at word boundaries"""
+        assert match_intent(message) is None
+
+    def test_most_urgent_intent_wins(self):
+        """Test ranking by urgency, then the full intent name, then intent order"""
+        assert match_intent('deep cut and heavy bleeding')['name'] == 'bleeding'
+        assert match_intent('bleeding after poisoning')['name'] == 'poisoning'
+        assert match_intent('reaction to a heart attack drug')['name'] == 'heart_attack'
+        assert match_intent('heart medicine caused an allergic reaction')['name'] == 'allergic_reaction'
+        assert match_intent('unconscious, start cpr')['name'] == 'unconscious'
+
+class TestResponses:
+    """Test the chatbot answers"""
+
+    def test_response_and_default(self):
+        """Test that a match answers with its intent's text and anything else with the menu"""
+        choking = next(intent for intent in INTENTS if intent['name'] == 'choking')
+        assert get_medical_emergency_response('baby is choking') == choking['response']
+        assert get_medical_emergency_response('what can you do?') == DEFAULT_RESPONSE
@@ -18,8 +18,10 @@ from database import (
     create_emergency_report, get_emergency_reports, update_report_status,
     create_message, get_messages, delete_message, like_message,
     hash_password, verify_password, get_user_by_username, get_user_by_id,
-    get_fire_departments, update_user_profile, change_user_password, delete_user_account
+    get_fire_departments, update_user_profile, change_user_password, delete_user_account,
+    get_emergency_report, build_report_query
 )
+import database
 
 class TestDatabaseConnection:
     """Test database connection functionality"""
@@ -546,5 +548,69 @@ class TestDatabasePerformance:
             assert query_time < 1.0  # Should complete within 1 second
             assert isinstance(reports, list)
 
+class TestReportQueries:
+    """Test SQL-level filtering, ordering and lookup of emergency reports"""
+
+    @pytest.fixture
+    def test_db(self):
+        """Create a test database with reports of mixed status and severity"""
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp_file:
+            db_path = tmp_file.name
+
+        with patch('database.DATABASE_PATH', db_path):
+            init_database()
+            with get_db_connection() as conn:
+                for i in range(60):
+                    conn.execute(
+                        '''INSERT INTO emergency_reports (location, severity, status, reported_at, assigned_department_id)
+                           VALUES (?, ?, ?, ?, ?)''',
+                        (f'Location {i}', ['low', 'high'][i % 2], ['reported', 'resolved', 'responding'][i % 3],
+                         f'2024-01-01 00:{i:02d}:00', 7 if i < 10 else None)
+                    )
+                conn.commit()
+            yield db_path
+
+        database.close_pools()
+        if os.path.exists(db_path):
+            os.unlink(db_path)
+
+    def test_filters_apply_before_limit(self, test_db):
+        """Test that filters are applied in SQL, not to a truncated page"""
+        with patch('database.DATABASE_PATH', test_db):
+            reports = get_emergency_reports(limit=100, status='reported', severity='high')
+            assert len(reports) == 10
+            assert all(r['status'] == 'reported' and r['severity'] == 'high' for r in reports)
+
+    def test_ordering_and_limit(self, test_db):
+        """Test newest-first default ordering and ascending order"""
+        with patch('database.DATABASE_PATH', test_db):
+            newest = get_emergency_reports(limit=3)
+            assert [r['location'] for r in newest] == ['Location 59', 'Location 58', 'Location 57']
+            oldest = get_emergency_reports(limit=2, descending=False)
+            assert [r['location'] for r in oldest] == ['Location 0', 'Location 1']
+
+    def test_time_range_and_department(self, test_db):
+        """Test since/until bounds and department filter"""
+        with patch('database.DATABASE_PATH', test_db):
+            window = get_emergency_reports(limit=None, since='2024-01-01T00:10:00', until='2024-01-01T00:20:00')
+            assert len(window) == 10
+            assert len(get_emergency_reports(limit=None, department_id=7)) == 10
+
+    def test_multiple_statuses(self, test_db):
+        """Test that a list of statuses becomes an IN filter"""
+        with patch('database.DATABASE_PATH', test_db):
+            assert len(get_emergency_reports(limit=None, status=['reported', 'responding'])) == 40
+
+    def test_single_report_lookup(self, test_db):
+        """Test lookup by id beyond the default page size"""
+        with patch('database.DATABASE_PATH', test_db):
+            assert get_emergency_report(1)['location'] == 'Location 0'
+            assert get_emergency_report(999) is None
+
+    def test_invalid_order_column_rejected(self):
+        """Test that the order column is whitelisted"""
+        with pytest.raises(ValueError):
+            build_report_query(order_by='location; DROP TABLE users')
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the SQLite connection pool
+"""
+
+import pytest
+import sys
+import os
+import sqlite3
+import tempfile
+import threading
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from db_pool import ConnectionPool, PoolTimeout, retry_on_busy
+from database import init_database, get_db_connection, get_pool, create_message, get_messages
+
+@pytest.fixture
+def db_path():
+    """Create a temporary database file"""
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp_file:
+        path = tmp_file.name
+    yield path
+    database.close_pools()
+    if os.path.exists(path):
+        os.unlink(path)
+
+def make_pool(path, **kwargs):
+    return ConnectionPool(path, lambda: sqlite3.connect(path, check_same_thread=False), **kwargs)
+
+class TestConnectionPool:
+    """Test pool checkout, reuse and limits"""
+
+    def test_connections_are_reused(self, db_path):
+        """Test that a released connection is handed out again"""
+        pool = make_pool(db_path)
+        with pool.connection() as conn:
+            first = conn._conn
+        with pool.connection() as conn:
+            assert conn._conn is first
+        assert pool.stats()['open'] == 1
+
+    def test_nested_checkout_reuses_thread_connection(self, db_path):
+        """Test that nested checkouts on one thread share a connection"""
+        pool = make_pool(db_path, max_size=1, timeout=0.1)
+        with pool.connection() as outer:
+            with pool.connection() as inner:
+                assert inner._conn is outer._conn
+            assert pool.stats()['in_use'] == 1
+        assert pool.stats()['in_use'] == 0
+
+    def test_pool_timeout_when_exhausted(self, db_path):
+        """Test that checkout times out when every connection is busy"""
+        pool = make_pool(db_path, max_size=1, timeout=0.05)
+        held = threading.Event()
+        done = threading.Event()
+
+        def hold():
+            with pool.connection():
+                held.set()
+                done.wait(2)
+
+        worker = threading.Thread(target=hold)
+        worker.start()
+        held.wait(2)
+        try:
+            with pytest.raises(PoolTimeout):
+                pool.connection()
+        finally:
+            done.set()
+            worker.join()
+
+    def test_uncommitted_work_rolled_back_on_release(self, db_path):
+        """Test that a released connection does not leak an open transaction"""
+        pool = make_pool(db_path)
+        with pool.connection() as conn:
+            conn.execute('CREATE TABLE t (x INTEGER)')
+            conn.commit()
+            conn.execute('INSERT INTO t VALUES (1)')
+        with pool.connection() as conn:
+            assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+
+    def test_unhealthy_connection_replaced(self, db_path):
+        """Test that a broken idle connection is discarded on checkout"""
+        pool = make_pool(db_path, health_check_interval=0)
+        with pool.connection() as conn:
+            broken = conn._conn
+        broken.close()
+        with pool.connection() as conn:
+            assert conn._conn is not broken
+            assert conn.execute('SELECT 1').fetchone()[0] == 1
+
+    def test_memory_database_shares_one_connection(self):
+        """Test that ':memory:' pools never open a second database"""
+        pool = make_pool(':memory:', max_size=5)
+        assert pool.max_size == 1
+
+class TestDatabasePoolIntegration:
+    """Test database.py helpers running through the pool"""
+
+    def test_helpers_use_pool_for_current_path(self, db_path):
+        """Test that database helpers check out from the pool for DATABASE_PATH"""
+        with patch('database.DATABASE_PATH', db_path):
+            init_database()
+            create_message(1, 'pooled message')
+            assert [m['content'] for m in get_messages()] == ['pooled message']
+            stats = get_pool().stats()
+            assert stats['database'] == db_path
+            assert stats['checkouts'] >= 3
+            assert stats['in_use'] == 0
+
+    def test_get_db_connection_close_returns_to_pool(self, db_path):
+        """Test that closing a legacy-style connection releases it"""
+        with patch('database.DATABASE_PATH', db_path):
+            conn = get_db_connection()
+            conn.execute('SELECT 1')
+            conn.close()
+            assert get_pool().stats()['idle'] == 1
+
+class TestBusyPolicy:
+    """Test journal mode, PRAGMA tuning and lock retry policy"""
+
+    def test_init_database_enables_wal(self, db_path):
+        """Test that init_database switches the file to WAL journaling"""
+        with patch('database.DATABASE_PATH', db_path):
+            init_database()
+            with get_db_connection() as conn:
+                assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+                assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+                assert conn.execute('PRAGMA temp_store').fetchone()[0] == 2   # MEMORY
+
+    def test_invalid_pragma_value_rejected(self):
+        """Test that PRAGMA values are validated before interpolation"""
+        conn = sqlite3.connect(':memory:')
+        with pytest.raises(ValueError):
+            database._pragma(conn, 'synchronous', 'NORMAL; DROP TABLE users')
+        conn.close()
+
+    def test_retry_on_busy_retries_locked_errors(self):
+        """Test that locked errors are retried and then succeed"""
+        calls = []
+
+        @retry_on_busy(retries=3, base_delay=0.001)
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise sqlite3.OperationalError('database is locked')
+            return 'ok'
+
+        assert flaky() == 'ok'
+        assert len(calls) == 3
+
+    def test_retry_on_busy_gives_up(self):
+        """Test that the retry budget is bounded and other errors pass through"""
+        @retry_on_busy(retries=2, base_delay=0.001)
+        def always_locked():
+            raise sqlite3.OperationalError('database is locked')
+
+        @retry_on_busy(retries=2, base_delay=0.001)
+        def syntax_error():
+            raise sqlite3.OperationalError('near "SELEC": syntax error')
+
+        with pytest.raises(sqlite3.OperationalError, match='locked'):
+            always_locked()
+        with pytest.raises(sqlite3.OperationalError, match='syntax'):
+            syntax_error()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Unit tests for offline geocoding and dispatching reports to the nearest department
+"""
+
+import pytest
+import sys
+import os
+import json
+import tempfile
+import time
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import dispatch
+from database import (init_database, get_db_connection, create_user, create_emergency_report,
+                      get_emergency_report, get_emergency_reports, get_report_changes, update_user_profile,
+                      delete_user_account)
+from geocoding import geocode, CAMEROON_TOWNS
+from dispatch import assign_department, nearest_departments
+
+@pytest.fixture
+def test_db():
+    """Create a test database with departments in Douala and Yaoundé and a reporter"""
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp_file:
+        db_path = tmp_file.name
+
+    with patch('database.DATABASE_PATH', db_path):
+        init_database()
+        douala = create_user('douala', 'douala@example.com', 'password123', 'fire_department', 'Douala',
+                             department_name='Douala Fire', department_location='Akwa, Douala')
+        yaounde = create_user('yaounde', 'yaounde@example.com', 'password123', 'fire_department', 'Yaoundé',
+                              department_name='Yaoundé Fire', department_location='Yaoundé')
+        reporter = create_user('reporter', 'reporter@example.com', 'password123', 'user', 'Reporter')
+        yield {'douala': douala, 'yaounde': yaounde, 'reporter': reporter}
+
+    database.close_pools()
+    if os.path.exists(db_path):
+        os.unlink(db_path)
+
+class TestGeocode:
+    """Test turning department locations into coordinates"""
+
+    @pytest.mark.parametrize('text, expected', [
+        ('4.05, 9.70', (4.05, 9.70)),
+        ('Douala', CAMEROON_TOWNS['Douala']),
+        ('Caserne de Bafoussam', CAMEROON_TOWNS['Bafoussam']),
+        ('Ngaoundere', CAMEROON_TOWNS['Ngaoundéré']),
+    ])
+    def test_known_places(self, text, expected):
+        """Test coordinates, town names, generic words and accents"""
+        assert geocode(text) == pytest.approx(expected)
+
+    @pytest.mark.parametrize('text', ['', None, 'Central', '95, 10', 'Fire Station'])
+    def test_unplaceable(self, text):
+        """Test that unknown, generic and out of range locations are not placed"""
+        assert geocode(text) is None
+
+    def test_prefers_the_closest_place(self):
+        """Test that a named station beats the town it is in, and ties are refused"""
+        places = [('Akwa Fire Station', 4.05, 9.70), ('Bonaberi Fire Station', 4.07, 9.68)]
+        assert geocode('Akwa, Douala', places) == (4.05, 9.70)
+        assert geocode('Akwa Bonaberi', places) is None
+
+class TestDepartmentCoordinates:
+    """Test that department coordinates are stored when a location is saved"""
+
+    def test_create_and_update(self, test_db):
+        """Test geocoding on sign-up and on profile edits"""
+        with get_db_connection() as conn:
+            row = conn.execute('SELECT department_latitude, department_longitude FROM users WHERE id = ?',
+                               (test_db['yaounde'],)).fetchone()
+        assert tuple(row) == pytest.approx(CAMEROON_TOWNS['Yaoundé'])
+
+        update_user_profile(test_db['yaounde'], 'Yaoundé', 'yaounde@example.com', 'yaounde',
+                            department_name='Yaoundé Fire', department_location='Nowhere in particular')
+        with get_db_connection() as conn:
+            row = conn.execute('SELECT department_latitude FROM users WHERE id = ?', (test_db['yaounde'],)).fetchone()
+        assert row[0] is None
+
+class TestAssignment:
+    """Test choosing a department for new reports"""
+
+    def test_nearest_department(self, test_db):
+        """Test that reports go to the closest department and reports without coordinates stay unassigned"""
+        bonaberi = create_emergency_report(test_db['reporter'], 'Bonaberi', 'Fire', 'high', latitude=4.07, longitude=9.68)
+        mvog_mbi = create_emergency_report(test_db['reporter'], 'Mvog-Mbi', 'Fire', 'high', latitude=3.86, longitude=11.51)
+        unknown = create_emergency_report(test_db['reporter'], 'Somewhere', 'Fire', 'high')
+        assert get_emergency_report(bonaberi)['assigned_department_id'] == test_db['douala']
+        assert get_emergency_report(mvog_mbi)['assigned_department_id'] == test_db['yaounde']
+        assert get_emergency_report(unknown)['assigned_department_id'] is None
+
+        nearest = nearest_departments(4.07, 9.68, k=2)
+        assert [d['id'] for d in nearest] == [test_db['douala'], test_db['yaounde']]
+        assert nearest[0]['distance_km'] < 10 < nearest[1]['distance_km']
+
+    def test_skips_full_departments(self, test_db):
+        """Test that a department at its open report limit is passed over"""
+        with patch('dispatch.DISPATCH_MAX_OPEN_REPORTS', 1):
+            first = create_emergency_report(test_db['reporter'], 'A', 'Fire', 'high', latitude=4.07, longitude=9.68)
+            second = create_emergency_report(test_db['reporter'], 'B', 'Fire', 'high', latitude=4.07, longitude=9.68)
+            assert get_emergency_report(first)['assigned_department_id'] == test_db['douala']
+            assert get_emergency_report(second)['assigned_department_id'] == test_db['yaounde']
+            assert assign_department(4.07, 9.68) is None
+
+    def test_over_budget_leaves_report_unassigned(self, test_db):
+        """Test that the open report count is skipped once the time budget is spent"""
+        with patch('dispatch.DISPATCH_MAX_OPEN_REPORTS', 1), patch('dispatch._open_report_counts') as counts:
+            with patch('dispatch.DISPATCH_BUDGET_MS', 1e-9):
+                report_id = create_emergency_report(test_db['reporter'], 'A', 'Fire', 'high',
+                                                    latitude=4.07, longitude=9.68)
+                assert get_emergency_report(report_id)['assigned_department_id'] is None
+                counts.assert_not_called()
+            with patch('dispatch.DISPATCH_BUDGET_MS', 0):
+                counts.return_value = {}
+                assert assign_department(4.07, 9.68) == test_db['douala']
+
+    def test_index_follows_department_changes(self, test_db):
+        """Test that new and deactivated departments are seen by the next assignment"""
+        assert assign_department(4.16, 9.24) == test_db['douala']
+        buea = create_user('buea', 'buea@example.com', 'password123', 'fire_department', 'Buea',
+                           department_name='Buea Fire', department_location='Buea')
+        assert assign_department(4.16, 9.24) == buea
+        delete_user_account(buea)
+        assert assign_department(4.16, 9.24) == test_db['douala']
+
+    def test_citizen_changes_keep_the_index(self, test_db):
+        """Test that only fire department changes rebuild the index"""
+        index = dispatch.get_department_index()
+        citizen = create_user('citizen', 'citizen@example.com', 'password123', 'user', 'Citizen')
+        update_user_profile(citizen, 'Citizen', 'citizen@example.com', 'citizen2')
+        database.change_user_password(citizen, 'password456')
+        delete_user_account(citizen)
+        assert dispatch.get_department_index() is index
+
+        update_user_profile(test_db['yaounde'], 'Yaoundé', 'yaounde@example.com', 'yaounde',
+                            department_name='Yaoundé Fire', department_location='Bafoussam')
+        assert dispatch.get_department_index() is not index
+
+    def test_index_rebuild_not_charged_to_budget(self, test_db):
+        """Test that a slow rebuild after a department change does not leave the next report unassigned"""
+        build = dispatch._build_index
+
+        def slow_build():
+            time.sleep(0.05)
+            return build()
+
+        dispatch._indexes.clear()
+        with patch('dispatch.DISPATCH_MAX_OPEN_REPORTS', 1), patch('dispatch.DISPATCH_BUDGET_MS', 20), \
+                patch('dispatch._build_index', slow_build):
+            assert assign_department(4.07, 9.68) == test_db['douala']
+
+    def test_failure_leaves_report_unassigned(self, test_db):
+        """Test that a dispatch error does not lose the report"""
+        with patch('dispatch.nearest_departments', side_effect=RuntimeError('boom')):
+            report_id = create_emergency_report(test_db['reporter'], 'A', 'Fire', 'high', latitude=4.07, longitude=9.68)
+        assert get_emergency_report(report_id)['assigned_department_id'] is None
+
+class TestDepartmentFeeds:
+    """Test that each department's dashboard shows its own and unassigned reports"""
+
+    @pytest.fixture
+    def reports(self, test_db):
+        return {
+            'douala': create_emergency_report(test_db['reporter'], 'A', 'Fire', 'high', latitude=4.07, longitude=9.68),
+            'yaounde': create_emergency_report(test_db['reporter'], 'B', 'Fire', 'high', latitude=3.86, longitude=11.51),
+            'unassigned': create_emergency_report(test_db['reporter'], 'C', 'Fire', 'high'),
+        }
+
+    def test_queries(self, test_db, reports):
+        """Test department filtering with and without unassigned reports"""
+        own = get_emergency_reports(department_id=test_db['douala'])
+        assert [r['id'] for r in own] == [reports['douala']]
+        feed = get_emergency_reports(department_id=test_db['douala'], include_unassigned=True)
+        assert sorted(r['id'] for r in feed) == sorted([reports['douala'], reports['unassigned']])
+        changes = get_report_changes(department_id=test_db['yaounde'], include_unassigned=True)
+        assert [r['id'] for r in changes['reports']] == [reports['yaounde'], reports['unassigned']]
+
+    def test_dashboard_and_poller(self, test_db, reports):
+        """Test the dashboard page and the ?department_id=me poller"""
+        from app import create_app
+        with create_app({'TESTING': True}).test_client() as client:
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(test_db['douala'])
+            page = client.get('/fire-department-dashboard').data
+            assert f'data-report-id="{reports["douala"]}"'.encode() in page
+            assert f'data-report-id="{reports["yaounde"]}"'.encode() not in page
+
+            data = json.loads(client.get('/fire-department/reports/changes?department_id=me').data)
+            assert [r['id'] for r in data['reports']] == [reports['douala'], reports['unassigned']]
+            assert client.get('/fire-department/reports/changes?department_id=x').status_code == 400
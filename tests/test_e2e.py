@@ -20,7 +20,7 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app import app
+from app import create_app
 from database import init_database
 
 # Test configuration
@@ -30,8 +30,7 @@ SELENIUM_TIMEOUT = 10
 @pytest.fixture(scope="session")
 def test_server():
     """Start test server for E2E tests"""
-    app.config['TESTING'] = True
-    app.config['DATABASE'] = ':memory:'
+    app = create_app({'TESTING': True, 'DATABASE': ':memory:'})
     
     # Initialize database
     with app.app_context():
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the event broker and the Server-Sent Events chat stream
+"""
+
+import pytest
+import sys
+import os
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import events
+from events import EventBroker, SQLiteEventBackend, format_sse, stream_events
+from database import init_database, create_user, create_message, delete_message, like_message
+
+@pytest.fixture
+def broker():
+    """Create a fresh broker"""
+    return EventBroker(history_size=10)
+
+@pytest.fixture
+def test_db():
+    """Create a test database with one user"""
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp_file:
+        db_path = tmp_file.name
+
+    with patch('database.DATABASE_PATH', db_path):
+        init_database()
+        user_id = create_user('chatter', 'chatter@example.com', 'password123', 'user', 'Chatter')
+        yield user_id
+
+    database.close_pools()
+    if os.path.exists(db_path):
+        os.unlink(db_path)
+
+def drain(subscription):
+    """Collect every queued event without blocking"""
+    received = []
+    while (event := subscription.get(timeout=0)) is not None:
+        received.append(event)
+    return received
+
+class TestEventBroker:
+    """Test publish/subscribe fan-out and replay"""
+
+    def test_fan_out_to_matching_topics(self, broker):
+        """Test that each subscriber only receives its topics, in order"""
+        chat = broker.subscribe(['message.created'])
+        everything = broker.subscribe(['message.created', 'message.deleted'])
+        broker.publish('message.created', {'id': 1})
+        broker.publish('message.deleted', {'id': 1})
+        broker.publish('message.created', {'id': 2})
+        assert [e.data['id'] for e in drain(chat)] == [1, 2]
+        assert [e.topic for e in drain(everything)] == ['message.created', 'message.deleted', 'message.created']
+
+    def test_predicate_filters_events(self, broker):
+        """Test that a subscription predicate filters event payloads"""
+        subscription = broker.subscribe(['report'], predicate=lambda e: e.data['severity'] == 'high')
+        broker.publish('report', {'severity': 'low'})
+        broker.publish('report', {'severity': 'high'})
+        assert [e.data for e in drain(subscription)] == [{'severity': 'high'}]
+
+    def test_replay_after_last_event_id(self, broker):
+        """Test that reconnecting with Last-Event-ID replays only later events"""
+        published = [broker.publish('message.created', {'id': i}) for i in range(5)]
+        subscription = broker.subscribe(['message.created'], last_event_id=published[1].id)
+        assert [e.data['id'] for e in drain(subscription)] == [2, 3, 4]
+        assert not subscription.missed
+
+    def test_replay_from_latest_is_empty(self, broker):
+        """Test that a client already up to date gets nothing replayed"""
+        latest = broker.publish('message.created', {'id': 1})
+        subscription = broker.subscribe(['message.created'], last_event_id=latest.id)
+        assert drain(subscription) == []
+        assert not subscription.missed
+
+    @pytest.mark.parametrize('last_event_id', ['0:1', 'garbage', 'EPOCH:999'])
+    def test_unknown_position_requests_resync(self, broker, last_event_id):
+        """Test that another epoch, a malformed id or a future id marks the subscription missed"""
+        broker.publish('message.created', {'id': 1})
+        subscription = broker.subscribe(['message.created'], last_event_id=last_event_id.replace('EPOCH', broker.epoch))
+        assert subscription.missed
+
+    def test_evicted_history_requests_resync(self, broker):
+        """Test that an id older than the replay buffer marks the subscription missed"""
+        first = broker.publish('message.created', {'id': 0})
+        for i in range(1, 15):
+            broker.publish('message.created', {'id': i})
+        assert broker.subscribe(['message.created'], last_event_id=first.id).missed
+
+    def test_slow_consumer_overflow(self, broker):
+        """Test that a full queue drops events and flags the subscriber instead of blocking"""
+        with patch('events.SUBSCRIBER_QUEUE_SIZE', 2):
+            subscription = broker.subscribe(['message.created'])
+        for i in range(5):
+            broker.publish('message.created', {'id': i})
+        assert len(drain(subscription)) == 2
+        assert subscription.missed
+
+    def test_close_unsubscribes(self, broker):
+        """Test that closing a subscription stops delivery"""
+        with broker.subscribe(['message.created']) as subscription:
+            assert broker.subscriber_count == 1
+        assert broker.subscriber_count == 0
+        broker.publish('message.created', {'id': 1})
+        assert drain(subscription) == []
+
+class TestSSEFormatting:
+    """Test SSE frame serialization and the stream generator"""
+
+    def test_event_frame(self, broker):
+        """Test that an event frame carries id, event type and JSON data"""
+        event = broker.publish('message.liked', {'id': 3, 'likes': 7})
+        frame = format_sse(event)
+        assert frame == f'id: {event.id}\nevent: message.liked\ndata: {{"id": 3, "likes": 7}}\n\n'
+
+    def test_comment_frame(self):
+        """Test that comments are emitted as keepalives"""
+        assert format_sse(comment='keepalive') == ': keepalive\n\n'
+
+    def test_stream_sends_resync_event_and_heartbeat(self, broker):
+        """Test that the stream announces missed events and heartbeats when idle"""
+        subscription = broker.subscribe(['message.created'], last_event_id='stale:1')
+        stream = stream_events(subscription, heartbeat=0.01)
+        assert next(stream).startswith('retry:')
+        assert next(stream).startswith('event: resync')
+        assert next(stream) == ': keepalive\n\n'
+        stream.close()
+        assert subscription.closed and broker.subscriber_count == 0
+
+    def test_broker_close_ends_open_streams(self, broker):
+        """Test that closing the broker (worker shutdown) ends a stream blocked waiting for events"""
+        frames = stream_events(broker.subscribe(['message.created']), heartbeat=30)
+        assert next(frames).startswith('retry:')
+        threading.Timer(0.1, broker.close).start()
+        started = time.monotonic()
+        assert list(frames) == []
+        assert time.monotonic() - started < 5
+        assert broker.subscriber_count == 0
+
+class TestMessageEvents:
+    """Test that chat writes publish events and the endpoint streams them"""
+
+    def test_message_writes_publish_events(self, test_db):
+        """Test created, liked and deleted messages reach subscribers"""
+        with patch('database.broker', EventBroker()) as test_broker:
+            subscription = test_broker.subscribe(['message.created', 'message.liked', 'message.deleted'])
+            message_id = create_message(test_db, 'Smoke on Main St')
+            like_message(message_id)
+            delete_message(message_id, test_db)
+            received = drain(subscription)
+        assert [e.topic for e in received] == ['message.created', 'message.liked', 'message.deleted']
+        assert received[0].data['content'] == 'Smoke on Main St'
+        assert received[0].data['full_name'] == 'Chatter'
+        assert received[1].data == {'id': message_id, 'likes': 1}
+
+    def test_stream_endpoint_replays_missed_messages(self, test_db):
+        """Test that /messages/stream resumes from Last-Event-ID"""
+        from app import app
+        app.config['TESTING'] = True
+        first = create_message(test_db, 'first')
+        last_seen = events.broker._history[-1].id
+        create_message(test_db, 'second')
+
+        with app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(test_db)
+            response = client.get('/messages/stream', headers={'Last-Event-ID': last_seen})
+            assert response.status_code == 200
+            assert response.mimetype == 'text/event-stream'
+            chunks = response.response
+            assert next(chunks).startswith(b'retry:')
+            frame = next(chunks).decode()
+            response.close()
+
+        assert 'event: message.created' in frame
+        payload = json.loads(frame.split('data: ', 1)[1])
+        assert payload['content'] == 'second' and payload['id'] == first + 1
+
+    def test_stream_requires_login(self, test_db):
+        """Test that anonymous clients cannot open the stream"""
+        from app import app
+        app.config['TESTING'] = True
+        with app.test_client() as client:
+            response = client.get('/messages/stream')
+        assert response.status_code in (302, 401)
+
+class TestReportEvents:
+    """Test report events and the fire department stream"""
+
+    def test_report_writes_publish_events(self, test_db):
+        """Test that creating and updating a report publishes the full report"""
+        with patch('database.broker', EventBroker()) as test_broker:
+            subscription = test_broker.subscribe(['report.created', 'report.updated'])
+            report_id = database.create_emergency_report(test_db, 'Main St', 'Smoke', 'critical')
+            database.update_report_status(report_id, 'responding', 99)
+            database.update_report_status(12345, 'resolved')
+            received = drain(subscription)
+        assert [e.topic for e in received] == ['report.created', 'report.updated']
+        assert received[0].data['location'] == 'Main St'
+        assert received[0].data['reporter_name'] == 'Chatter'
+        assert received[1].data['status'] == 'responding'
+        assert received[1].data['assigned_department_id'] == 99
+
+    def test_report_filter(self, broker):
+        """Test severity and department filtering, keeping unassigned reports"""
+        from app import report_event_filter
+        predicate = report_event_filter({'high', 'critical'}, 7)
+        subscription = broker.subscribe(['report.created'], predicate=predicate)
+        for data in [{'id': 1, 'severity': 'low', 'assigned_department_id': None},
+                     {'id': 2, 'severity': 'high', 'assigned_department_id': None},
+                     {'id': 3, 'severity': 'critical', 'assigned_department_id': 8},
+                     {'id': 4, 'severity': 'critical', 'assigned_department_id': 7}]:
+            broker.publish('report.created', data)
+        assert [e.data['id'] for e in drain(subscription)] == [2, 4]
+
+    def test_stream_endpoint_filters_replay(self, test_db):
+        """Test that /fire-department/stream replays only matching reports"""
+        from app import app
+        app.config['TESTING'] = True
+        department = create_user('dept', 'dept@example.com', 'password123', 'fire_department', 'Dept')
+        database.create_emergency_report(test_db, 'Seen', 'desc', 'low')
+        last_seen = events.broker._history[-1].id
+        database.create_emergency_report(test_db, 'Minor', 'desc', 'low')
+        critical = database.create_emergency_report(test_db, 'Fire', 'desc', 'critical')
+
+        with app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(department)
+            response = client.get('/fire-department/stream?severity=critical',
+                                  headers={'Last-Event-ID': last_seen})
+            chunks = response.response
+            next(chunks)
+            frame = next(chunks).decode()
+            response.close()
+
+        assert 'event: report.created' in frame
+        assert json.loads(frame.split('data: ', 1)[1])['id'] == critical
+
+    def test_stream_endpoint_rejects_regular_users(self, test_db):
+        """Test that only fire departments may subscribe to reports"""
+        from app import app
+        app.config['TESTING'] = True
+        with app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(test_db)
+            assert client.get('/fire-department/stream').status_code == 403
+
+class TestSQLiteEventBackend:
+    """Test fan-out across workers through the shared event log"""
+
+    @pytest.fixture
+    def log_path(self):
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp_file:
+            path = tmp_file.name
+        yield path
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.unlink(path + suffix)
+
+    def test_events_reach_every_worker(self, log_path):
+        """Test that an event published by one broker is delivered by all, with the same id"""
+        workers = [EventBroker(backend=SQLiteEventBackend(log_path, poll_interval=0.05)) for _ in range(2)]
+        try:
+            subscriptions = [worker.subscribe(['report.created']) for worker in workers]
+            started = time.monotonic()
+            workers[0].publish('report.created', {'id': 1})
+            received = [subscription.get(timeout=2) for subscription in subscriptions]
+            assert time.monotonic() - started < 1
+            assert [e.data for e in received] == [{'id': 1}, {'id': 1}]
+            assert received[0].id == received[1].id
+        finally:
+            for worker in workers:
+                worker.close()
+
+    def test_replay_against_another_worker(self, log_path):
+        """Test that Last-Event-ID from one worker replays on a worker started later"""
+        first = EventBroker(backend=SQLiteEventBackend(log_path, poll_interval=0.05))
+        try:
+            subscription = first.subscribe(['message.created'])
+            for i in range(3):
+                first.publish('message.created', {'id': i})
+            last_seen = subscription.get(timeout=2).id
+        finally:
+            first.close()
+
+        second = EventBroker(backend=SQLiteEventBackend(log_path, poll_interval=0.05))
+        try:
+            resumed = second.subscribe(['message.created'], last_event_id=last_seen)
+            assert not resumed.missed
+            assert [e.data['id'] for e in drain(resumed)] == [1, 2]
+        finally:
+            second.close()
+
+    def test_listeners_hear_other_workers(self, log_path):
+        """Test that a listener started in one worker is called for another worker's event"""
+        workers = [EventBroker(backend=SQLiteEventBackend(log_path, poll_interval=0.05)) for _ in range(2)]
+        heard = threading.Event()
+        try:
+            workers[1].listen(['user.changed'], lambda event: heard.set())
+            workers[1].start()
+            workers[0].publish('user.changed', {'id': 1})
+            assert heard.wait(timeout=2)
+        finally:
+            for worker in workers:
+                worker.close()
+
+    def test_log_opened_on_first_use(self, log_path, tmp_path):
+        """Test that the sqlite broker touches no database until used, then uses the current DATABASE_PATH"""
+        unused = str(tmp_path / 'unused.db')
+        with patch('database.DATABASE_PATH', unused), patch.dict(os.environ, {'EVENT_LOG_PATH': ''}):
+            lazy = events.create_broker('sqlite')
+            lazy.listen(['user.changed'], lambda event: None)
+            assert not os.path.exists(unused)
+            with patch('database.DATABASE_PATH', log_path):
+                lazy.start()
+                lazy.publish('user.changed', {'id': 1})
+        try:
+            assert not os.path.exists(unused)
+            with sqlite3.connect(log_path) as conn:
+                assert conn.execute('SELECT topic FROM event_log').fetchall() == [('user.changed',)]
+        finally:
+            lazy.close()
+
+    def test_unknown_backend_rejected(self):
+        """Test that a misconfigured EVENT_BACKEND fails loudly"""
+        with pytest.raises(ValueError):
+            events.create_broker('redis')
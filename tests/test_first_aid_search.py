@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the first aid index (lookup, filters, BM25 search) and its endpoints
+"""
+
+import pytest
+import sys
+import os
+import tempfile
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import init_database, create_user
+from app import FIRST_AID_PRACTICES
+from first_aid_search import FirstAidIndex, tokenize, within_edits
+
+@pytest.fixture(scope='module')
+def index():
+    return FirstAidIndex(FIRST_AID_PRACTICES)
+
+def titles(results):
+    return [practice['title'] for _, practice in results]
+
+class TestTokenize:
+    """Test turning text into search terms"""
+
+    def test_terms(self):
+        """Test lowercasing, accents, stopwords and plural endings"""
+        assert tokenize('My Dad has BURNS and bruises, café') == ['dad', 'burn', 'bruise', 'cafe']
+        assert tokenize('unconscious, no pulse') == ['unconscious', 'no', 'pulse']
+        assert tokenize(None) == []
+
+    @pytest.mark.parametrize('a, b, limit, expected', [
+        ('seizure', 'seizure', 0, True),
+        ('siezure', 'seizure', 1, True),
+        ('burm', 'burn', 1, True),
+        ('choking', 'chokin', 1, True),
+        ('kitten', 'sitting', 2, False),
+        ('kitten', 'sitting', 3, True),
+        ('cpr', 'burn', 1, False),
+    ])
+    def test_within_edits(self, a, b, limit, expected):
+        """Test edit distance, counting a swap of neighbouring letters as one edit"""
+        assert within_edits(a, b, limit) is expected
+
+class TestFirstAidIndex:
+    """Test lookups and ranked search"""
+
+    def test_get_and_filter(self, index):
+        """Test id lookup and category/difficulty filters"""
+        assert index.get(3)['title'] == 'Burn Treatment'
+        assert index.get(999) is None
+        beginner = index.filter(difficulty='Beginner')
+        assert beginner == [p for p in FIRST_AID_PRACTICES if p['difficulty'] == 'Beginner']
+        cardiac = index.filter(category='Cardiac Emergency')
+        assert [p['id'] for p in cardiac] == [1]
+        assert index.filter(category='Cardiac Emergency', difficulty='Beginner') == []
+        assert index.filter() == FIRST_AID_PRACTICES
+
+    @pytest.mark.parametrize('query, title', [
+        ('burns', 'Burn Treatment'),
+        ('my dad is having a heart attack', 'CPR (Cardiopulmonary Resuscitation)'),
+        ('allergic reaction to peanuts', 'Allergic Reaction Response'),
+        ('broken arm', 'Fracture Management'),
+        ('seiz', 'Seizure Response'),
+        ('siezure', 'Seizure Response'),
+        ('anaphilaxis', 'Allergic Reaction Response'),
+    ])
+    def test_best_match(self, index, query, title):
+        """Test exact, prefix and misspelt queries"""
+        assert titles(index.search(query))[0] == title
+
+    def test_ranking(self, index):
+        """Test that scores fall, more matching terms rank higher and unknown words match nothing"""
+        results = index.search('bleeding cuts pressure', limit=3)
+        assert titles(results)[0] == 'Wound Care and Bleeding Control'
+        assert [score for score, _ in results] == sorted((score for score, _ in results), reverse=True)
+        assert index.search('cooling')[0][0] < index.search('cooling heat')[0][0]
+        assert index.search('hello there') == []
+        assert len(index.search('cooling', limit=1)) == 1
+
+class TestFirstAidEndpoints:
+    """Test /api/v1/first-aid/search, the first aid pages and chatbot guide links"""
+
+    @pytest.fixture
+    def test_db(self):
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp_file:
+            db_path = tmp_file.name
+        with patch('database.DATABASE_PATH', db_path):
+            init_database()
+            yield create_user('reader', 'reader@example.com', 'password123', 'user', 'Reader')
+        database.close_pools()
+        os.unlink(db_path)
+
+    @pytest.fixture
+    def client(self, test_db):
+        from app import create_app
+        with create_app({'TESTING': True}).test_client() as client:
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(test_db)
+            yield client
+
+    def test_search(self, client):
+        """Test search results with scores"""
+        response = client.get('/api/v1/first-aid/search?q=choking&limit=2')
+        assert response.status_code == 200
+        data = response.get_json()['data']
+        assert data['first_aid_practices'][0]['title'] == 'Choking Relief (Heimlich Maneuver)'
+        assert data['first_aid_practices'][0]['score'] > 0 and data['total_count'] <= 2
+
+    @pytest.mark.parametrize('query', ['', 'q=', 'q=burn&limit=0', 'q=burn&limit=x'])
+    def test_invalid_search(self, client, query):
+        """Test that a missing query or bad limit is a 400"""
+        assert client.get(f'/api/v1/first-aid/search?{query}').status_code == 400
+
+    def test_detail_page(self, client):
+        """Test that guide pages are looked up by id"""
+        assert client.get('/first-aid/5').status_code == 200
+        assert client.get('/first-aid/999').status_code == 302
+
+    def test_chatbot_links_guides(self, client):
+        """Test that chatbot answers link the matching guides"""
+        response = client.post('/medical-chatbot', json={'message': 'someone is choking'})
+        guides = response.get_json()['guides']
+        assert guides[0] == {'id': 2, 'title': 'Choking Relief (Heimlich Maneuver)', 'url': '/first-aid/2'}
+        assert client.post('/medical-chatbot', json={'message': 'hello'}).get_json()['guides'] == []
+
+    @pytest.mark.parametrize('message, titles', [
+        ('thank you for the help', []),
+        ('help', []),
+        ('broken arm', ['Fracture Management']),
+    ])
+    def test_chatbot_guides_need_a_strong_match(self, client, message, titles):
+        """Test that without a recognised emergency only strong search matches are linked"""
+        guides = client.post('/medical-chatbot', json={'message': message}).get_json()['guides']
+        assert [guide['title'] for guide in guides] == titles
+
+    def test_fallback_index_built_once(self):
+        """Test that the API reuses one fallback index when create_app did not build one"""
+        from flask import Flask
+        from api_endpoints import get_first_aid_index
+        bare = Flask(__name__)
+        with bare.app_context():
+            index = get_first_aid_index()
+            assert get_first_aid_index() is index
+        assert get_first_aid_index() is get_first_aid_index()
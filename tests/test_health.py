@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the background system health score
+"""
+
+import pytest
+import sys
+import os
+import tempfile
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import init_database, create_user, create_emergency_report, update_report_status
+from health import HealthMonitor, compute_health_score
+
+@pytest.fixture
+def test_db():
+    """Create a test database"""
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp_file:
+        db_path = tmp_file.name
+
+    with patch('database.DATABASE_PATH', db_path):
+        init_database()
+        yield db_path
+
+    database.close_pools()
+    if os.path.exists(db_path):
+        os.unlink(db_path)
+
+@pytest.fixture
+def monitor():
+    """A health monitor whose refresh thread never runs on its own"""
+    monitor = HealthMonitor()
+    with patch.object(monitor, 'start'):
+        yield monitor
+
+class TestHealthScore:
+    """Test the health score and its refresh"""
+
+    def test_score_impacts_are_capped(self):
+        """Test that emergencies and user load each lower the score by a bounded amount"""
+        assert compute_health_score(0, 0) == 95
+        assert compute_health_score(5, 4) == 83
+        assert compute_health_score(1000, 1000) == 55
+
+    def test_refresh_counts_open_emergencies(self, test_db, monitor):
+        """Test that only reported and responding emergencies affect the score"""
+        user_id = create_user('reporter', 'reporter@example.com', 'password123', 'user', 'Reporter')
+        report_ids = [create_emergency_report(user_id, 'Main St', 'Fire', 'high') for _ in range(3)]
+        update_report_status(report_ids[0], 'resolved')
+        with patch('health.sessions.active_users', 0):
+            assert monitor.refresh() == 91
+        assert monitor.snapshot()['open_emergencies'] == 2
+        assert monitor.snapshot()['total_emergency_reports'] == 3
+
+    def test_snapshot_does_not_query(self, test_db, monitor):
+        """Test that reading the score never touches the database"""
+        monitor.refresh()
+        with patch('database.get_stat_counters', side_effect=AssertionError('database read')):
+            assert monitor.snapshot()['system_health_score'] == monitor.score
+
+    def test_requests_do_no_health_work(self, test_db):
+        """Test that ordinary requests neither refresh the score nor read metrics"""
+        from app import app
+        app.config['TESTING'] = True
+        with patch('health.HealthMonitor.refresh', side_effect=AssertionError('refreshed')), \
+                app.test_client() as client:
+            assert client.get('/login').status_code == 200
+            assert client.get('/health').status_code == 200
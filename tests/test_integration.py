@@ -16,15 +16,15 @@ from unittest.mock import patch, MagicMock
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app import app
+from app import app, create_app
+import database
 from database import init_database, get_db_connection, create_user, create_emergency_report
 from auth import hash_password, generate_api_key
 
 @pytest.fixture
 def test_app():
     """Create test application with isolated database"""
-    app.config['TESTING'] = True
-    app.config['DATABASE'] = ':memory:'
+    app = create_app({'TESTING': True, 'DATABASE': ':memory:'})
     
     with app.test_client() as client:
         with app.app_context():
@@ -33,6 +33,7 @@ def test_app():
             create_user('testuser', 'password123', 'test@example.com', 'regular')
             create_user('fireuser', 'password123', 'fire@example.com', 'fire_department')
         yield client
+    database.close_pools()
 
 @pytest.fixture
 def api_headers():
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the email outbox and background mailer
+"""
+
+import pytest
+import sys
+import os
+import smtplib
+import socketserver
+import tempfile
+import threading
+import time
+from functools import partial
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import mailer
+from mailer import Mailer, SMTPSession, queue_email, start_mailer
+from database import init_database, get_db_connection, claim_outbox_emails, get_outbox_counts
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Minimal local SMTP server recording what it receives"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.messages = []
+        self.connections = 0
+        self.drop_after = None  # close the connection after this many messages
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.server.connections += 1
+        received = 0
+        self.reply('220 stand-in ready')
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                return
+            command = line.split(' ', 1)[0].upper()
+            if command in ('EHLO', 'HELO'):
+                self.reply('250 stand-in')
+            elif command == 'RCPT' and 'reject' in line:
+                self.reply('550 no such user')
+            elif command in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 go ahead')
+                data = []
+                while (body_line := self.rfile.readline().decode()) not in ('.\r\n', ''):
+                    data.append(body_line)
+                self.server.messages.append(''.join(data))
+                self.reply('250 queued')
+                received += 1
+                if self.server.drop_after and received >= self.server.drop_after:
+                    return
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('502 not implemented')
+
+@pytest.fixture
+def smtp_server():
+    """Run an SMTP stand-in on a free local port"""
+    server = SMTPStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def test_db():
+    """Create a test database"""
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp_file:
+        db_path = tmp_file.name
+
+    with patch('database.DATABASE_PATH', db_path), patch('mailer.MAILER_ENABLED', False):
+        init_database()
+        yield db_path
+
+    database.close_pools()
+    if os.path.exists(db_path):
+        os.unlink(db_path)
+
+def connect_to(server):
+    """SMTP connect function for the stand-in (no TLS or login)"""
+    return partial(smtplib.SMTP, '127.0.0.1', server.port, timeout=5)
+
+def outbox():
+    with get_db_connection() as conn:
+        return {row['id']: dict(row) for row in conn.execute('SELECT * FROM email_outbox')}
+
+class TestOutboxDelivery:
+    """Test batch delivery over a reused SMTP session"""
+
+    def test_batch_reuses_one_connection(self, test_db, smtp_server):
+        """Test that a batch is sent over a single SMTP session"""
+        ids = [queue_email(f'user{i}@example.com', f'Report #{i}', 'text', '<p>html</p>') for i in range(3)]
+        session = SMTPSession(connect_to(smtp_server))
+        assert Mailer(connect=connect_to(smtp_server)).process_batch(session) == 3
+        session.close()
+
+        assert smtp_server.connections == 1
+        assert len(smtp_server.messages) == 3
+        assert 'Subject: Report #0' in smtp_server.messages[0]
+        assert all(email['status'] == 'sent' for email in outbox().values())
+        assert sorted(outbox()) == ids
+
+    def test_rejected_recipient_is_dead_lettered(self, test_db, smtp_server):
+        """Test that a permanent failure is dead-lettered without blocking the batch"""
+        bad = queue_email('reject@example.com', 'Subject', 'text')
+        good = queue_email('ok@example.com', 'Subject', 'text')
+        Mailer().process_batch(SMTPSession(connect_to(smtp_server)))
+
+        emails = outbox()
+        assert emails[bad]['status'] == 'dead' and '550' in emails[bad]['last_error']
+        assert emails[good]['status'] == 'sent'
+
+    def test_transient_failure_backs_off_then_dead_letters(self, test_db):
+        """Test retry scheduling and dead-lettering after the last attempt"""
+        email_id = queue_email('user@example.com', 'Subject', 'text')
+
+        def refuse():
+            raise ConnectionRefusedError('mail server down')
+
+        worker = Mailer(connect=refuse)
+        worker.process_batch(SMTPSession(refuse))
+        email = outbox()[email_id]
+        assert email['status'] == 'pending' and email['attempts'] == 1
+        assert email['next_attempt_at'] > email['created_at']
+        assert claim_outbox_emails(10, 300) == []  # not due yet
+
+        with get_db_connection() as conn:
+            conn.execute('UPDATE email_outbox SET next_attempt_at = CURRENT_TIMESTAMP')
+            conn.commit()
+        with patch('mailer.MAILER_MAX_ATTEMPTS', 2):
+            worker.process_batch(SMTPSession(refuse))
+        assert outbox()[email_id]['status'] == 'dead'
+        assert get_outbox_counts() == {'dead': 1}
+
+    def test_retry_delay_doubles_up_to_cap(self):
+        """Test the exponential backoff schedule"""
+        with patch('mailer.MAILER_BASE_DELAY', 10), patch('mailer.MAILER_MAX_DELAY', 50):
+            assert [mailer.retry_delay(n) for n in range(1, 5)] == [10, 20, 40, 50]
+
+    def test_abandoned_claims_are_reclaimed(self, test_db):
+        """Test that emails stuck in 'sending' past the lease are claimed again"""
+        email_id = queue_email('user@example.com', 'Subject', 'text')
+        assert [e['id'] for e in claim_outbox_emails(10, 300)] == [email_id]
+        assert claim_outbox_emails(10, 300) == []
+        with get_db_connection() as conn:
+            conn.execute("UPDATE email_outbox SET claimed_at = datetime('now', '-10 minutes')")
+            conn.commit()
+        reclaimed = claim_outbox_emails(10, 300)
+        assert [e['id'] for e in reclaimed] == [email_id] and reclaimed[0]['attempts'] == 2
+
+    def test_session_reconnects_after_server_disconnect(self, test_db, smtp_server):
+        """Test that a dropped session is reopened and the email still goes out"""
+        smtp_server.drop_after = 1
+        for i in range(2):
+            queue_email(f'user{i}@example.com', 'Subject', 'text')
+        Mailer().process_batch(SMTPSession(connect_to(smtp_server)))
+        assert len(smtp_server.messages) == 2
+        assert smtp_server.connections == 2
+        assert get_outbox_counts() == {'sent': 2}
+
+class TestMailerWorkers:
+    """Test the background worker pool end to end"""
+
+    def test_workers_deliver_queued_email(self, test_db, smtp_server):
+        """Test that queue_email wakes the workers and the email is delivered"""
+        workers = Mailer(workers=2, poll_interval=0.05, connect=connect_to(smtp_server))
+        with patch('mailer.mailer', workers), patch('mailer.MAILER_ENABLED', True):
+            try:
+                queue_email('user@example.com', 'Subject', 'text')
+                deadline = time.monotonic() + 5
+                while get_outbox_counts() != {'sent': 1} and time.monotonic() < deadline:
+                    time.sleep(0.02)
+            finally:
+                workers.stop()
+        assert get_outbox_counts() == {'sent': 1}
+        assert len(smtp_server.messages) == 1
+
+    def test_worker_start_delivers_leftover_email(self, test_db, smtp_server):
+        """Test that email queued before a restart goes out once the worker starts, unless disabled"""
+        database.enqueue_email('user@example.com', 'Subject', 'text')
+        workers = Mailer(workers=1, poll_interval=0.05, connect=connect_to(smtp_server))
+        with patch('mailer.mailer', workers):
+            assert start_mailer() is False and not workers._threads
+            with patch('mailer.MAILER_ENABLED', True):
+                try:
+                    assert start_mailer() is True
+                    deadline = time.monotonic() + 5
+                    while get_outbox_counts() != {'sent': 1} and time.monotonic() < deadline:
+                        time.sleep(0.02)
+                finally:
+                    workers.stop()
+        assert get_outbox_counts() == {'sent': 1}
+
+    def test_report_confirmation_is_queued_not_sent_inline(self, test_db):
+        """Test that reporting an emergency only enqueues the confirmation email"""
+        from app import app
+        app.config['TESTING'] = True
+        user_id = database.create_user('reporter', 'reporter@example.com', 'password123', 'user', 'Reporter')
+        with app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user_id)
+            with patch('smtplib.SMTP') as smtp:
+                response = client.post('/report-emergency', json={'location': 'Main St', 'severity': 'high'})
+            smtp.assert_not_called()
+        assert response.status_code == 200
+        emails = list(outbox().values())
+        assert len(emails) == 1 and emails[0]['to_email'] == 'reporter@example.com'
+        assert emails[0]['status'] == 'pending'
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the map data service (bounding-box queries, clustering, ETags)
+"""
+
+import pytest
+import sys
+import os
+import tempfile
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import init_database, create_user, create_emergency_report, update_report_status, set_facility_operational
+import map_service
+from map_service import parse_viewport, map_etag, get_map_features
+
+YAOUNDE_BBOX = (3.7, 11.4, 4.0, 11.7)
+
+@pytest.fixture
+def test_db():
+    """Create a test database"""
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp_file:
+        db_path = tmp_file.name
+
+    with patch('database.DATABASE_PATH', db_path):
+        init_database()
+        map_service._map_cache.clear()
+        yield db_path
+
+    database.close_pools()
+    if os.path.exists(db_path):
+        os.unlink(db_path)
+
+@pytest.fixture
+def reporter(test_db):
+    return create_user('reporter', 'reporter@example.com', 'password123', 'user', 'Reporter')
+
+def report_at(user_id, lat, lng, severity='medium'):
+    return create_emergency_report(user_id, 'Somewhere', 'Test report', severity, latitude=lat, longitude=lng)
+
+class TestViewport:
+    """Test bbox and zoom parsing"""
+
+    def test_defaults_to_world(self):
+        """Test that a missing bbox covers the world at the default zoom"""
+        assert parse_viewport() == (map_service.WORLD, map_service.MAP_DEFAULT_ZOOM)
+
+    def test_bbox_grows_to_tiles_and_clamps(self):
+        """Test that nearby viewports snap to the same tiles and stay inside the world"""
+        first, zoom = parse_viewport('3.81,11.45,3.89,11.55', '10')
+        second, _ = parse_viewport('3.82,11.46,3.88,11.54', '10')
+        assert zoom == 10 and first == second
+        assert first[0] <= 3.81 and first[2] >= 3.89 and first[1] <= 11.45 and first[3] >= 11.55
+
+        world, zoom = parse_viewport('-95,-200,95,200', '40')
+        assert world == map_service.WORLD and zoom == map_service.MAP_MAX_ZOOM
+
+    @pytest.mark.parametrize('bbox', ['1,2,3', 'a,b,c,d', '5,0,4,1', 'nan,0,1,1'])
+    def test_invalid_bbox(self, bbox):
+        """Test that malformed or inverted boxes are rejected"""
+        with pytest.raises(ValueError):
+            parse_viewport(bbox, '6')
+
+class TestMapQueries:
+    """Test the R*Tree backed queries"""
+
+    def test_only_active_reports_with_coordinates_inside_bbox(self, reporter):
+        """Test that the index tracks coordinates and status changes"""
+        inside = report_at(reporter, 3.86, 11.51)
+        resolved = report_at(reporter, 3.87, 11.52)
+        report_at(reporter, 4.05, 9.77)                      # Douala, outside
+        create_emergency_report(reporter, 'Unknown', 'No GPS', 'low')
+        update_report_status(resolved, 'resolved')
+
+        reports = database.get_map_reports(YAOUNDE_BBOX)
+        assert [report['id'] for report in reports] == [inside]
+
+        update_report_status(resolved, 'reported')
+        assert {report['id'] for report in database.get_map_reports(YAOUNDE_BBOX)} == {inside, resolved}
+
+    def test_seeded_facilities(self, test_db):
+        """Test that hospitals and stations formerly hard-coded are found by bbox"""
+        facilities = database.get_map_facilities(YAOUNDE_BBOX)
+        assert {facility['kind'] for facility in facilities} == {'hospital', 'fire_station'}
+        assert all(YAOUNDE_BBOX[0] <= facility['latitude'] <= YAOUNDE_BBOX[2] for facility in facilities)
+
+    def test_clusters_at_low_zoom(self, reporter):
+        """Test that nearby reports merge into one cluster with the worst severity"""
+        for i in range(5):
+            report_at(reporter, 3.86 + i * 0.001, 11.51, 'critical' if i == 2 else 'low')
+        lone = report_at(reporter, 9.33, 13.40)
+
+        data = get_map_features(*parse_viewport('1.6,8.5,13.1,16.2', '6'))
+        [cluster] = data['clusters']
+        assert cluster['count'] == 5 and cluster['severity'] == 'critical'
+        assert cluster['coordinates'] == pytest.approx([3.862, 11.51], abs=1e-3)
+        assert [report['id'] for report in data['emergencies']] == [lone]
+
+    def test_points_at_high_zoom(self, reporter):
+        """Test that every report is a point once zoomed in"""
+        ids = {report_at(reporter, 3.86 + i * 0.0001, 11.51) for i in range(3)}
+        data = get_map_features(*parse_viewport('3.85,11.50,3.87,11.52', '15'))
+        assert data['clusters'] == []
+        assert {report['id'] for report in data['emergencies']} == ids
+
+class TestMapEndpoint:
+    """Test /api/map-data"""
+
+    @pytest.fixture
+    def client(self, test_db):
+        from app import create_app
+        viewer = create_user('viewer', 'viewer@example.com', 'password123', 'user', 'Viewer')
+        with patch('database.DATABASE_PATH', test_db):
+            with create_app({'TESTING': True}).test_client() as client:
+                with client.session_transaction() as sess:
+                    sess['_user_id'] = str(viewer)
+                yield client
+
+    def test_requires_login(self, test_db, reporter):
+        """Test that anonymous visitors are sent to the login page instead of seeing reports"""
+        from app import create_app
+        report_at(reporter, 3.86, 11.51)
+        with create_app({'TESTING': True}).test_client() as client:
+            response = client.get('/api/map-data?bbox=3.7,11.4,4.0,11.7&zoom=14')
+        assert response.status_code == 302 and '/login' in response.headers['Location']
+
+    def test_not_modified_until_reports_change(self, client, reporter):
+        """Test that the ETag revalidates until a report changes"""
+        url = '/api/map-data?bbox=3.7,11.4,4.0,11.7&zoom=14'
+        first = client.get(url)
+        assert first.status_code == 200
+        assert first.headers['Cache-Control'] == 'no-cache'
+        assert first.get_json()['emergencies'] == []
+
+        etag = first.headers['ETag']
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+        report_id = report_at(reporter, 3.86, 11.51)
+        changed = client.get(url, headers={'If-None-Match': etag})
+        assert changed.status_code == 200
+        assert [report['id'] for report in changed.get_json()['emergencies']] == [report_id]
+
+    def test_invalid_bbox(self, client):
+        """Test that a malformed bbox is a 400"""
+        assert client.get('/api/map-data?bbox=1,2,3').status_code == 400
+
+    def test_out_of_service_facilities_hidden(self, client):
+        """Test that a facility taken out of service leaves the map, like the nearest/route searches"""
+        url = '/api/map-data?bbox=3.7,11.4,4.0,11.7&zoom=14'
+        first = client.get(url)
+        station = first.get_json()['fire_stations'][0]['id']
+        set_facility_operational(station, False)
+
+        changed = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+        assert changed.status_code == 200
+        assert station not in [facility['id'] for facility in changed.get_json()['fire_stations']]
+        assert station not in [facility['id'] for facility in database.get_map_facilities(YAOUNDE_BBOX)]
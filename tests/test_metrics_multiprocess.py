@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for Prometheus multiprocess metrics across several worker processes
+"""
+
+import pytest
+import sys
+import os
+import subprocess
+import tempfile
+import textwrap
+from unittest.mock import patch
+from prometheus_client import CollectorRegistry, multiprocess
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = textwrap.dedent('''
+    import sys
+    sys.path.insert(0, {root!r})
+    from app import app
+    import sessions
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess['_user_id'] = {user_id!r}
+        for _ in range({reports}):
+            assert client.post('/report-emergency', json={{'location': 'Main St', 'severity': 'high'}}).status_code == 200
+    sessions.active_users_gauge.set({active})
+''')
+
+SCRAPE = textwrap.dedent('''
+    import sys
+    sys.path.insert(0, {root!r})
+    from app import app
+    print(app.test_client().get('/metrics').get_data(as_text=True))
+''')
+
+@pytest.fixture
+def worker_env():
+    """A database with one user and an empty multiprocess metrics directory"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'app.db')
+        metrics_dir = os.path.join(tmp_dir, 'metrics')
+        os.makedirs(metrics_dir)
+        with patch('database.DATABASE_PATH', db_path):
+            database.init_database()
+            user_id = database.create_user('reporter', 'reporter@example.com', 'password123', 'user', 'Reporter')
+        database.close_pools()
+
+        env = dict(os.environ, DATABASE_PATH=db_path, PROMETHEUS_MULTIPROC_DIR=metrics_dir, MAILER_ENABLED='0')
+        yield env, str(user_id), metrics_dir
+
+def run_workers(env, user_id, workloads):
+    """Run one process per (reports, active) workload concurrently; returns their pids"""
+    processes = [subprocess.Popen([sys.executable, '-c', WORKER.format(root=ROOT, user_id=user_id,
+                                                                      reports=reports, active=active)],
+                                  env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+                 for reports, active in workloads]
+    for process in processes:
+        _, stderr = process.communicate(timeout=120)
+        assert process.returncode == 0, stderr.decode()
+    return [process.pid for process in processes]
+
+def aggregate(metrics_dir):
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=metrics_dir)
+    return registry
+
+class TestMultiprocessMetrics:
+    """Test that metrics from several workers are aggregated correctly"""
+
+    def test_counters_sum_and_gauges_take_max(self, worker_env):
+        """Test that report counters add up across workers and active_users is not multiplied"""
+        env, user_id, metrics_dir = worker_env
+        pids = run_workers(env, user_id, [(1, 4), (2, 7), (3, 5)])
+
+        registry = aggregate(metrics_dir)
+        assert registry.get_sample_value('emergency_reports_total',
+                                         {'severity': 'high', 'type': 'fire'}) == 6
+        assert registry.get_sample_value('active_users') == 7
+
+        # A worker that exits no longer contributes its live gauges
+        multiprocess.mark_process_dead(pids[1], path=metrics_dir)
+        registry = aggregate(metrics_dir)
+        assert registry.get_sample_value('active_users') == 5
+        assert registry.get_sample_value('emergency_reports_total',
+                                         {'severity': 'high', 'type': 'fire'}) == 6
+
+    def test_metrics_endpoint_reports_every_worker(self, worker_env):
+        """Test that /metrics in any worker serves the aggregate"""
+        env, user_id, metrics_dir = worker_env
+        run_workers(env, user_id, [(2, 1), (2, 1)])
+        scrape = subprocess.run([sys.executable, '-c', SCRAPE.format(root=ROOT)], env=env,
+                                capture_output=True, text=True, timeout=120)
+        assert scrape.returncode == 0, scrape.stderr
+        assert 'emergency_reports_total{severity="high",type="fire"} 4.0' in scrape.stdout
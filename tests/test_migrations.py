@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Unit tests for schema migrations and index usage
+"""
+
+import pytest
+import sys
+import os
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from migrations import MIGRATIONS, run_migrations, get_schema_version
+from pagination import encode_cursor
+from database import (init_database, get_db_connection, get_emergency_reports, get_emergency_report,
+                      get_emergency_reports_page, get_messages, get_messages_page, get_report_changes,
+                      get_user_for_login, get_session_user_id,
+                      count_active_session_users)
+
+@pytest.fixture
+def test_db():
+    """Create a migrated test database"""
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp_file:
+        db_path = tmp_file.name
+
+    with patch('database.DATABASE_PATH', db_path):
+        init_database()
+        yield db_path
+
+    database.close_pools()
+    if os.path.exists(db_path):
+        os.unlink(db_path)
+
+def query_plan(func, *args, **kwargs):
+    """Run a database helper and return the EXPLAIN QUERY PLAN of each SELECT it issued"""
+    statements = []
+    with get_db_connection() as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            func(*args, **kwargs)
+        finally:
+            conn.set_trace_callback(None)
+        plans = []
+        for sql in statements:
+            if sql.lstrip().upper().startswith('SELECT'):
+                rows = conn.execute('EXPLAIN QUERY PLAN ' + sql).fetchall()
+                plans.append(' | '.join(row['detail'] for row in rows))
+    return plans
+
+class TestMigrationRunner:
+    """Test version tracking and idempotency"""
+
+    def test_all_migrations_recorded(self, test_db):
+        """Test that init_database applies and records every migration"""
+        with get_db_connection() as conn:
+            assert get_schema_version(conn) == max(m[0] for m in MIGRATIONS)
+            names = [row['name'] for row in conn.execute('SELECT name FROM schema_migrations ORDER BY version')]
+        assert names == [m[1] for m in sorted(MIGRATIONS)]
+
+    def test_rerun_is_noop(self, test_db):
+        """Test that running migrations again applies nothing"""
+        with get_db_connection() as conn:
+            assert run_migrations(conn) == []
+
+    def test_legacy_database_upgraded(self):
+        """Test that a pre-migration database gains the missing column"""
+        conn = sqlite3.connect(':memory:')
+        conn.execute('''
+            CREATE TABLE emergency_reports (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, location TEXT NOT NULL,
+                description TEXT, severity TEXT NOT NULL, status TEXT DEFAULT 'reported',
+                latitude REAL, longitude REAL, reported_at TIMESTAMP, updated_at TIMESTAMP,
+                assigned_department_id INTEGER
+            )
+        ''')
+        conn.execute('CREATE TABLE messages (id INTEGER PRIMARY KEY, is_deleted BOOLEAN, created_at TIMESTAMP)')
+        conn.execute('CREATE TABLE users (id INTEGER PRIMARY KEY)')
+        run_migrations(conn, MIGRATIONS[:3])
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(emergency_reports)')]
+        assert 'location_accuracy' in columns
+        conn.close()
+
+    def test_failed_migration_rolls_back(self, test_db):
+        """Test that a failing migration leaves no partial changes or version row"""
+        broken = [(999, 'broken', [
+            'CREATE TABLE half_done (id INTEGER)',
+            'CREATE INDEX bad ON missing_table (x)',
+        ])]
+        with get_db_connection() as conn:
+            with pytest.raises(sqlite3.OperationalError):
+                run_migrations(conn, broken)
+            assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'half_done'").fetchone() is None
+            assert get_schema_version(conn) != 999
+
+class TestIndexUsage:
+    """EXPLAIN QUERY PLAN assertions for the hot feed queries"""
+
+    def test_report_feed_uses_index(self, test_db):
+        """Test that the unfiltered report feed walks the reported_at index"""
+        plan = query_plan(get_emergency_reports, limit=20)[0]
+        assert 'idx_reports_reported_at' in plan
+        assert 'TEMP B-TREE' not in plan
+
+    def test_report_feed_by_status_uses_index(self, test_db):
+        """Test that status-filtered reports use the composite index"""
+        plan = query_plan(get_emergency_reports, status='reported')[0]
+        assert 'idx_reports_status_reported_at' in plan
+        assert 'TEMP B-TREE' not in plan
+
+    def test_report_feed_by_department_uses_index(self, test_db):
+        """Test that department-filtered reports use the composite index"""
+        plan = query_plan(get_emergency_reports, department_id=7)[0]
+        assert 'idx_reports_department_reported_at' in plan
+        assert 'TEMP B-TREE' not in plan
+
+    def test_report_feed_by_severity_uses_index(self, test_db):
+        """Test that severity-filtered reports use the composite index"""
+        plan = query_plan(get_emergency_reports, severity='critical')[0]
+        assert 'idx_reports_severity_reported_at' in plan
+        assert 'TEMP B-TREE' not in plan
+
+    def test_single_report_lookup_uses_primary_key(self, test_db):
+        """Test that fetching one report is a rowid lookup"""
+        plan = query_plan(get_emergency_report, 42)[0]
+        assert 'INTEGER PRIMARY KEY' in plan
+
+    def test_deep_report_page_seeks_index(self, test_db):
+        """Test that a cursor page is an index range seek, not a scan"""
+        cursor = encode_cursor('2024-01-01 00:00:00', 1000, 'next')
+        plan = query_plan(get_emergency_reports_page, cursor=cursor, status='reported')[0]
+        assert 'idx_reports_status_reported_at (status=? AND reported_at<?)' in plan
+        assert 'TEMP B-TREE' not in plan
+
+    def test_deep_message_page_seeks_index(self, test_db):
+        """Test that a message history page seeks the feed index"""
+        cursor = encode_cursor('2024-01-01 00:00:00', 1000, 'next')
+        plan = query_plan(get_messages_page, cursor=cursor)[0]
+        assert 'idx_messages_deleted_created_at (is_deleted=? AND created_at<?)' in plan
+        assert 'TEMP B-TREE' not in plan
+
+    def test_message_feed_uses_index(self, test_db):
+        """Test that the chat feed reads live messages in index order"""
+        plan = query_plan(get_messages, limit=50)[0]
+        assert 'idx_messages_deleted_created_at' in plan
+        assert 'TEMP B-TREE' not in plan
+
+    def test_report_changes_seek_revision_index(self, test_db):
+        """Test that the dashboard delta query is a revision range seek"""
+        plan = query_plan(get_report_changes, after_revision=1000)[-1]
+        assert 'idx_reports_revision (revision>?)' in plan
+        assert 'TEMP B-TREE' not in plan
+
+    def test_login_lookup_uses_both_user_indexes(self, test_db):
+        """Test that the username-or-email login is two index lookups, not a scan"""
+        plan = query_plan(get_user_for_login, 'someone@example.com')[0]
+        assert 'sqlite_autoindex_users_1 (username=?)' in plan
+        assert 'idx_users_email_nocase (email=?)' in plan
+        assert 'SCAN users' not in plan
+
+    def test_session_token_lookup_uses_unique_index(self, test_db):
+        """Test that validating a session token is a single index lookup"""
+        plan = query_plan(get_session_user_id, 'token')[0]
+        assert 'sqlite_autoindex_user_sessions_1 (session_token=?)' in plan
+
+    def test_active_user_count_uses_covering_index(self, test_db):
+        """Test that counting active users is a range over the last-seen index"""
+        plan = query_plan(count_active_session_users, 900)[0]
+        assert 'COVERING INDEX idx_user_sessions_last_seen_user (last_seen_at>?)' in plan
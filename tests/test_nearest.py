@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Unit tests for nearest facility search (k-d tree, registry, /api/v1/nearest)
+"""
+
+import pytest
+import sys
+import os
+import random
+import tempfile
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import init_database, create_facility, set_facility_operational, get_facilities
+import nearest
+from nearest import KDTree, haversine_km, to_unit_vector, nearest_facilities
+
+YAOUNDE = (3.86, 11.51)
+
+@pytest.fixture
+def test_db():
+    """Create a test database"""
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp_file:
+        db_path = tmp_file.name
+
+    with patch('database.DATABASE_PATH', db_path):
+        init_database()
+        nearest._indexes.clear()
+        yield db_path
+
+    database.close_pools()
+    if os.path.exists(db_path):
+        os.unlink(db_path)
+
+class TestKDTree:
+    """Test the k-d tree against a linear scan"""
+
+    def test_matches_linear_scan(self):
+        """Test that k-nearest results equal sorting every point by haversine distance"""
+        rng = random.Random(7)
+        places = [(rng.uniform(-60, 60), rng.uniform(-180, 180)) for _ in range(500)]
+        tree = KDTree([to_unit_vector(*place) for place in places], list(range(len(places))))
+
+        for _ in range(50):
+            lat, lng = rng.uniform(-60, 60), rng.uniform(-180, 180)
+            expected = sorted(range(len(places)), key=lambda i: haversine_km(lat, lng, *places[i]))[:7]
+            found = tree.nearest(to_unit_vector(lat, lng), 7)
+            assert [i for _, i in found] == expected
+            assert nearest.chord_to_km(found[0][0]) == pytest.approx(haversine_km(lat, lng, *places[expected[0]]))
+
+    def test_accept_and_small_trees(self):
+        """Test filtering, ties going to the lower index, and k larger than the tree"""
+        points = [to_unit_vector(0, 0), to_unit_vector(0, 0), to_unit_vector(0, 1)]
+        tree = KDTree(points, ['a', 'b', 'c'])
+        assert [item for _, item in tree.nearest(to_unit_vector(0, 0), 1)] == ['a']
+        assert [item for _, item in tree.nearest(to_unit_vector(0, 0), 5, lambda item: item != 'a')] == ['b', 'c']
+        assert KDTree([], []).nearest(to_unit_vector(0, 0), 3) == []
+
+    def test_haversine(self):
+        """Test a known distance (Yaoundé to Douala is about 200 km)"""
+        assert haversine_km(3.8480, 11.5021, 4.0511, 9.7679) == pytest.approx(195, abs=5)
+
+class TestNearestFacilities:
+    """Test searches over the facilities registry"""
+
+    def test_registry_is_seeded(self, test_db):
+        """Test that the map page's hospitals and stations are in the registry"""
+        facilities = get_facilities()
+        assert len(get_facilities('hospital')) == 20 and len(get_facilities('fire_station')) == 18
+        assert all(facility['external_ref'] for facility in facilities)
+
+    def test_nearest_hospitals_in_order(self, test_db):
+        """Test that results are the closest hospitals, closest first, with distances"""
+        results = nearest_facilities(*YAOUNDE, 'hospital', k=3)
+        assert [result['kind'] for result in results] == ['hospital'] * 3
+        distances = [result['distance_km'] for result in results]
+        assert distances == sorted(distances) and distances[-1] < 5
+        assert distances[0] == pytest.approx(haversine_km(*YAOUNDE, results[0]['latitude'], results[0]['longitude']),
+                                             abs=1e-3)
+
+    def test_filters(self, test_db):
+        """Test the emergency and vehicle count filters"""
+        create_facility('hospital', 'Walk-in Clinic', 3.8601, 11.5101, emergency=False)
+        hospitals = nearest_facilities(*YAOUNDE, 'hospital', k=1, emergency=True)
+        assert hospitals[0]['name'] != 'Walk-in Clinic'
+        assert nearest_facilities(*YAOUNDE, 'hospital', k=1, emergency=False)[0]['name'] == 'Walk-in Clinic'
+
+        stations = nearest_facilities(*YAOUNDE, 'fire_station', k=2, min_vehicles=10)
+        assert all(station['vehicles'] >= 10 for station in stations)
+        assert stations[0]['name'] == 'Yaoundé Central Fire Station'
+
+    def test_index_follows_registry_changes(self, test_db):
+        """Test that new and out-of-service facilities are picked up"""
+        nearest_facilities(*YAOUNDE)
+        facility_id = create_facility('fire_station', 'New Station', *YAOUNDE, vehicles=2)
+        assert nearest_facilities(*YAOUNDE, k=1)[0]['id'] == facility_id
+
+        set_facility_operational(facility_id, False)
+        assert nearest_facilities(*YAOUNDE, k=1)[0]['id'] != facility_id
+
+    @pytest.mark.parametrize('kwargs', [{'kind': 'school'}, {'k': 0}, {'k': 51}])
+    def test_invalid_arguments(self, test_db, kwargs):
+        """Test that bad kinds and k values are rejected"""
+        with pytest.raises(ValueError):
+            nearest_facilities(*YAOUNDE, **kwargs)
+
+class TestNearestEndpoint:
+    """Test /api/v1/nearest"""
+
+    @pytest.fixture
+    def client(self, test_db):
+        from app import create_app
+        with patch('database.DATABASE_PATH', test_db):
+            with create_app({'TESTING': True}).test_client() as client:
+                yield client
+
+    def test_nearest(self, client):
+        """Test a search with filters"""
+        response = client.get('/api/v1/nearest?lat=4.05&lng=9.70&type=fire_station&k=2&min_vehicles=10')
+        assert response.status_code == 200
+        data = response.get_json()['data']
+        assert data['total_count'] == 2
+        assert [station['name'] for station in data['facilities']] == ['Douala Central Fire Station',
+                                                                       'Douala Port Fire Station']
+
+    @pytest.mark.parametrize('query', ['lat=4.05', 'lat=x&lng=9.7', 'lat=95&lng=9.7', 'lat=4&lng=9&type=school',
+                                       'lat=4&lng=9&k=100', 'lat=4&lng=9&min_vehicles=some'])
+    def test_invalid_query(self, client, query):
+        """Test that bad parameters are a 400"""
+        assert client.get(f'/api/v1/nearest?{query}').status_code == 400
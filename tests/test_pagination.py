@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Unit tests for keyset (cursor) pagination of reports and messages
+"""
+
+import pytest
+import sys
+import os
+import json
+import tempfile
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from pagination import encode_cursor, decode_cursor
+from database import init_database, get_db_connection, get_emergency_reports_page, get_messages_page
+
+@pytest.fixture
+def test_db():
+    """Create a test database with 25 reports and 25 messages, several sharing a timestamp"""
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp_file:
+        db_path = tmp_file.name
+
+    with patch('database.DATABASE_PATH', db_path):
+        init_database()
+        with get_db_connection() as conn:
+            for i in range(25):
+                # Pairs of rows share a timestamp so the id tie-breaker matters
+                stamp = f'2024-01-01 00:{i // 2:02d}:00'
+                conn.execute('INSERT INTO emergency_reports (location, severity, reported_at) VALUES (?, ?, ?)',
+                             (f'Location {i}', 'high' if i % 2 else 'low', stamp))
+                conn.execute('INSERT INTO messages (user_id, content, created_at) VALUES (1, ?, ?)',
+                             (f'Message {i}', stamp))
+            conn.commit()
+        yield db_path
+
+    database.close_pools()
+    if os.path.exists(db_path):
+        os.unlink(db_path)
+
+def walk(fetch_page, direction, cursor=None):
+    """Follow cursors in one direction and collect every page"""
+    pages = []
+    while True:
+        page = fetch_page(cursor)
+        pages.append(page)
+        cursor = page[f'{direction}_cursor']
+        if not cursor:
+            return pages
+
+class TestCursorEncoding:
+    """Test cursor token round-trips and validation"""
+
+    def test_round_trip(self):
+        """Test that a cursor decodes to what was encoded"""
+        token = encode_cursor('2024-01-01 00:00:00', 42, 'prev')
+        assert decode_cursor(token) == ('2024-01-01 00:00:00', 42, 'prev')
+
+    @pytest.mark.parametrize('token', ['garbage', '', encode_cursor('x', 1, 'sideways'),
+                                       encode_cursor('x', 'one', 'next'), encode_cursor('x', True, 'next'),
+                                       encode_cursor(None, 1, 'next'), encode_cursor(['x'], 1, 'next'),
+                                       encode_cursor({'x': 1}, 1, 'next'), encode_cursor(False, 1, 'next')])
+    def test_invalid_cursor_rejected(self, token):
+        """Test that malformed or tampered cursors raise ValueError"""
+        with pytest.raises(ValueError):
+            decode_cursor(token)
+
+class TestReportPagination:
+    """Test paging through emergency reports"""
+
+    def test_pages_cover_everything_once(self, test_db):
+        """Test that following next_cursor visits each report exactly once, newest first"""
+        pages = walk(lambda c: get_emergency_reports_page(cursor=c, limit=10), 'next')
+        ids = [r['id'] for page in pages for r in page['items']]
+        assert [len(p['items']) for p in pages] == [10, 10, 5]
+        assert ids == list(range(25, 0, -1))
+        assert pages[0]['prev_cursor'] is None
+        assert pages[-1]['next_cursor'] is None
+
+    def test_prev_cursor_returns_previous_page(self, test_db):
+        """Test that prev_cursor walks back to the same earlier page"""
+        first = get_emergency_reports_page(limit=10)
+        second = get_emergency_reports_page(cursor=first['next_cursor'], limit=10)
+        back = get_emergency_reports_page(cursor=second['prev_cursor'], limit=10)
+        assert [r['id'] for r in back['items']] == [r['id'] for r in first['items']]
+        assert back['prev_cursor'] is None
+        assert back['next_cursor'] is not None
+
+    def test_filters_apply_across_pages(self, test_db):
+        """Test that filters are combined with the keyset seek"""
+        pages = walk(lambda c: get_emergency_reports_page(cursor=c, limit=5, severity='high'), 'next')
+        items = [r for page in pages for r in page['items']]
+        assert len(items) == 12
+        assert all(r['severity'] == 'high' for r in items)
+
+class TestMessagePagination:
+    """Test paging back through chat history"""
+
+    def test_history_pages_are_chronological(self, test_db):
+        """Test that the first page is the newest messages in chronological order"""
+        with patch('database.DATABASE_PATH', test_db):
+            page = get_messages_page(limit=10)
+            ids = [m['id'] for m in page['items']]
+            assert ids == list(range(16, 26))
+            older = get_messages_page(cursor=page['next_cursor'], limit=10)
+            assert [m['id'] for m in older['items']] == list(range(6, 16))
+            newer = get_messages_page(cursor=older['prev_cursor'], limit=10)
+            assert [m['id'] for m in newer['items']] == ids
+
+class TestPaginationEndpoints:
+    """Test cursor parameters on the HTTP endpoints"""
+
+    @pytest.fixture
+    def client(self, test_db):
+        from app import app
+        app.config['TESTING'] = True
+        with patch('database.DATABASE_PATH', test_db):
+            with app.test_client() as client:
+                yield client
+
+    def test_api_emergencies_returns_cursors(self, client):
+        """Test that /api/v1/emergencies pages with next_cursor"""
+        headers = {'X-API-Key': 'emergency-api-key-2024'}
+        first = json.loads(client.get('/api/v1/emergencies?limit=20', headers=headers).data)['data']
+        assert len(first['emergencies']) == 20 and first['next_cursor']
+        rest = json.loads(client.get(f"/api/v1/emergencies?limit=20&cursor={first['next_cursor']}",
+                                     headers=headers).data)['data']
+        assert len(rest['emergencies']) == 5 and rest['next_cursor'] is None
+
+    def test_api_messages_rejects_bad_cursor(self, client):
+        """Test that a malformed cursor is a client error"""
+        response = client.get('/api/v1/messages?cursor=not-a-cursor', headers={'X-API-Key': 'emergency-api-key-2024'})
+        assert response.status_code == 400
+        nested = encode_cursor(['2024-01-01'], 1, 'next')
+        response = client.get(f'/api/v1/messages?cursor={nested}', headers={'X-API-Key': 'emergency-api-key-2024'})
+        assert response.status_code == 400
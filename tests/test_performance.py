@@ -16,19 +16,20 @@ from unittest.mock import patch
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app import app
+from app import create_app
+import database
 from database import init_database
 
 @pytest.fixture
 def performance_client():
     """Create test client for performance testing"""
-    app.config['TESTING'] = True
-    app.config['DATABASE'] = ':memory:'
+    app = create_app({'TESTING': True, 'DATABASE': ':memory:'})
     
     with app.test_client() as client:
         with app.app_context():
             init_database()
         yield client
+    database.close_pools()
 
 @pytest.fixture
 def api_headers():
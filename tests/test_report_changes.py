@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Unit tests for report revisions and the fire department dashboard delta endpoint
+"""
+
+import pytest
+import sys
+import os
+import json
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from migrations import MIGRATIONS, run_migrations
+from database import (init_database, get_db_connection, create_user, create_emergency_report,
+                      update_report_status, get_report_changes, get_stat_counters)
+
+@pytest.fixture
+def test_db():
+    """Create a test database with a fire department and a reporter"""
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp_file:
+        db_path = tmp_file.name
+
+    with patch('database.DATABASE_PATH', db_path):
+        init_database()
+        department = create_user('dept', 'dept@example.com', 'password123', 'fire_department', 'Dept')
+        reporter = create_user('reporter', 'reporter@example.com', 'password123', 'user', 'Reporter')
+        yield {'department': department, 'reporter': reporter}
+
+    database.close_pools()
+    if os.path.exists(db_path):
+        os.unlink(db_path)
+
+class TestReportRevisions:
+    """Test that every report write gets a new, increasing revision"""
+
+    def test_inserts_and_updates_bump_revision(self, test_db):
+        """Test revisions follow the order of writes, not of report ids"""
+        first = create_emergency_report(test_db['reporter'], 'A', 'desc', 'high')
+        second = create_emergency_report(test_db['reporter'], 'B', 'desc', 'low')
+        update_report_status(first, 'responding', test_db['department'])
+
+        changes = get_report_changes()
+        assert [(r['id'], r['revision']) for r in changes['reports']] == [(second, 2), (first, 3)]
+        assert changes['revision'] == get_stat_counters()['reports.revision'] == 3
+
+    def test_backfill_orders_existing_reports(self):
+        """Test that the migration numbers existing reports by updated_at"""
+        conn = sqlite3.connect(':memory:')
+        conn.execute('CREATE TABLE emergency_reports (id INTEGER PRIMARY KEY, updated_at TIMESTAMP)')
+        conn.execute('CREATE TABLE stat_counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)')
+        conn.executemany('INSERT INTO emergency_reports VALUES (?, ?)',
+                         [(1, '2024-01-03'), (2, '2024-01-01'), (3, '2024-01-02')])
+        run_migrations(conn, [m for m in MIGRATIONS if m[1] == 'report_change_revisions'])
+        rows = conn.execute('SELECT id, revision FROM emergency_reports ORDER BY revision').fetchall()
+        assert rows == [(2, 1), (3, 2), (1, 3)]
+        conn.execute("INSERT INTO emergency_reports (id, updated_at) VALUES (4, '2024-01-04')")
+        assert conn.execute('SELECT revision FROM emergency_reports WHERE id = 4').fetchone()[0] == 4
+
+class TestReportChanges:
+    """Test the delta query used by the dashboard poller"""
+
+    def test_batches_resume_from_cursor(self, test_db):
+        """Test that following the returned revision visits each change once"""
+        ids = [create_emergency_report(test_db['reporter'], f'Loc {i}', 'desc', 'medium') for i in range(5)]
+        first = get_report_changes(limit=3)
+        assert first['has_more'] and [r['id'] for r in first['reports']] == ids[:3]
+        rest = get_report_changes(after_revision=first['revision'], limit=3)
+        assert not rest['has_more'] and [r['id'] for r in rest['reports']] == ids[3:]
+        assert get_report_changes(after_revision=rest['revision'])['reports'] == []
+
+    def test_filtered_poll_skips_to_head(self, test_db):
+        """Test that a filtered poll advances past changes it does not match"""
+        create_emergency_report(test_db['reporter'], 'A', 'desc', 'low')
+        critical = create_emergency_report(test_db['reporter'], 'B', 'desc', 'critical')
+        create_emergency_report(test_db['reporter'], 'C', 'desc', 'low')
+        changes = get_report_changes(severity='critical')
+        assert [r['id'] for r in changes['reports']] == [critical]
+        assert changes['revision'] == 3
+
+class TestReportChangesEndpoint:
+    """Test /fire-department/reports/changes"""
+
+    @pytest.fixture
+    def client(self, test_db):
+        from app import app
+        app.config['TESTING'] = True
+        with app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(test_db['department'])
+            yield client
+
+    def test_returns_changes_with_rendered_rows(self, client, test_db):
+        """Test that changes come back as JSON with row HTML and counts"""
+        report_id = create_emergency_report(test_db['reporter'], 'Main St', 'Smoke', 'critical')
+        response = client.get('/fire-department/reports/changes?cursor=0')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['cursor'] == 1 and data['active_count'] == 1
+        assert f'data-report-id="{report_id}"' in data['reports'][0]['html']
+
+    def test_not_modified_until_a_report_changes(self, client, test_db):
+        """Test ETag revalidation answers 304 until the revision moves"""
+        report_id = create_emergency_report(test_db['reporter'], 'Main St', 'Smoke', 'high')
+        first = client.get('/fire-department/reports/changes?cursor=1')
+        etag = first.headers['ETag']
+        again = client.get('/fire-department/reports/changes?cursor=1', headers={'If-None-Match': etag})
+        assert again.status_code == 304 and again.data == b''
+
+        update_report_status(report_id, 'responding', test_db['department'])
+        changed = client.get('/fire-department/reports/changes?cursor=1', headers={'If-None-Match': etag})
+        assert changed.status_code == 200
+        assert json.loads(changed.data)['reports'][0]['status'] == 'responding'
+
+    def test_rejects_regular_users(self, client, test_db):
+        """Test that only fire departments may poll report changes"""
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(test_db['reporter'])
+        assert client.get('/fire-department/reports/changes').status_code == 403
+
+    def test_dashboard_seeds_cursor(self, client, test_db):
+        """Test that the dashboard page starts the poller at the current revision"""
+        create_emergency_report(test_db['reporter'], 'Main St', 'Smoke', 'high')
+        response = client.get('/fire-department-dashboard')
+        assert response.status_code == 200
+        assert b'let reportsCursor = 1;' in response.data
+        assert b'/fire-department/reports/changes' in response.data
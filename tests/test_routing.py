@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Unit tests for road routing (CSR graph, ALT bidirectional A*, OSM conversion, /api/v1/route)
+"""
+
+import pytest
+import sys
+import os
+import random
+import tempfile
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import init_database, create_user, create_emergency_report, create_facility
+import routing
+from routing import RoadGraph, graph_from_osm
+from nearest import haversine_km
+
+ORIGIN = (3.85, 11.50)
+SPACING = 0.0025
+
+def street_grid(size, seed=3):
+    """size x size grid near Yaoundé with random one-way streets and missing links"""
+    rng = random.Random(seed)
+    lats = [ORIGIN[0] + (i // size) * SPACING for i in range(size * size)]
+    lngs = [ORIGIN[1] + (i % size) * SPACING for i in range(size * size)]
+    edges = []
+    for u in range(size * size):
+        for v in (u + 1 if (u + 1) % size else None, u + size if u + size < size * size else None):
+            if v is None or rng.random() < 0.1:
+                continue
+            metres = haversine_km(lats[u], lngs[u], lats[v], lngs[v]) * 1000
+            seconds = metres / rng.choice((7.0, 14.0))
+            direction = rng.choice((0, 0, 0, 1, -1))
+            if direction >= 0:
+                edges.append((u, v, seconds, metres))
+            if direction <= 0:
+                edges.append((v, u, seconds, metres))
+    graph = RoadGraph.from_edges(lats, lngs, edges).largest_component()
+    graph.select_landmarks(6)
+    return graph
+
+@pytest.fixture(scope='module')
+def grid():
+    return street_grid(15)
+
+@pytest.fixture
+def graph_file(grid):
+    with tempfile.NamedTemporaryFile(suffix='.graph', delete=False) as tmp_file:
+        path = tmp_file.name
+    grid.save(path)
+    yield path
+    routing._graphs.pop(path, None)
+    os.unlink(path)
+
+OSM_EXTRACT = '''<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="3.8600" lon="11.5000"/>
+  <node id="2" lat="3.8600" lon="11.5100"/>
+  <node id="3" lat="3.8700" lon="11.5100"/>
+  <node id="4" lat="3.8800" lon="11.5100"/>
+  <node id="5" lat="3.8600" lon="11.5200"/>
+  <node id="6" lat="3.8500" lon="11.5000"/>
+  <way id="10"><nd ref="1"/><nd ref="2"/><nd ref="3"/><tag k="highway" v="residential"/></way>
+  <way id="11"><nd ref="3"/><nd ref="1"/><tag k="highway" v="primary"/><tag k="oneway" v="yes"/></way>
+  <way id="12"><nd ref="3"/><nd ref="4"/><tag k="highway" v="footway"/></way>
+  <way id="13"><nd ref="2"/><nd ref="5"/><tag k="highway" v="service"/><tag k="oneway" v="yes"/></way>
+  <way id="14"><nd ref="1"/><nd ref="6"/><tag k="highway" v="tertiary"/><tag k="maxspeed" v="30"/></way>
+</osm>
+'''
+
+class TestRoadGraph:
+    """Test the CSR graph and its searches"""
+
+    def test_csr_layout(self):
+        """Test edge order, fastest parallel edges and the derived reverse graph"""
+        graph = RoadGraph.from_edges([0, 0, 0], [0, 1, 2], [(0, 2, 9.0, 90.0), (0, 1, 5.0, 50.0),
+                                                            (0, 1, 3.0, 40.0), (2, 1, 1.0, 10.0)])
+        assert list(graph.offsets) == [0, 2, 2, 3]
+        assert list(graph.targets) == [1, 2, 1] and list(graph.seconds) == [3.0, 9.0, 1.0]
+        assert list(graph.reverse_offsets) == [0, 0, 2, 3]
+        assert sorted(zip(graph.reverse_sources[0:2], graph.reverse_seconds[0:2])) == [(0, 3.0), (2, 1.0)]
+
+    @pytest.mark.parametrize('landmarks', [0, 4])
+    def test_matches_dijkstra(self, grid, landmarks):
+        """Test that bidirectional search (with and without landmarks) finds optimal, valid paths"""
+        rng = random.Random(11)
+        for _ in range(40):
+            source, target = rng.randrange(grid.node_count), rng.randrange(grid.node_count)
+            seconds, path = grid.shortest_path(source, target, landmarks)
+            assert seconds == pytest.approx(grid.travel_times(source)[target])
+            assert path[0] == source and path[-1] == target
+            assert sum(min(grid.seconds[i] for i in range(grid.offsets[u], grid.offsets[u + 1])
+                           if grid.targets[i] == v) for u, v in zip(path, path[1:])) == pytest.approx(seconds)
+
+    def test_save_and_load(self, grid, graph_file):
+        """Test that a saved graph loads with the same arrays and landmarks"""
+        loaded = RoadGraph.load(graph_file)
+        assert list(loaded.targets) == list(grid.targets) and list(loaded.seconds) == list(grid.seconds)
+        assert list(loaded.landmarks) == list(grid.landmarks)
+        assert list(loaded.landmark_to[2]) == list(grid.landmark_to[2])
+        assert loaded.shortest_path(0, grid.node_count - 1) == grid.shortest_path(0, grid.node_count - 1)
+
+    def test_nearest_node(self, grid):
+        """Test snapping to the closest node and refusing points far from any road"""
+        node, km = grid.nearest_node(ORIGIN[0] + 2 * SPACING + 0.0001, ORIGIN[1] + 3 * SPACING)
+        assert (grid.lats[node], grid.lngs[node]) == pytest.approx((ORIGIN[0] + 2 * SPACING, ORIGIN[1] + 3 * SPACING))
+        assert km < 0.02
+        with pytest.raises(ValueError):
+            grid.nearest_node(4.5, 11.5)
+
+class TestOsmConversion:
+    """Test converting an OpenStreetMap extract"""
+
+    def test_graph_from_osm(self, tmp_path):
+        """Test road filtering, one-way streets, speeds and dropping unreachable nodes"""
+        extract = tmp_path / 'extract.osm'
+        extract.write_text(OSM_EXTRACT)
+        graph = graph_from_osm(str(extract), landmarks=2)
+
+        # The footway and the one-way dead end (node 5) are gone
+        assert graph.node_count == 4 and len(graph.landmarks) == 2
+        index = {(round(graph.lats[v], 4), round(graph.lngs[v], 4)): v for v in range(graph.node_count)}
+        one, three, six = index[(3.86, 11.50)], index[(3.87, 11.51)], index[(3.85, 11.50)]
+
+        def edge_seconds(u, v):
+            return [graph.seconds[i] for i in range(graph.offsets[u], graph.offsets[u + 1]) if graph.targets[i] == v]
+
+        assert edge_seconds(three, one) and not edge_seconds(one, three)
+        metres = haversine_km(3.86, 11.50, 3.85, 11.50) * 1000
+        assert edge_seconds(one, six) == [pytest.approx(metres / (30 / 3.6))]
+
+class TestRouteEndpoint:
+    """Test /api/v1/route"""
+
+    @pytest.fixture
+    def test_db(self):
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp_file:
+            db_path = tmp_file.name
+        with patch('database.DATABASE_PATH', db_path):
+            init_database()
+            yield db_path
+        database.close_pools()
+        os.unlink(db_path)
+
+    @pytest.fixture
+    def client(self, test_db):
+        from app import create_app
+        with patch('database.DATABASE_PATH', test_db):
+            with create_app({'TESTING': True}).test_client() as client:
+                yield client
+
+    def test_not_configured(self, client):
+        """Test that routing is a 503 without a road graph"""
+        with patch('routing.ROAD_GRAPH_PATH', '/nonexistent/roads.graph'):
+            assert client.get('/api/v1/route?from=3.86,11.51&to=3.87,11.52').status_code == 503
+
+    def test_route_between_points(self, client, graph_file, grid):
+        """Test a route between coordinates"""
+        with patch('routing.ROAD_GRAPH_PATH', graph_file):
+            response = client.get('/api/v1/route?from=3.851,11.501&to=3.880,11.530')
+        assert response.status_code == 200
+        route = response.get_json()['data']['route']
+        source, _ = grid.nearest_node(3.851, 11.501)
+        target, _ = grid.nearest_node(3.880, 11.530)
+        assert route['eta_seconds'] == pytest.approx(grid.travel_times(source)[target], abs=0.1)
+        assert route['path'][0] == [grid.lats[source], grid.lngs[source]]
+        assert route['path'][-1] == [grid.lats[target], grid.lngs[target]]
+        assert route['distance_km'] >= haversine_km(*route['path'][0], *route['path'][-1])
+
+    def test_station_to_incident(self, client, graph_file):
+        """Test a route from a registered facility to a report"""
+        station = create_facility('fire_station', 'Grid Station', 3.8525, 11.5025, vehicles=3)
+        reporter = create_user('reporter', 'reporter@example.com', 'password123', 'user', 'Reporter')
+        report = create_emergency_report(reporter, 'Grid', 'Fire', 'high', latitude=3.87, longitude=11.52)
+        headers = {'X-API-Key': 'emergency-api-key-2024'}
+        with patch('routing.ROAD_GRAPH_PATH', graph_file):
+            response = client.get(f'/api/v1/route?facility_id={station}&report_id={report}', headers=headers)
+            assert response.status_code == 200
+            assert response.get_json()['data']['route']['path'][-1] == pytest.approx([3.87, 11.52])
+            assert client.get(f'/api/v1/route?facility_id=9999&report_id={report}', headers=headers).status_code == 404
+
+    def test_report_needs_api_key(self, client, graph_file):
+        """Test that routing to a report without the API key does not reveal its location"""
+        reporter = create_user('reporter', 'reporter@example.com', 'password123', 'user', 'Reporter')
+        report = create_emergency_report(reporter, 'Grid', 'Fire', 'high', latitude=3.87, longitude=11.52)
+        with patch('routing.ROAD_GRAPH_PATH', graph_file):
+            for key in ('', '&api_key=wrong'):
+                response = client.get(f'/api/v1/route?from=3.851,11.501&report_id={report}{key}')
+                assert response.status_code == 401 and 'data' not in response.get_json()
+            assert client.get('/api/v1/route?from=3.851,11.501&to=3.87,11.52').status_code == 200
+
+    @pytest.mark.parametrize('query', ['from=3.86,11.51', 'from=3.86&to=3.87,11.52', 'from=x,y&to=3.87,11.52',
+                                       'from=0,0&to=3.87,11.52'])
+    def test_invalid_query(self, client, graph_file, query):
+        """Test that missing, malformed and off-road points are a 400"""
+        with patch('routing.ROAD_GRAPH_PATH', graph_file):
+            assert client.get(f'/api/v1/route?{query}').status_code == 400
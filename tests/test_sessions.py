@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Unit tests for server-side sessions
+"""
+
+import pytest
+import sys
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import init_database, get_db_connection, create_user
+from sessions import SessionStore
+
+@pytest.fixture
+def test_db():
+    """Create a test database"""
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp_file:
+        db_path = tmp_file.name
+
+    with patch('database.DATABASE_PATH', db_path):
+        init_database()
+        yield db_path
+
+    database.close_pools()
+    if os.path.exists(db_path):
+        os.unlink(db_path)
+
+@pytest.fixture
+def store():
+    """A session store whose maintenance thread never runs on its own, caching as with a shared event log"""
+    store = SessionStore(cache_ttl=60, flush_interval=3600, sweep_chunk=2)
+    with patch.object(store, 'start'):
+        yield store
+
+@pytest.fixture
+def user_id(test_db):
+    return create_user('testuser', 'test@example.com', 'password123', 'user', 'Test User')
+
+def session_rows():
+    with get_db_connection() as conn:
+        return {row['session_token']: dict(row) for row in conn.execute('SELECT * FROM user_sessions')}
+
+def count_selects(func, *args):
+    """Run func and return (result, number of SELECTs it issued)"""
+    statements = []
+    with get_db_connection() as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            result = func(*args)
+        finally:
+            conn.set_trace_callback(None)
+    return result, sum(1 for sql in statements if sql.lstrip().upper().startswith('SELECT'))
+
+class TestSessionStore:
+    """Test session creation, validation, revocation and maintenance"""
+
+    def test_create_and_validate(self, store, user_id):
+        """Test that a new session validates for its user only"""
+        token = store.create(user_id)
+        assert session_rows()[token]['user_id'] == user_id
+        assert store.validate(token, str(user_id))
+        assert not store.validate(token, user_id + 1)
+        assert not store.validate('unknown-token', user_id)
+
+    def test_validation_is_cached(self, store, user_id):
+        """Test that repeat validations skip the database"""
+        token = store.create(user_id)
+        store._cache.clear()
+        assert count_selects(store.validate, token, user_id) == (True, 1)
+        assert count_selects(store.validate, token, user_id) == (True, 0)
+
+    def test_revoke(self, store, user_id):
+        """Test that a revoked session stops validating immediately"""
+        token = store.create(user_id)
+        other = store.create(user_id)
+        store.revoke(token)
+        assert not store.validate(token, user_id)
+        assert store.validate(other, user_id)
+
+        store.revoke_user(user_id)
+        assert not store.validate(other, user_id)
+        assert not any(row['is_active'] for row in session_rows().values())
+
+    def test_revocation_in_another_worker(self, store, user_id):
+        """Test that a revocation published elsewhere evicts the cached session"""
+        token = store.create(user_id)
+        store._evict_revoked(SimpleNamespace(data={'database': database.DATABASE_PATH, 'tokens': [token]}))
+        assert (database.DATABASE_PATH, token) not in store._cache
+
+    def test_no_cache_without_shared_event_log(self, user_id):
+        """Test that without a cache a session revoked by another worker stops validating"""
+        store = SessionStore(cache_ttl=0, flush_interval=3600)
+        with patch.object(store, 'start'):
+            token = store.create(user_id)
+            assert store.validate(token, user_id)
+            assert (database.DATABASE_PATH, token) not in store._cache
+            # Another worker revokes it; its session.revoked event never arrives here
+            database.revoke_user_session(token)
+            assert not store.validate(token, user_id)
+
+    def test_last_seen_is_batched(self, store, user_id):
+        """Test that uses are written in one flush and slide the expiry"""
+        tokens = [store.create(user_id) for _ in range(3)]
+        with get_db_connection() as conn:
+            conn.execute("UPDATE user_sessions SET last_seen_at = '2000-01-01 00:00:00', "
+                         "expires_at = datetime('now', '+1 minute')")
+            conn.commit()
+        for token in tokens:
+            store.validate(token, user_id)
+        assert all(row['last_seen_at'] == '2000-01-01 00:00:00' for row in session_rows().values())
+
+        assert store.flush() == 3
+        assert store.flush() == 0
+        rows = session_rows()
+        assert all(row['last_seen_at'] > '2000-01-01 00:00:00' for row in rows.values())
+        assert all(row['expires_at'] > row['last_seen_at'] for row in rows.values())
+
+    def test_sweep_deletes_expired_in_chunks(self, store, user_id):
+        """Test that expired and revoked sessions are deleted, live ones kept"""
+        tokens = [store.create(user_id) for _ in range(6)]
+        with get_db_connection() as conn:
+            conn.execute("UPDATE user_sessions SET expires_at = datetime('now', '-1 minute') "
+                         "WHERE session_token IN (?, ?, ?, ?)", tokens[:4])
+            conn.commit()
+        store.revoke(tokens[4])
+        assert store.sweep() == 5
+        assert list(session_rows()) == [tokens[5]]
+
+    def test_active_users_counts_recent_users(self, store, user_id):
+        """Test that active users are distinct users seen within the window"""
+        other_id = create_user('other', 'other@example.com', 'password123', 'user', 'Other')
+        store.create(user_id)
+        store.create(user_id)
+        token = store.create(other_id)
+        assert store.refresh_active_users() == 2
+
+        with get_db_connection() as conn:
+            conn.execute("UPDATE user_sessions SET last_seen_at = datetime('now', '-1 hour')")
+            conn.commit()
+        assert store.refresh_active_users() == 0
+
+        store.validate(token, other_id)
+        store.flush()
+        assert store.refresh_active_users() == 1
+
+class TestSessionLogin:
+    """Test that the web login uses server-side sessions"""
+
+    @pytest.fixture
+    def client(self, test_db, store):
+        from app import app
+        app.config['TESTING'] = True
+        with patch('app.sessions', store), app.test_client() as client:
+            yield client
+
+    def test_login_logout_revokes(self, client, user_id):
+        """Test that logout revokes the session so a copied cookie stops working"""
+        client.post('/login', data={'username': 'testuser', 'password': 'password123'})
+        with client.session_transaction() as sess:
+            token = sess['sid']
+            copied = dict(sess)
+        assert session_rows()[token]['is_active'] == 1
+        assert client.get('/messages').status_code == 200
+
+        client.get('/logout')
+        assert session_rows()[token]['is_active'] == 0
+        with client.session_transaction() as sess:
+            sess.update(copied)
+        assert client.get('/messages').status_code == 302
+
+    def test_cookie_without_session_is_upgraded(self, client, user_id):
+        """Test that a signed-in cookie from before server-side sessions gets one"""
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+        assert client.get('/messages').status_code == 200
+        with client.session_transaction() as sess:
+            assert sess['sid'] in session_rows()
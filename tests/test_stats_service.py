@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Unit tests for trigger-maintained statistics and the statistics service
+"""
+
+import pytest
+import sys
+import os
+import json
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import stats_service
+from migrations import MIGRATIONS, run_migrations
+from database import (init_database, get_db_connection, create_user, create_emergency_report,
+                      update_report_status, create_message, delete_message, delete_user_account,
+                      get_stat_counters, count_emergency_reports)
+
+@pytest.fixture
+def test_db():
+    """Create a test database"""
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp_file:
+        db_path = tmp_file.name
+
+    with patch('database.DATABASE_PATH', db_path):
+        init_database()
+        stats_service.invalidate_statistics()
+        yield db_path
+
+    database.close_pools()
+    if os.path.exists(db_path):
+        os.unlink(db_path)
+
+def ground_truth():
+    """Compute the same statistics with full GROUP BY scans"""
+    with get_db_connection() as conn:
+        by_status = dict(conn.execute('SELECT status, COUNT(*) FROM emergency_reports GROUP BY status').fetchall())
+        by_severity = dict(conn.execute('SELECT severity, COUNT(*) FROM emergency_reports GROUP BY severity').fetchall())
+        live = conn.execute('SELECT COUNT(*) FROM messages WHERE is_deleted = 0').fetchone()[0]
+        departments = conn.execute("SELECT COUNT(*) FROM users WHERE user_type = 'fire_department' "
+                                   "AND is_active = 1").fetchone()[0]
+    return by_status, by_severity, live, departments
+
+class TestMaintainedCounters:
+    """Test that triggers keep stat_counters in step with the tables"""
+
+    def test_counters_follow_writes(self, test_db):
+        """Test counters after inserts, status changes, soft deletes and deactivation"""
+        dept = create_user('dept', 'dept@example.com', 'password123', 'fire_department', 'Dept')
+        user = create_user('user', 'user@example.com', 'password123', 'user', 'User')
+        ids = [create_emergency_report(user, 'Somewhere', 'desc', severity)
+               for severity in ('low', 'high', 'high', 'critical')]
+        update_report_status(ids[0], 'responding', dept)
+        update_report_status(ids[1], 'resolved')
+        first = create_message(user, 'hello')
+        create_message(user, 'world')
+        delete_message(first, user)
+
+        counters = get_stat_counters()
+        by_status, by_severity, live, departments = ground_truth()
+        for status, count in by_status.items():
+            assert counters[f'reports.status.{status}'] == count
+        for severity, count in by_severity.items():
+            assert counters[f'reports.severity.{severity}'] == count
+        assert counters['reports.total'] == 4
+        assert counters['messages.live'] == live == 1
+        assert counters['users.fire_department'] == departments == 1
+
+        delete_user_account(dept)
+        assert get_stat_counters()['users.fire_department'] == 0
+
+    def test_backfill_counts_existing_rows(self):
+        """Test that the migration seeds counters from rows already present"""
+        conn = sqlite3.connect(':memory:')
+        conn.execute('CREATE TABLE users (id INTEGER PRIMARY KEY, user_type TEXT, is_active BOOLEAN)')
+        conn.execute('CREATE TABLE emergency_reports (id INTEGER PRIMARY KEY, location TEXT, severity TEXT, '
+                     "status TEXT DEFAULT 'reported', reported_at TIMESTAMP, assigned_department_id INTEGER)")
+        conn.execute('CREATE TABLE messages (id INTEGER PRIMARY KEY, is_deleted BOOLEAN DEFAULT 0, '
+                     'created_at TIMESTAMP)')
+        conn.executemany('INSERT INTO emergency_reports (location, severity) VALUES (?, ?)',
+                         [('a', 'low'), ('b', 'low'), ('c', 'high')])
+        conn.commit()
+        run_migrations(conn, [m for m in MIGRATIONS if m[0] in (1, 5)])
+        counters = dict(conn.execute('SELECT name, value FROM stat_counters').fetchall())
+        assert counters['reports.total'] == 3
+        assert counters['reports.severity.low'] == 2
+        assert counters['reports.status.reported'] == 3
+        conn.close()
+
+class TestStatisticsService:
+    """Test the cached statistics API"""
+
+    def test_statistics_shape(self, test_db):
+        """Test that every status and severity is present, counting 'reported' as pending"""
+        create_emergency_report(1, 'Somewhere', 'desc', 'medium')
+        stats = stats_service.get_system_statistics()
+        assert stats['pending_emergencies'] == 1
+        assert stats['active_emergencies'] == 1
+        assert set(stats['reports_by_status']) == set(stats_service.REPORT_STATUSES)
+        assert stats['reports_by_severity']['medium'] == 1
+
+    def test_statistics_cached_until_invalidated(self, test_db):
+        """Test that reads inside the TTL do not hit the database"""
+        first = stats_service.get_system_statistics()
+        create_emergency_report(1, 'Somewhere', 'desc', 'low')
+        with patch('database.get_stat_counters', side_effect=AssertionError('cache miss')):
+            assert stats_service.get_system_statistics() == first
+        stats_service.invalidate_statistics()
+        assert stats_service.get_system_statistics()['total_emergency_reports'] == first['total_emergency_reports'] + 1
+
+    def test_count_emergency_reports(self, test_db):
+        """Test COUNT(*) with the report query filters"""
+        for severity in ('low', 'low', 'high'):
+            create_emergency_report(1, 'Somewhere', 'desc', severity)
+        assert count_emergency_reports() == 3
+        assert count_emergency_reports(severity='low') == 2
+
+    def test_status_endpoint_uses_statistics(self, test_db):
+        """Test that /api/v1/status reports the maintained counts"""
+        from app import app
+        app.config['TESTING'] = True
+        create_emergency_report(1, 'Somewhere', 'desc', 'critical')
+        with app.test_client() as client:
+            response = client.get('/api/v1/status', headers={'X-API-Key': 'emergency-api-key-2024'})
+        stats = json.loads(response.data)['data']['statistics']
+        assert stats['total_emergency_reports'] == 1
+        assert stats['reports_by_severity']['critical'] == 1
+        assert stats['pending_emergencies'] == 1
@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+"""
+Emergency Response App - WSGI Entry Point
+Used by gunicorn (``gunicorn -c gunicorn.conf.py``) and any other WSGI server.
+"""
+
+from app import create_app
+from database import ensure_database
+
+app = create_app()
+
+# Migrate now rather than on the first request: with preload_app this runs
+# once in the gunicorn master before the workers fork
+ensure_database()